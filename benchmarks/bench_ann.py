@@ -0,0 +1,76 @@
+"""
+IVF-PQ recall@k and latency against exact search, over a range of nprobe values, on synthetic
+clustered unit vectors (MiniLM-sized by default).
+
+    python benchmarks/bench_ann.py --rows 200000 --queries 500 --k 10
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from retrievers.ann_index import IVFPQIndex
+
+NPROBES = [1, 2, 4, 8, 16, 32, 64, 128]
+
+def synthetic_vectors(rows, dim, clusters, seed=0):
+    """Gaussian blobs around random centres, normalized; roughly how bio embeddings clump."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, rows)] + 0.6 * rng.standard_normal((rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def exact_top_k(data, queries, k):
+    scores = queries @ data.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return top, scores
+
+def percentiles_ms(samples):
+    return np.percentile(samples, 50) * 1000, np.percentile(samples, 99) * 1000
+
+def main(rows, queries, dim, k, nlist, m, clusters):
+    data = synthetic_vectors(rows + queries, dim, clusters)
+    data, query_vectors = data[:rows], data[rows:]
+
+    started = time.perf_counter()
+    index = IVFPQIndex.train(data, nlist=nlist, m=m)
+    train_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    index.add_batches((np.arange(s, min(s + 65536, rows)), data[s:s + 65536]) for s in range(0, rows, 65536))
+    add_seconds = time.perf_counter() - started
+    print(f"{rows} x {dim}, nlist={nlist}, m={m}: trained in {train_seconds:.1f}s, added in {add_seconds:.1f}s, "
+          f"codes {rows * m / 2**20:.1f} MB vs {rows * dim * 4 / 2**20:.1f} MB float32")
+
+    truth, _ = exact_top_k(data, query_vectors, k)
+    exact_times = []
+    for q in query_vectors:
+        started = time.perf_counter()
+        exact_top_k(data, q[None, :], k)
+        exact_times.append(time.perf_counter() - started)
+    p50, p99 = percentiles_ms(exact_times)
+    print(f"{'exact':>8} {'recall@' + str(k):>10} {1.0:10.3f} {'p50 ms':>8} {p50:8.2f} {'p99 ms':>8} {p99:8.2f}")
+
+    for nprobe in [n for n in NPROBES if n <= nlist]:
+        times, hits = [], 0
+        for q, expected in zip(query_vectors, truth):
+            started = time.perf_counter()
+            found, _ = index.search(q[None, :], k, nprobe)
+            times.append(time.perf_counter() - started)
+            hits += len(np.intersect1d(found[0], expected))
+        p50, p99 = percentiles_ms(times)
+        print(f"{'nprobe=' + str(nprobe):>8} {'recall@' + str(k):>10} {hits / (k * queries):10.3f} "
+              f"{'p50 ms':>8} {p50:8.2f} {'p99 ms':>8} {p99:8.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--m", type=int, default=48)
+    parser.add_argument("--clusters", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.rows, args.queries, args.dim, args.k, args.nlist, args.m, args.clusters)
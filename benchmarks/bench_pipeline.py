@@ -0,0 +1,256 @@
+"""
+End-to-end scaling benchmark: synthetic data -> every ingest stage -> every retriever.
+
+    python benchmarks/bench_pipeline.py --users 1k 100k
+    python benchmarks/bench_pipeline.py --users 1m --stages load_profiles parse_bios --no-queries
+    python benchmarks/bench_pipeline.py --users 100k --skip-generate --queries 500
+
+Each size gets its own working directory (benchmarks/runs/<size>/ unless --workdir) with the
+usual data/ layout, and every stage runs there as its own process through the stage's
+normal CLI, so peak RSS is per stage. Each retriever is timed in its own process too, so
+its peak RSS is its own. Retrievers use local backends only: DuckDB, VECTOR_BACKEND numpy
+and ivfpq, GRAPH_BACKEND=local. The agent runs on a scripted fake
+chat model, so no OpenAI key or network is needed and the number covers agent plumbing
+plus tool time. Results are written as JSON (--out) so runs can be diffed or plotted.
+"""
+import argparse
+import csv
+import datetime
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+from benchmarks.synthetic_data import generate, parse_size, size_label
+
+# name -> (command relative to ROOT, extra args); run in this order, cwd = the size's workdir.
+STAGES = {
+    "load_profiles": ("ingest/load_profiles.py", []),
+    "parse_bios": ("ingest/parse_bios.py", ["--full"]),
+    "semantic_indexer": ("recommenders/semantic_indexer.py", ["--full", "--ann"]),
+    "vector_store": ("retrievers/vector_store.py", []),
+    "graph_builder": ("retrievers/graph_builder.py", ["--backend", "local"]),
+}
+RETRIEVERS = ["sql", "vector_numpy", "vector_ivfpq", "graph", "graph_2hop", "hybrid", "fast_router", "agent"]
+SAMPLE_ROWS = 5000          # users read from the head of users.csv to build queries
+WARMUP_QUERIES = 3
+
+def percentiles(samples_ms):
+    if len(samples_ms) < 2:
+        value = samples_ms[0] if samples_ms else float("nan")
+        return {"p50_ms": value, "p95_ms": value, "p99_ms": value}
+    cuts = statistics.quantiles(samples_ms, n=100, method="inclusive")
+    return {"p50_ms": cuts[49], "p95_ms": cuts[94], "p99_ms": cuts[98]}
+
+def run_process(cmd, workdir, env, log_path):
+    """Run one stage process; returns (seconds, exit code, peak RSS MB of that process tree)."""
+    with open(log_path, "w") as log:
+        started = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        if hasattr(os, "wait4"):
+            # wait4 reports the child's own rusage (including its reaped workers), unlike RUSAGE_CHILDREN.
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            peak_mb = usage.ru_maxrss / 1024
+        else:
+            proc.wait()
+            peak_mb = float("nan")
+    return time.perf_counter() - started, proc.returncode, peak_mb
+
+def _log_tail(log_path, lines=5):
+    with open(log_path, errors="replace") as f:
+        return "".join(f.readlines()[-lines:]).strip()
+
+def stage_env(vector_backend, nprobe=None):
+    env = {
+        **os.environ,
+        "PYTHONPATH": ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""),
+        "VECTOR_BACKEND": vector_backend,
+        "GRAPH_BACKEND": "local",
+        "TOKENIZERS_PARALLELISM": "false",
+    }
+    if nprobe:
+        env["ANN_NPROBE"] = str(nprobe)   # default nprobe for every ivfpq search, agent tools included
+    return env
+
+def run_stages(names, users, workdir, env):
+    results = {}
+    os.makedirs(os.path.join(workdir, "logs"), exist_ok=True)
+    for name in names:
+        script, extra = STAGES[name]
+        log_path = os.path.join(workdir, "logs", f"{name}.log")
+        seconds, code, peak_mb = run_process([sys.executable, os.path.join(ROOT, script), *extra], workdir, env, log_path)
+        results[name] = {"ok": code == 0, "seconds": seconds, "peak_rss_mb": peak_mb, "log": log_path}
+        if code != 0:
+            results[name]["error"] = _log_tail(log_path)
+            print(f"  {name:18} FAIL (see {log_path}) {results[name]['error'].splitlines()[-1] if results[name]['error'] else ''}")
+            continue
+        results[name]["users_per_sec"] = users / seconds if seconds else 0.0
+        print(f"  {name:18} ok   {seconds:9.1f}s {results[name]['users_per_sec']:10.0f} users/s {peak_mb:8.0f} MB")
+    return results
+
+# ---- query side: runs inside the size's workdir as `bench_pipeline.py --run-queries` ----
+
+def sample_users(csv_path="data/users.csv", rows=SAMPLE_ROWS):
+    with open(csv_path, newline="") as f:
+        return list(itertools.islice(csv.DictReader(f), rows))
+
+def scripted_llm(queries):
+    """Fake chat model answering each query with one HybridTool call and a final answer."""
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+    def messages():
+        for query in itertools.cycle(queries):
+            yield f"Thought: I should search broadly.\nAction: HybridTool\nAction Input: {query}"
+            yield "Thought: I now know the final answer\nFinal Answer: Here are the people I found."
+    return GenericFakeChatModel(messages=messages())
+
+def query_workload(name, users, rng):
+    """(callable, args) for one query of retriever `name`, picked from the sampled users."""
+    from retrievers.graph import find_connections_2_hops
+    from retrievers.sql import DB_PATH, find_by_field_and_location
+    from retrievers.vector import find_similar_bios
+    from recommenders.fast_router import try_fast_path
+    from recommenders.hybrid import hybrid_search
+
+    graph_lookup = lambda user_id: find_connections_2_hops(None, None, None, user_id, backend="local")
+    user = rng.choice(users)
+    field_location = f"{user['Occupation']}s in {user['Location']}"
+    similar_text = f"{user['Occupation']} at {user['Company']} who studied at {user['School']}, user {user['ID']}"
+    if name == "sql":
+        return find_by_field_and_location, (DB_PATH, user["Occupation"], user["Location"])
+    if name.startswith("vector_"):
+        return lambda text: find_similar_bios(query_text=text, top_k=10, backend=name.split("_", 1)[1]), (similar_text,)
+    if name == "graph":
+        return graph_lookup, (user["ID"],)
+    if name == "graph_2hop":
+        return lambda user_id: find_connections_2_hops(None, None, None, user_id, hops=2, backend="local"), (user["ID"],)
+    if name == "hybrid":
+        return lambda query: hybrid_search(query, graph_lookup=graph_lookup, top_k=10), (field_location,)
+    if name == "fast_router":
+        return lambda query: try_fast_path(query, graph_lookup), (field_location,)
+    raise ValueError(name)
+
+def run_queries(name, count, seed, out_path):
+    """Time `count` queries of one retriever in this process and write the summary to out_path."""
+    rng = random.Random(seed)
+    users = sample_users()
+    try:
+        if name == "agent":
+            from recommenders.router_agent import build_agent
+            queries = [f"{u['Occupation']}s in {u['Location']} who studied at {u['School']}"
+                       for u in rng.sample(users, min(len(users), count + WARMUP_QUERIES))]
+            agent = build_agent(llm=scripted_llm(queries))
+            # Two model calls per query, consumed in the same order as `queries`.
+            calls = [(agent.invoke, (query,)) for query in queries]
+        else:
+            calls = [query_workload(name, users, rng) for _ in range(count + WARMUP_QUERIES)]
+        for fn, args in calls[:WARMUP_QUERIES]:
+            fn(*args)
+        samples = []
+        started = time.perf_counter()
+        for fn, args in calls[WARMUP_QUERIES:]:
+            t0 = time.perf_counter()
+            fn(*args)
+            samples.append((time.perf_counter() - t0) * 1000)
+        elapsed = time.perf_counter() - started
+        result = {"ok": True, "queries": len(samples), "qps": len(samples) / elapsed if elapsed else 0.0,
+                  **percentiles(samples)}
+    except Exception as e:
+        result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    with open(out_path, "w") as f:
+        json.dump(result, f, indent=2)
+
+def run_retrievers(names, count, seed, workdir, env):
+    """One process per retriever, like the stages, so each peak RSS covers that retriever alone."""
+    results = {}
+    for name in names:
+        log_path = os.path.join(workdir, "logs", f"query_{name}.log")
+        out_path = os.path.join(workdir, "logs", f"query_{name}.json")
+        if os.path.exists(out_path):
+            os.remove(out_path)
+        cmd = [sys.executable, os.path.abspath(__file__), "--run-queries", name, "--queries", str(count),
+               "--seed", str(seed), "--out", out_path]
+        _, code, peak_mb = run_process(cmd, workdir, env, log_path)
+        if code != 0 or not os.path.exists(out_path):
+            result = {"ok": False, "error": _log_tail(log_path)}
+        else:
+            with open(out_path) as f:
+                result = json.load(f)
+        result["peak_rss_mb"] = peak_mb
+        results[name] = result
+        if result["ok"]:
+            print(f"  {name:18} {result['qps']:8.1f} q/s  p50 {result['p50_ms']:8.2f}  p95 {result['p95_ms']:8.2f}  "
+                  f"p99 {result['p99_ms']:8.2f} ms {peak_mb:8.0f} MB")
+        else:
+            print(f"  {name:18} FAIL {result['error']}")
+    return results
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+def main(args):
+    report = {
+        "started": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "settings": {"queries": args.queries, "seed": args.seed, "vector_backend": args.vector_backend,
+                     "resume_ratio": args.resume_ratio, "nprobe": args.nprobe},
+        "runs": [],
+    }
+    for size in args.users:
+        users = parse_size(size)
+        label = size_label(users)
+        workdir = os.path.abspath(os.path.join(args.workdir, label))
+        data_dir = os.path.join(workdir, "data")
+        env = stage_env(args.vector_backend, args.nprobe)
+        run = {"label": label, "users": users, "workdir": workdir, "stages": {}, "retrievers": {}}
+        print(f"== {label} ({users} users) in {workdir}")
+        if not args.skip_generate:
+            stats = generate(users, data_dir, args.seed, args.resume_ratio)
+            run["stages"]["generate"] = {"ok": True, "seconds": stats["seconds"], "resumes": stats["resumes"],
+                                         "users_per_sec": users / stats["seconds"] if stats["seconds"] else 0.0}
+            print(f"  {'generate':18} ok   {stats['seconds']:9.1f}s")
+        run["stages"].update(run_stages(args.stages, users, workdir, env))
+        if not args.no_queries:
+            run["retrievers"] = run_retrievers(args.retrievers, args.queries, args.seed, workdir, env)
+        report["runs"].append(run)
+
+        # Rewritten after every size, so a long 1M run still leaves the smaller results behind.
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", nargs="+", default=["1k"], help="sizes: 1k, 100k, 1m or numbers")
+    parser.add_argument("--workdir", default=os.path.join(ROOT, "benchmarks", "runs"))
+    parser.add_argument("--out", default=None, help="results JSON (default benchmarks/results/pipeline-<time>.json)")
+    parser.add_argument("--stages", nargs="*", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--retrievers", nargs="*", choices=RETRIEVERS, default=RETRIEVERS)
+    parser.add_argument("--queries", type=int, default=200, help="timed queries per retriever")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--vector-backend", choices=["numpy", "ivfpq"], default="numpy",
+                        help="VECTOR_BACKEND used inside hybrid, fast-path and agent queries")
+    parser.add_argument("--nprobe", type=int, default=None, help="ivfpq lists probed per query (default ANN_NPROBE)")
+    parser.add_argument("--resume-ratio", type=float, default=1.0)
+    parser.add_argument("--skip-generate", action="store_true", help="reuse the data already in the workdir")
+    parser.add_argument("--no-queries", action="store_true")
+    parser.add_argument("--run-queries", choices=RETRIEVERS, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run_queries:
+        run_queries(args.run_queries, args.queries, args.seed, args.out)
+    else:
+        args.out = args.out or os.path.join(
+            ROOT, "benchmarks", "results", f"pipeline-{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+        main(args)
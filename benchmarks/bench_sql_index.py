@@ -0,0 +1,80 @@
+"""
+Token index vs. ILIKE scan for find_by_field_and_location on a synthetic users table.
+
+    python benchmarks/bench_sql_index.py --rows 1000000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import duckdb
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from ingest.load_profiles import build_token_index
+from retrievers.sql import FIELD_LOCATION_QUERY, DuckDBConnectionManager, find_by_tokens, singular
+
+OCCUPATIONS = ["Software Engineer", "Product Manager", "Data Scientist", "Designer", "Engineering Manager",
+               "Machine Learning Engineer", "Sales Director", "Recruiter", "Research Scientist", "Accountant"]
+LOCATIONS = ["San Jose", "San Francisco", "New York", "Seattle", "Austin", "Boston", "Chicago", "Los Angeles",
+             "Denver", "Lake Roberto"]
+COMPANIES = ["Google", "Apple", "Meta", "Amazon", "Netflix", "Stripe", "Airbnb", "Uber"]
+SCHOOLS = ["CMU", "Stanford", "MIT", "Berkeley", "Harvard", "UCLA"]
+QUERIES = [("Software Engineers", "San Jose"), ("Data Scientist", "SF"), ("Product Managers", "New York"),
+           ("Recruiter", "Austin"), ("Designers", "Lake Roberto")]
+
+def sql_list(values):
+    return "[" + ", ".join("'" + v + "'" for v in values) + "]"
+
+def build_db(db_path, rows):
+    conn = duckdb.connect(db_path)
+    conn.execute(f"""
+        CREATE TABLE users AS
+        SELECT i AS ID,
+               'User ' || i AS "Full Name",
+               'user' || i || '@example.com' AS Email,
+               {sql_list(LOCATIONS)}[1 + hash(i, 1) % {len(LOCATIONS)}] AS Location,
+               {sql_list(OCCUPATIONS)}[1 + hash(i, 2) % {len(OCCUPATIONS)}] AS Occupation,
+               {sql_list(COMPANIES)}[1 + hash(i, 3) % {len(COMPANIES)}] AS Company,
+               {sql_list(SCHOOLS)}[1 + hash(i, 4) % {len(SCHOOLS)}] AS School,
+               'user_' || i || '.pdf' AS "Resume File",
+               '' AS "LinkedIn Bio"
+        FROM range({rows}) t(i)
+    """)
+    started = time.perf_counter()
+    build_token_index(conn)
+    index_seconds = time.perf_counter() - started
+    conn.close()
+    return index_seconds
+
+def time_ms(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+def main(rows, repeats):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "users.db")
+        index_seconds = build_db(db_path, rows)
+        print(f"{rows} rows, token index built in {index_seconds:.2f}s")
+        manager = DuckDBConnectionManager(db_path)
+        print(f"{'query':40} {'ilike ms':>10} {'index ms':>10} {'rows':>8}")
+        for field, location in QUERIES:
+            ilike = lambda: manager.execute(
+                FIELD_LOCATION_QUERY, {"location": f"%{location.strip()}%", "field": f"%{singular(field.strip())}%"}
+            ).fetchall()
+            indexed = lambda: find_by_tokens(manager, field, location)
+            n = len(indexed())
+            print(f"{field + ' in ' + location:40} {time_ms(ilike, repeats):10.2f} {time_ms(indexed, repeats):10.2f} {n:8}")
+        manager.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+    main(args.rows, args.repeats)
@@ -0,0 +1,116 @@
+"""
+Cold-start import profile for each entry point, taken from `python -X importtime` in a fresh
+interpreter, with a per-entry-point budget.
+
+    python benchmarks/import_budget.py                 # report
+    python benchmarks/import_budget.py --check         # exit 1 when a budget is blown
+    python benchmarks/import_budget.py --json out.json
+
+Entry points are dotted modules, or script paths such as the Streamlit page, whose
+module-level imports are timed without running the page itself.
+
+An entry point fails the check if importing it takes longer than its budget (scaled by
+IMPORT_BUDGET_SCALE for slow machines), or if it pulls in a dependency that should only
+load when a tool first needs it.
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BUDGET_SCALE = float(os.getenv("IMPORT_BUDGET_SCALE", "1.0"))
+
+# Must stay out of sys.modules until first use.
+DEFERRED = ["torch", "sentence_transformers", "qdrant_client", "neo4j", "langchain", "langchain_core",
+            "langchain_openai", "openai", "tiktoken", "pyarrow"]
+
+# module or script path -> cumulative import budget in ms
+ENTRY_POINTS = {
+    "ui/app.py": 2500,
+    "ingest.snapshot": 50,
+    "ingest.load_profiles": 500,
+    "ingest.parse_bios": 1500,
+    "retrievers.sql": 400,
+    "retrievers.graph": 300,
+    "retrievers.vector": 600,
+    "recommenders.fast_router": 900,
+    "recommenders.hybrid": 900,
+    "recommenders.router_agent": 1200,
+}
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)$")
+
+def import_source(entry):
+    """Source that imports `entry`: the module itself, or a script's module-level imports."""
+    if not entry.endswith(".py"):
+        return f"import {entry}"
+    with open(os.path.join(ROOT, entry)) as f:
+        tree = ast.parse(f.read(), entry)
+    # Running a Streamlit page renders it and starts its warmup, so only the imports are kept.
+    imports = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return ast.unparse(ast.Module(body=imports, type_ignores=[]))
+
+def profile(module):
+    """One cold import: (cumulative ms, {root package: self ms}, imported module names)."""
+    script = module.endswith(".py")
+    code = f"{import_source(module)}\nimport sys, json\nprint(json.dumps(sorted(sys.modules)))"
+    env = {**os.environ, "PYTHONPATH": ROOT + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+    cumulative, by_package = 0.0, {}
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        root = name.split(".")[0]
+        by_package[root] = by_package.get(root, 0.0) + int(self_us) / 1000
+        if (script and len(indent) == 1) or name == module:
+            cumulative += int(cumulative_us) / 1000
+    return cumulative, by_package, json.loads(proc.stdout.strip().splitlines()[-1])
+
+def main(repeats, check, json_path, top):
+    results, failed = {}, False
+    for module, budget_ms in ENTRY_POINTS.items():
+        budget_ms *= BUDGET_SCALE
+        try:
+            runs = [profile(module) for _ in range(repeats)]
+        except RuntimeError as e:
+            print(f"{module:28} ERROR {e}")
+            results[module] = {"error": str(e)}
+            failed = True
+            continue
+        import_ms = statistics.median(r[0] for r in runs)
+        packages = runs[-1][1]
+        loaded = {name.split(".")[0] for name in runs[-1][2]}
+        leaked = [dep for dep in DEFERRED if dep in loaded]
+        ok = import_ms <= budget_ms and not leaked
+        failed |= not ok
+        heaviest = sorted(packages.items(), key=lambda kv: -kv[1])[:top]
+        print(f"{module:28} {import_ms:8.1f} ms / {budget_ms:6.0f} ms budget  {'ok' if ok else 'FAIL'}")
+        if leaked:
+            print(f"{'':28} loads deferred dependencies at import: {', '.join(leaked)}")
+        print(f"{'':28} heaviest: " + ", ".join(f"{name} {ms:.0f}ms" for name, ms in heaviest))
+        results[module] = {"import_ms": import_ms, "budget_ms": budget_ms, "ok": ok,
+                           "deferred_loaded": leaked, "heaviest_ms": dict(heaviest)}
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    if check and failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--check", action="store_true", help="exit non-zero when any entry point is over budget")
+    parser.add_argument("--json", dest="json_path", default=None)
+    parser.add_argument("--top", type=int, default=5, help="heaviest packages listed per entry point")
+    args = parser.parse_args()
+    main(args.repeats, args.check, args.json_path, args.top)
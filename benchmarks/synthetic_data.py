@@ -0,0 +1,177 @@
+"""
+Synthetic users.csv plus one small resume PDF per user, in the same shape as data/.
+
+    python benchmarks/synthetic_data.py --users 100k --out benchmarks/runs/100k/data
+    python benchmarks/synthetic_data.py --users 1m --resume-ratio 0.1 --out /scratch/1m/data
+
+Sizes accept the presets 1k, 100k and 1m or a plain number. Each user is seeded from
+(--seed, ID), so a user's row and resume do not depend on --users or --resume-ratio, and IDs
+run from 1, so the first rows are a fair sample for query generation.
+The PDFs are written by hand (one page of Helvetica text), so no PDF library is needed to
+generate them; ingest/parse_bios.py reads them with pymupdf like the real ones.
+"""
+import argparse
+import csv
+import os
+import random
+import time
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+USER_COLUMNS = ["ID", "Full Name", "Email", "Location", "Occupation", "Company", "School", "Resume File", "LinkedIn Bio"]
+
+FIRST_NAMES = ["Allison", "Michelle", "Daniel", "Lisa", "Henry", "Amy", "Thomas", "Zachary", "Janice", "Jeffrey",
+               "Brittany", "Kim", "Julian", "Carlos", "Maria", "David", "Sarah", "James", "Priya", "Wei", "Olivia",
+               "Ahmed", "Sofia", "Kevin", "Laura", "Raj", "Emily", "Marcus", "Hannah", "Diego", "Grace", "Omar",
+               "Chloe", "Noah", "Fatima", "Lucas", "Yuki", "Ethan", "Ava", "Samuel", "Nina", "Victor", "Leah",
+               "Andre", "Mei", "Isaac", "Zoe", "Tariq", "Elena", "Connor"]
+LAST_NAMES = ["Hill", "Miles", "Gallagher", "Hensley", "Santiago", "Underwood", "Ellis", "Taylor", "Carlson",
+              "Chavez", "Farmer", "Martinez", "Chapman", "Walls", "Ross", "Nguyen", "Patel", "Kim", "Garcia",
+              "Johnson", "Okafor", "Schmidt", "Rossi", "Tanaka", "Silva", "Cohen", "Murphy", "Singh", "Lopez",
+              "Brown", "Wright", "Novak", "Haddad", "Larsen", "Moreau", "Fischer", "Reyes", "Adams", "Khan", "Wood"]
+EMAIL_DOMAINS = ["gmail.com", "yahoo.com", "outlook.com", "miller.com", "example.org", "proton.me"]
+CITIES = ["San Jose", "San Francisco", "New York", "Seattle", "Austin", "Boston", "Chicago", "Los Angeles",
+          "Denver", "Lake Roberto"]
+TOWN_PREFIXES = ["Lake", "North", "South", "East", "West", "Port", "New"]
+TOWN_STEMS = ["Mark", "Caleb", "Karina", "Jessica", "Donna", "Erin", "Christian", "Kayla", "Meagan", "Ramirez",
+              "Hurst", "Roberto", "Alan", "Brenda"]
+TOWN_SUFFIXES = ["", "stad", "mouth", "haven", "land", "furt", "port", "ton", "ville"]
+OCCUPATIONS = ["Software Engineer", "Product Manager", "Data Scientist", "Hardware Engineer", "UX Designer",
+               "Machine Learning Engineer", "Engineering Manager", "Research Scientist", "DevOps Engineer",
+               "Security Engineer", "Recruiter", "Sales Director"]
+COMPANIES = ["Google", "Apple", "Microsoft", "Meta", "Amazon", "Netflix", "Tesla", "Stripe", "Airbnb", "Uber",
+             "Nvidia", "Salesforce", "Databricks", "Shopify"]
+SCHOOLS = ["CMU", "Stanford", "MIT", "Caltech", "Berkeley", "UCLA", "Harvard", "Georgia Tech", "UIUC", "Cornell"]
+INTERESTS = ["tech innovation", "distributed systems", "developer tools", "machine learning", "climate tech",
+             "accessible design", "open source", "computer vision", "healthcare data", "robotics",
+             "fintech", "education"]
+SKILLS = {
+    "Software Engineer": ["Python", "Go", "Kubernetes", "PostgreSQL", "gRPC"],
+    "Product Manager": ["Roadmapping", "A/B testing", "SQL", "User research", "Pricing"],
+    "Data Scientist": ["Python", "SQL", "Causal inference", "Forecasting", "Spark"],
+    "Hardware Engineer": ["Verilog", "PCB design", "FPGA", "Signal integrity", "Embedded C"],
+    "UX Designer": ["Figma", "Prototyping", "Usability testing", "Design systems", "Accessibility"],
+    "Machine Learning Engineer": ["PyTorch", "Model serving", "Feature stores", "Ranking", "CUDA"],
+    "Engineering Manager": ["Hiring", "Delivery planning", "Mentoring", "Incident review", "Architecture"],
+    "Research Scientist": ["Deep learning", "Statistics", "Paper writing", "JAX", "Experiment design"],
+    "DevOps Engineer": ["Terraform", "CI/CD", "Observability", "Linux", "AWS"],
+    "Security Engineer": ["Threat modeling", "AppSec", "IAM", "Incident response", "Fuzzing"],
+    "Recruiter": ["Sourcing", "Interviewing", "Employer branding", "ATS tools", "Negotiation"],
+    "Sales Director": ["Enterprise sales", "Forecasting", "Partnerships", "CRM", "Negotiation"],
+}
+
+def parse_size(value):
+    value = str(value).lower()
+    return SIZES[value] if value in SIZES else int(value.replace("_", ""))
+
+def size_label(users):
+    return next((label for label, n in SIZES.items() if n == users), str(users))
+
+def _location(rng):
+    # Half the users live in a handful of real cities so field/location queries have matches.
+    if rng.random() < 0.5:
+        return rng.choice(CITIES)
+    suffix = rng.choice(TOWN_SUFFIXES)
+    stem = rng.choice(TOWN_STEMS)
+    return f"{stem}{suffix}" if suffix else f"{rng.choice(TOWN_PREFIXES)} {stem}"
+
+def make_user(user_id, rng, with_resume=True):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    name = f"{first} {last}"
+    occupation, company, school = rng.choice(OCCUPATIONS), rng.choice(COMPANIES), rng.choice(SCHOOLS)
+    interest = rng.choice(INTERESTS)
+    return {
+        "ID": user_id,
+        "Full Name": name,
+        "Email": f"{first}{last}{user_id}@{rng.choice(EMAIL_DOMAINS)}".lower(),
+        "Location": _location(rng),
+        "Occupation": occupation,
+        "Company": company,
+        "School": school,
+        "Resume File": f"{first}_{last}_{user_id}.pdf".lower() if with_resume else "",
+        "LinkedIn Bio": (f"{name} is a {occupation} currently working at {company}. "
+                         f"They graduated from {school} and are passionate about {interest}."),
+    }
+
+def resume_lines(user, rng):
+    occupation = user["Occupation"]
+    start = rng.randint(2008, 2022)
+    previous_company = rng.choice([c for c in COMPANIES if c != user["Company"]])
+    skills = rng.sample(SKILLS[occupation], 3)
+    return [
+        user["Full Name"],
+        f"{user['Email']} | {user['Location']}",
+        "",
+        "Experience",
+        f"{occupation}, {user['Company']} ({start} - present)",
+        f"  Led work on {rng.choice(INTERESTS)} with a team of {rng.randint(3, 12)}.",
+        f"{occupation}, {previous_company} ({start - rng.randint(2, 5)} - {start})",
+        f"  Shipped {rng.choice(INTERESTS)} projects used by {rng.randint(2, 90)}k people.",
+        "",
+        "Education",
+        f"{user['School']}, B.S. ({start - rng.randint(4, 8)})",
+        "",
+        "Skills",
+        ", ".join(skills),
+    ]
+
+def _pdf_text(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").encode("latin-1", "replace")
+
+def pdf_bytes(lines):
+    """A one-page PDF showing `lines` in Helvetica, with a correct xref table."""
+    content = b"BT /F1 11 Tf 14 TL 72 740 Td " + b" ".join(b"(" + _pdf_text(l) + b") Tj T*" for l in lines) + b" ET"
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 5 0 R "
+        b"/Resources << /Font << /F1 4 0 R >> >> >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+def generate(users, out_dir="data", seed=42, resume_ratio=1.0):
+    """Write out_dir/users.csv and out_dir/resume/*.pdf; returns counts and timings."""
+    resume_dir = os.path.join(out_dir, "resume")
+    os.makedirs(resume_dir, exist_ok=True)
+    csv_path = os.path.join(out_dir, "users.csv")
+    tmp_path = csv_path + ".tmp"
+    resumes = 0
+    started = time.perf_counter()
+    with open(tmp_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=USER_COLUMNS)
+        writer.writeheader()
+        for user_id in range(1, users + 1):
+            # Seeded per user, so --resume-ratio or --users never shift anyone else's data.
+            rng = random.Random(f"{seed}:{user_id}")
+            user = make_user(user_id, rng, with_resume=rng.random() < resume_ratio)
+            writer.writerow(user)
+            if user["Resume File"]:
+                with open(os.path.join(resume_dir, user["Resume File"]), "wb") as pdf:
+                    pdf.write(pdf_bytes(resume_lines(user, rng)))
+                resumes += 1
+            if user_id % 100_000 == 0:
+                print(f"  {user_id}/{users} users ({time.perf_counter() - started:.0f}s)")
+    os.replace(tmp_path, csv_path)
+    return {"users": users, "resumes": resumes, "seconds": time.perf_counter() - started}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default="1k", help="1k, 100k, 1m or a number")
+    parser.add_argument("--out", default=None, help="output data directory (default benchmarks/runs/<size>/data)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--resume-ratio", type=float, default=1.0, help="fraction of users that get a resume PDF")
+    args = parser.parse_args()
+    users = parse_size(args.users)
+    out = args.out or os.path.join(os.path.dirname(os.path.abspath(__file__)), "runs", size_label(users), "data")
+    stats = generate(users, out, args.seed, args.resume_ratio)
+    print(f"Wrote {stats['users']} users and {stats['resumes']} resumes to {out} in {stats['seconds']:.1f}s")
@@ -0,0 +1,163 @@
+from __future__ import annotations
+import argparse, datetime, gzip, json, os, sys, time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import duckdb
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from feedback.logger import FEEDBACK_FILE, log_lock, rotated_segments, segment_number
+from recommenders.query_text import normalize
+
+FEEDBACK_DB_PATH = "data/feedback.db"
+FEEDBACK_SCORES_PATH = "data/feedback_scores.parquet"
+HALF_LIFE_DAYS = float(os.getenv("FEEDBACK_HALF_LIFE_DAYS", "30"))
+# `score` is the decayed sum as of the row's own last_ts: sum(rating * 2^((ts - last_ts) / half_life)).
+# Every exponent is <= 0, so no half-life can overflow; folding in newer ratings rescales the
+# old score to the new last_ts first. Readers multiply by 2^(-(now - last_ts) / half_life).
+
+Watermark = Tuple[int, int]   # (last fully folded segment number, bytes folded from the data after it)
+
+def query_pattern(query: str) -> str:
+    return normalize(query)
+
+def decay_factor(age_seconds: float, half_life_days: float = HALF_LIFE_DAYS) -> float:
+    """2^(-age / half_life); ages are clamped at 0 so clock skew never yields a factor above 1."""
+    return 2.0 ** (-max(age_seconds, 0.0) / (half_life_days * 86400))
+
+def fold(agg: list, rating: int, ts: float, half_life_days: float = HALF_LIFE_DAYS) -> None:
+    """Add one rating to [up, down, score, last_ts], keeping score relative to the newest ts."""
+    agg[0 if rating > 0 else 1] += 1
+    last_ts = max(agg[3], ts) if agg[3] is not None else ts
+    previous = agg[2] * decay_factor(last_ts - agg[3], half_life_days) if agg[3] is not None else 0.0
+    agg[2] = previous + rating * decay_factor(last_ts - ts, half_life_days)
+    agg[3] = last_ts
+
+def _timestamp(value: Optional[str], default: float) -> float:
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp() if value else default
+    except ValueError:
+        return default
+
+def read_new_lines(watermark: Watermark, path: Path = FEEDBACK_FILE) -> Tuple[List[bytes], Watermark]:
+    """
+    Complete lines written after `watermark`, and the watermark after them. The writer only
+    ever renames the whole active file into the next segment, so the byte offset carries over
+    from the active file to that segment. Runs under the writer's lock so nothing rotates mid-read.
+    """
+    segment, offset = watermark
+    lines: List[bytes] = []
+    with log_lock(path):
+        for seg in rotated_segments(path):
+            number = segment_number(seg)
+            if number <= segment:
+                continue
+            with gzip.open(seg, "rb") as f:
+                f.seek(offset)
+                lines.extend(f.read().splitlines())
+            segment, offset = number, 0
+        if os.path.getsize(path) < offset:
+            offset = 0   # active file was replaced by hand
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        lines.extend(data[:end].splitlines())
+    return lines, (segment, offset + end)
+
+def aggregate(lines: List[bytes], now: Optional[float] = None):
+    """Fold raw lines into {id: [up, down, score, last_ts]} and {(pattern, id): [...]}."""
+    now = now or time.time()
+    items: Dict[str, list] = {}
+    patterns: Dict[Tuple[str, str], list] = {}
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        rec_id = str(entry.get("recommended_id") or "").strip()
+        rating = entry.get("rating")
+        if not rec_id or rec_id == "unknown" or rating not in (1, -1):
+            continue
+        ts = _timestamp(entry.get("ts"), now)
+        for key, table in ((rec_id, items), ((query_pattern(entry.get("query", "")), rec_id), patterns)):
+            fold(table.setdefault(key, [0, 0, 0.0, None]), rating, ts)
+    return items, patterns
+
+AGGREGATE_TABLES = {
+    "feedback_items": "recommended_id VARCHAR PRIMARY KEY, up BIGINT, down BIGINT, score DOUBLE, last_ts DOUBLE",
+    "feedback_patterns": ("pattern VARCHAR, recommended_id VARCHAR, up BIGINT, down BIGINT, score DOUBLE, "
+                          "last_ts DOUBLE, PRIMARY KEY (pattern, recommended_id)"),
+}
+
+def _ensure_tables(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS feedback_watermark (
+        id INTEGER PRIMARY KEY, segment BIGINT, byte_offset BIGINT, updated DOUBLE)""")
+    for table, schema in AGGREGATE_TABLES.items():
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({schema})")
+
+def upsert_set(half_life_days: float = HALF_LIFE_DAYS) -> str:
+    """ON CONFLICT clause that rescales both scores to the newer last_ts before adding them."""
+    seconds = half_life_days * 86400
+    return f"""DO UPDATE SET up = up + EXCLUDED.up, down = down + EXCLUDED.down,
+    score = score * pow(2.0, (last_ts - greatest(last_ts, EXCLUDED.last_ts)) / {seconds})
+          + EXCLUDED.score * pow(2.0, (EXCLUDED.last_ts - greatest(last_ts, EXCLUDED.last_ts)) / {seconds}),
+    last_ts = greatest(last_ts, EXCLUDED.last_ts)"""
+
+def export_scores(conn, out_path: str = FEEDBACK_SCORES_PATH) -> None:
+    """One Parquet file the serving processes read without touching feedback.db."""
+    tmp_path = out_path + ".tmp"
+    conn.execute(f"""
+        COPY (
+            SELECT '' AS pattern, recommended_id, up, down, score, last_ts FROM feedback_items
+            UNION ALL
+            SELECT pattern, recommended_id, up, down, score, last_ts FROM feedback_patterns
+        ) TO '{tmp_path.replace("'", "''")}' (FORMAT PARQUET)
+    """)
+    os.replace(tmp_path, out_path)
+
+def compact(db_path: str = FEEDBACK_DB_PATH, log_path: Path = FEEDBACK_FILE,
+            scores_path: str = FEEDBACK_SCORES_PATH) -> Dict[str, int]:
+    """Fold every feedback line past the watermark into the aggregates, exactly once."""
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = duckdb.connect(db_path)
+    try:
+        _ensure_tables(conn)
+        row = conn.execute("SELECT segment, byte_offset FROM feedback_watermark WHERE id = 0").fetchone()
+        watermark = (row[0], row[1]) if row else (0, 0)
+        lines, new_watermark = read_new_lines(watermark, Path(log_path))
+        items, patterns = aggregate(lines)
+
+        # Aggregates and watermark move together: a crash before COMMIT re-reads the same lines.
+        conn.execute("BEGIN TRANSACTION")
+        if items:
+            conn.executemany(
+                f"INSERT INTO feedback_items VALUES (?, ?, ?, ?, ?) ON CONFLICT (recommended_id) {upsert_set()}",
+                [(k, *v) for k, v in items.items()],
+            )
+        if patterns:
+            conn.executemany(
+                f"INSERT INTO feedback_patterns VALUES (?, ?, ?, ?, ?, ?) "
+                f"ON CONFLICT (pattern, recommended_id) {upsert_set()}",
+                [(p, rec_id, *v) for (p, rec_id), v in patterns.items()],
+            )
+        conn.execute(
+            "INSERT OR REPLACE INTO feedback_watermark VALUES (0, ?, ?, ?)",
+            [new_watermark[0], new_watermark[1], time.time()],
+        )
+        conn.execute("COMMIT")
+        if items or not os.path.exists(scores_path):
+            export_scores(conn, scores_path)
+    finally:
+        conn.close()
+    return {"lines": len(lines), "items": len(items), "patterns": len(patterns),
+            "segment": new_watermark[0], "offset": new_watermark[1]}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fold new feedback log lines into the aggregate store.")
+    parser.add_argument("--db", default=FEEDBACK_DB_PATH)
+    parser.add_argument("--out", default=FEEDBACK_SCORES_PATH, help="Parquet export read by the re-ranker")
+    args = parser.parse_args()
+    stats = compact(args.db, FEEDBACK_FILE, args.out)
+    print(f"Compacted {stats['lines']} lines into {stats['items']} items / {stats['patterns']} patterns; "
+          f"watermark segment {stats['segment']} offset {stats['offset']}")
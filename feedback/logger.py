@@ -1,24 +1,173 @@
 from __future__ import annotations
-import json, os, datetime
+import json, os, datetime, gzip, queue, re, shutil, threading, atexit
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
-FEEDBACK_DIR = Path("feedback")
+try:
+    import fcntl
+except ImportError:   # no advisory locks on Windows; the in-process queue still serializes writes
+    fcntl = None
+
+FEEDBACK_DIR = Path(__file__).resolve().parent
 FEEDBACK_FILE = FEEDBACK_DIR / "feedback_log.jsonl"
+FEEDBACK_MAX_BYTES = int(os.getenv("FEEDBACK_MAX_BYTES", str(8 * 1024 * 1024)))
+SEGMENT_RE = re.compile(r"^feedback_log\.(\d+)\.jsonl\.gz$")
+TAIL_BLOCK = 8192
+
+def _ensure_paths(path: Path = FEEDBACK_FILE):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if not path.exists():
+        path.touch()
+
+def rotated_segments(path: Path = FEEDBACK_FILE) -> List[Path]:
+    """Compressed segments next to `path`, oldest first; the number in the name only grows."""
+    found = []
+    for p in path.parent.glob("feedback_log.*.jsonl.gz"):
+        m = SEGMENT_RE.match(p.name)
+        if m:
+            found.append((int(m.group(1)), p))
+    return [p for _, p in sorted(found)]
+
+def segment_number(segment: Path) -> int:
+    return int(SEGMENT_RE.match(segment.name).group(1))
+
+@contextmanager
+def log_lock(path: Path = FEEDBACK_FILE):
+    """Exclusive advisory lock shared by every writer and the compactor; no appends or rotations inside."""
+    _ensure_paths(Path(path))
+    with open(Path(path).with_suffix(".lock"), "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+class FeedbackWriter:
+    """
+    Single writer per process: entries are queued and appended by a background thread.
+    Each batch is written under an exclusive flock on a sidecar lock file, so several
+    Streamlit processes can share one log. Once the active file passes `max_bytes` it is
+    renamed to feedback_log.<n>.jsonl.gz (compressed) and a fresh file is started.
+    """
+
+    def __init__(self, path: Path = FEEDBACK_FILE, max_bytes: int = FEEDBACK_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, entry: Dict[str, Any]) -> None:
+        entry = {"ts": now_iso(), **entry}
+        self._queue.put(json.dumps(entry, ensure_ascii=False) + "\n")
 
-def _ensure_paths():
-    FEEDBACK_DIR.mkdir(parents=True, exist_ok=True)
-    if not FEEDBACK_FILE.exists():
-        FEEDBACK_FILE.touch()
+    def flush(self) -> None:
+        """Block until every queued entry is on disk."""
+        self._queue.join()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _drain(self, first: str) -> List[str]:
+        lines = [first]
+        while True:
+            try:
+                line = self._queue.get_nowait()
+            except queue.Empty:
+                return lines
+            if line is None:
+                self._queue.task_done()
+                self._queue.put(None)     # re-queue the stop marker behind this batch
+                return lines
+            lines.append(line)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                self._queue.task_done()
+                return
+            lines = self._drain(first)
+            try:
+                self._append(lines)
+            except Exception as e:
+                print(f"[DEBUG] Failed to write {len(lines)} feedback entries: {e}")
+            finally:
+                for _ in lines:
+                    self._queue.task_done()
+
+    def _append(self, lines: List[str]) -> None:
+        with log_lock(self.path):
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+            if self.path.stat().st_size >= self.max_bytes:
+                self._rotate()
+
+    def _rotate(self) -> None:
+        # Caller holds the file lock, so no other process is appending or rotating.
+        segments = rotated_segments(self.path)
+        number = segment_number(segments[-1]) + 1 if segments else 1
+        target = self.path.parent / f"feedback_log.{number:06d}.jsonl.gz"
+        staged = self.path.parent / f"feedback_log.{number:06d}.jsonl"
+        os.replace(self.path, staged)
+        self.path.touch()
+        tmp = target.with_suffix(".gz.tmp")
+        with open(staged, "rb") as src, gzip.open(tmp, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp, target)
+        staged.unlink()
+
+_writer: Optional[FeedbackWriter] = None
+_writer_lock = threading.Lock()
+
+def get_writer() -> FeedbackWriter:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = FeedbackWriter()
+            atexit.register(_writer.close)
+        return _writer
 
 def save_feedback(entry: Dict[str, Any]) -> None:
-    _ensure_paths()
-    with open(FEEDBACK_FILE, "a", encoding="utf-8") as f:
-        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    """Queue one entry; it is stamped with `ts` and written by the background writer."""
+    get_writer().write(entry)
+
+def _tail_lines(path: Path, n: int) -> List[bytes]:
+    """Last `n` complete lines, reading backwards in blocks: cost follows n, not file size."""
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        blocks: List[bytes] = []
+        newlines = 0
+        # Only the new block is counted, and blocks are joined once, so each byte is touched once.
+        while pos > 0 and newlines <= n:
+            step = min(TAIL_BLOCK, pos)
+            pos -= step
+            f.seek(pos)
+            block = f.read(step)
+            blocks.append(block)
+            newlines += block.count(b"\n")
+    lines = b"".join(reversed(blocks)).splitlines()
+    if pos > 0:
+        lines = lines[1:]         # first line may start mid-record
+    return lines[-n:] if n else []
 
-def load_recent_feedback(n: int = 50) -> List[Dict[str, Any]]:
-    _ensure_paths()
-    lines = FEEDBACK_FILE.read_text(encoding="utf-8").splitlines()
+def load_recent_feedback(n: int = 50, path: Path = FEEDBACK_FILE) -> List[Dict[str, Any]]:
+    """Last `n` entries, oldest first, reaching into the newest rotated segments if needed."""
+    _ensure_paths(path)
+    lines = _tail_lines(path, n)
+    for segment in reversed(rotated_segments(path)):
+        if len(lines) >= n:
+            break
+        # Segments are bounded by FEEDBACK_MAX_BYTES, so reading one whole is bounded too.
+        with gzip.open(segment, "rb") as f:
+            older = f.read().splitlines()
+        lines = older[-(n - len(lines)):] + lines
     out: List[Dict[str, Any]] = []
     for line in lines[-n:]:
         try:
@@ -1,20 +1,206 @@
-import pandas as pd
+import argparse
 import duckdb
 import os
+import shutil
+import sys
+from contextlib import contextmanager
 
-def load_profiles(csv_path='data/users.csv', db_path='data/users.db'):
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from retrievers.sql import FIELD_ALIASES
+from ingest.snapshot import snapshot_dir, source_stamp, write_snapshot
+
+USERS_SCHEMA = {
+    "ID": "BIGINT",
+    "Full Name": "VARCHAR",
+    "Email": "VARCHAR",
+    "Location": "VARCHAR",
+    "Occupation": "VARCHAR",
+    "Company": "VARCHAR",
+    "School": "VARCHAR",
+    "Resume File": "VARCHAR",
+    "LinkedIn Bio": "VARCHAR",
+}
+
+TOKEN_FIELDS = {"occupation": "Occupation", "location": "Location", "company": "Company", "school": "School"}
+
+def build_token_index(conn, user_ids=None):
+    """
+    (re)build user_tokens(user_id, field, token): lowercased words of Occupation, Location,
+    Company and School with whole-value aliases expanded and one plural 's' stripped, matching
+    retrievers.sql.tokenize. Sorted by (field, token) and indexed for point lookups.
+    With user_ids (an incremental merge) only those users' tokens are replaced in place.
+    """
+    alias_rows = [(field, alias, expansion) for field, aliases in FIELD_ALIASES.items() for alias, expansion in aliases.items()]
+    conn.execute("CREATE OR REPLACE TEMP TABLE token_aliases (field VARCHAR, alias VARCHAR, expansion VARCHAR)")
+    conn.executemany("INSERT INTO token_aliases VALUES (?, ?, ?)", alias_rows)
+    incremental = user_ids is not None and _table_exists(conn, "user_tokens")
+    where = "WHERE list_contains($ids, ID)" if incremental else ""
+    field_values = " UNION ALL ".join(
+        f"SELECT ID, '{field}' AS field, \"{column}\" AS value FROM users {where}" for field, column in TOKEN_FIELDS.items()
+    )
+    tokens_sql = f"""
+        WITH field_text AS (
+            SELECT v.ID AS user_id, v.field, COALESCE(a.expansion, lower(trim(v.value))) AS text
+            FROM ({field_values}) v
+            LEFT JOIN token_aliases a ON a.field = v.field AND a.alias = lower(trim(v.value))
+            WHERE v.value IS NOT NULL
+        ),
+        words AS (
+            SELECT user_id, field, unnest(regexp_split_to_array(text, '[^a-z0-9]+')) AS word
+            FROM field_text
+        ),
+        stemmed AS (
+            SELECT user_id, field,
+                   CASE WHEN length(word) > 3 AND word LIKE '%s' AND word NOT LIKE '%ss'
+                        THEN left(word, length(word) - 1) ELSE word END AS token
+            FROM words
+        )
+        SELECT DISTINCT user_id, field, token FROM stemmed
+        WHERE token <> ''
+        ORDER BY field, token
+    """
+    if incremental:
+        if user_ids:
+            conn.execute("DELETE FROM user_tokens WHERE list_contains($ids, user_id)", {"ids": list(user_ids)})
+            conn.execute(f"INSERT INTO user_tokens {tokens_sql}", {"ids": list(user_ids)})
+        return
+    conn.execute(f"CREATE OR REPLACE TABLE user_tokens AS {tokens_sql}")
+    conn.execute("CREATE INDEX user_tokens_field_token ON user_tokens (field, token)")
+
+def read_csv_sql(csv_path):
+    """DuckDB's native CSV scan with the explicit users schema (no type sniffing, no pandas)."""
+    columns = ", ".join(f"'{name}': '{sql_type}'" for name, sql_type in USERS_SCHEMA.items())
+    path = csv_path.replace("'", "''")
+    return f"read_csv('{path}', header = true, columns = {{{columns}}})"
+
+@contextmanager
+def staged_database(db_path, copy_existing=False):
+    """
+    Yield a staging file to write into, then swap it in atomically over db_path.
+    Readers holding the old file (see retrievers.sql) are never blocked by the write lock
+    and reopen the new file on their next query. The staging file starts empty unless
+    copy_existing is set; that costs one full copy of db_path, so only incremental merges ask for it.
+    """
+    staged_path = db_path + ".staging"
+    for path in (staged_path, staged_path + ".wal"):
+        if os.path.exists(path):
+            os.remove(path)
+    if copy_existing and os.path.exists(db_path):
+        shutil.copyfile(db_path, staged_path)
+    try:
+        yield staged_path
+        os.replace(staged_path, db_path)
+    finally:
+        if os.path.exists(staged_path):
+            os.remove(staged_path)
+
+def _table_exists(conn, name):
+    return conn.execute(
+        "SELECT count(*) FROM information_schema.tables WHERE table_name = ?", [name]
+    ).fetchone()[0] > 0
+
+REBUILT_TABLES = {"users", "user_tokens"}
+
+def carry_other_tables(conn, db_path):
+    """
+    On a full rebuild, copy tables other ingests own (e.g. precomputed recommendations) and
+    their indexes from the live file, without copying users itself.
+    """
+    if not os.path.exists(db_path):
+        return
+    path = db_path.replace("'", "''")
+    conn.execute(f"ATTACH '{path}' AS previous (READ_ONLY)")
+    try:
+        tables = [row[0] for row in conn.execute(
+            "SELECT table_name FROM duckdb_tables() WHERE database_name = 'previous' AND NOT temporary"
+        ).fetchall() if row[0] not in REBUILT_TABLES]
+        indexes = conn.execute(
+            "SELECT table_name, sql FROM duckdb_indexes() WHERE database_name = 'previous' AND sql IS NOT NULL"
+        ).fetchall()
+        for table in tables:
+            conn.execute(f'CREATE OR REPLACE TABLE "{table}" AS SELECT * FROM previous."{table}"')
+    finally:
+        conn.execute("DETACH previous")
+    for table_name, index_sql in indexes:
+        if table_name in tables:
+            conn.execute(index_sql)
+
+def _has_users_table(db_path):
+    if not os.path.exists(db_path):
+        return False
+    conn = duckdb.connect(db_path, read_only=True)
+    try:
+        return _table_exists(conn, "users")
+    finally:
+        conn.close()
+
+def merge_profiles(conn, csv_path):
+    """
+    MERGE new and changed rows from the CSV into users by ID; returns (inserted, updated, ids)
+    where ids lists every inserted or updated ID. If the CSV repeats an ID its last row wins,
+    since MERGE rejects a target row matched twice.
+    """
+    conn.execute(f"""
+        CREATE OR REPLACE TEMP TABLE staged_users AS
+        SELECT * EXCLUDE (csv_row) FROM (
+            SELECT *, row_number() OVER () AS csv_row FROM {read_csv_sql(csv_path)}
+        )
+        QUALIFY row_number() OVER (PARTITION BY ID ORDER BY csv_row DESC) = 1
+    """)
+    columns = [name for name in USERS_SCHEMA if name != "ID"]
+    changed = " OR ".join(f't."{c}" IS DISTINCT FROM s."{c}"' for c in columns)
+    rows = conn.execute(
+        f"SELECT s.ID, t.ID IS NULL FROM staged_users s LEFT JOIN users t ON t.ID = s.ID WHERE t.ID IS NULL OR {changed}"
+    ).fetchall()
+    ids = [row[0] for row in rows]
+    inserted = sum(1 for row in rows if row[1])
+    updated = len(rows) - inserted
+    all_columns = ", ".join(f'"{c}"' for c in USERS_SCHEMA)
+    conn.execute(f"""
+        MERGE INTO users AS t
+        USING staged_users AS s
+        ON t.ID = s.ID
+        WHEN MATCHED AND ({changed}) THEN
+            UPDATE SET {", ".join(f'"{c}" = s."{c}"' for c in columns)}
+        WHEN NOT MATCHED THEN
+            INSERT ({all_columns}) VALUES ({", ".join(f's."{c}"' for c in USERS_SCHEMA)})
+    """)
+    conn.execute("DROP TABLE staged_users")
+    return inserted, updated, ids
+
+def load_profiles(csv_path='data/users.csv', db_path='data/users.db', incremental=False, snapshot=True):
     if not os.path.exists(csv_path):
         print(f"Error: CSV file not found at {csv_path}")
         return
 
-    profiles = pd.read_csv(csv_path)
-    conn = duckdb.connect(db_path)
-    conn.execute("CREATE OR REPLACE TABLE users AS SELECT * FROM profiles")
-    print(conn.execute("SELECT * FROM users").df())
-    conn.close()
-    print("DuckDB table created and saved to", db_path)
+    # A full rebuild replaces every table, so only a merge needs the existing file copied in.
+    merge = incremental and _has_users_table(db_path)
+    with staged_database(db_path, copy_existing=merge) as staged_path:
+        conn = duckdb.connect(staged_path)
+        try:
+            if merge:
+                inserted, updated, merged_ids = merge_profiles(conn, csv_path)
+                print(f"Merged {csv_path}: {inserted} inserted, {updated} updated")
+                build_token_index(conn, merged_ids)
+            else:
+                carry_other_tables(conn, db_path)
+                conn.execute(f"CREATE OR REPLACE TABLE users AS SELECT * FROM {read_csv_sql(csv_path)}")
+                build_token_index(conn)
+            rows = conn.execute("SELECT count(*) FROM users").fetchone()[0]
+            if snapshot:
+                write_snapshot(conn, "users", snapshot_dir(db_path), source=source_stamp(csv_path))
+        finally:
+            conn.close()
+    print(f"DuckDB table users has {rows} rows, saved to {db_path}")
 
-load_profiles()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load users.csv into DuckDB.")
+    parser.add_argument("--csv", default="data/users.csv")
+    parser.add_argument("--db", default="data/users.db")
+    parser.add_argument("--incremental", action="store_true", help="MERGE new/changed rows by ID instead of rebuilding")
+    parser.add_argument("--no-snapshot", action="store_true", help="skip writing the Parquet/Arrow profile snapshot")
+    args = parser.parse_args()
+    load_profiles(args.csv, args.db, incremental=args.incremental, snapshot=not args.no_snapshot)
 
 
 
@@ -2,51 +2,224 @@ import pymupdf
 import json
 import pandas as pd
 import os
+import argparse
+import hashlib
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-def parse_bios(users_csv="data/users.csv", resume_folder="data/resume", output_file="data/parsed_bios.jsonl"):
-    users = pd.read_csv(users_csv)
-    entries = []
-
-    for _, row in users.iterrows():
-        user_id = f"{row['ID']}"
-        user_name = f"{row['Full Name']}"
-        sources = []
-        bio_parts = []
-
-        linkedin_bio = row.get("LinkedIn Bio", "")
-        if pd.notna(linkedin_bio) and linkedin_bio.strip():
-            bio_parts.append(linkedin_bio.strip())
-            sources.append("LinkedIn")
-
-        resume_filename = row.get("Resume File", "").strip()
-        resume_path = os.path.join(resume_folder, resume_filename)
-        if os.path.exists(resume_path):
-            try:
-                doc = pymupdf.open(resume_path)
-                text = " ".join([page.get_text() for page in doc])
-                if text.strip():
-                    bio_parts.append(text.strip())
-                    sources.append("Resume.pdf")
-            except Exception as e:
-                print(f"Failed to read {resume_filename}: {e}")
-
-        if bio_parts:
-            entry = {
-                "user_id": user_id,
-                "user_name": user_name,
-                "bio": " ".join(bio_parts),
-                "sources": sources
-            }
-            entries.append(entry)
-        
-        with open(output_file, "w") as f:
-            for entry in entries:
-                f.write(json.dumps(entry) + "\n")
-
-        print(f"Parsed {len(entries)} bios and saved to {output_file}")
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from ingest.snapshot import SNAPSHOT_DIR, current_snapshot, read_columns, snapshot_matches
+
+USER_COLUMNS = ["ID", "Full Name", "Resume File", "LinkedIn Bio"]
+
+def extract_resume(resume_path, known_hash=None):
+    """
+    Runs in a worker process. Returns (content_hash, text, error); text is None when the
+    file still hashes to `known_hash`, and errors are returned so one bad PDF never kills the run.
+    """
+    try:
+        with open(resume_path, "rb") as f:
+            data = f.read()
+        resume_hash = hashlib.sha256(data).hexdigest()
+        if resume_hash == known_hash:
+            return resume_hash, None, None
+        with pymupdf.open(stream=data, filetype="pdf") as doc:
+            return resume_hash, " ".join(page.get_text() for page in doc), None
+    except Exception as e:
+        return None, None, str(e)
+
+def bio_hash(user_name, linkedin_bio):
+    linkedin_bio = linkedin_bio.strip() if isinstance(linkedin_bio, str) else ""
+    return hashlib.sha256(f"{user_name}\x00{linkedin_bio}".encode("utf-8")).hexdigest()
+
+def iter_user_rows(users_csv, snapshot_dir=SNAPSHOT_DIR):
+    """Rows from the columnar profile snapshot when it was written from this very CSV, else the CSV."""
+    fresh = snapshot_matches(current_snapshot(snapshot_dir), users_csv)
+    table = read_columns(USER_COLUMNS, snapshot_dir) if fresh else None
+    if table is not None:
+        for batch in table.to_batches():
+            yield from batch.to_pylist()
+        return
+    for _, row in pd.read_csv(users_csv).iterrows():
+        yield row
+
+def iter_user_tasks(rows, resume_folder):
+    for row in rows:
+        resume_filename = row.get("Resume File") or ""
+        resume_filename = resume_filename.strip() if isinstance(resume_filename, str) else ""
+        resume_path = os.path.join(resume_folder, resume_filename) if resume_filename else ""
+        task = {
+            "user_id": f"{row['ID']}",
+            "user_name": f"{row['Full Name']}",
+            "linkedin_bio": row.get("LinkedIn Bio", ""),
+            "resume_filename": resume_filename,
+            "resume_path": None,
+        }
+        if resume_path and os.path.exists(resume_path):
+            stat = os.stat(resume_path)
+            task.update(resume_path=resume_path, size=stat.st_size, mtime=stat.st_mtime)
+        task["bio_hash"] = bio_hash(task["user_name"], task["linkedin_bio"])
+        yield task
+
+def plan_task(task, previous):
+    """
+    Decide how much work a user needs against their manifest record:
+    carry the old entry forward, re-hash the resume, or parse from scratch.
+    """
+    if previous is None or previous.get("bio_hash") != task["bio_hash"] \
+            or previous.get("resume_path") != task["resume_path"] or "offset" not in previous:
+        return task
+    if task["resume_path"] is None:
+        task["carry"] = True
+    elif previous.get("size") == task["size"] and previous.get("mtime") == task["mtime"]:
+        task["carry"] = True
+        task["resume_hash"] = previous.get("resume_hash")
+    else:
+        # Touched but maybe not edited: the worker skips extraction if the hash still matches.
+        task["known_hash"] = previous.get("resume_hash")
+    return task
+
+def iter_extracted(tasks, executor, window):
+    """Yield (task, (hash, text, error)) in input order with at most `window` tasks in flight."""
+    pending = deque()
+    for task in tasks:
+        future = None
+        if task["resume_path"] and not task.get("carry"):
+            future = executor.submit(extract_resume, task["resume_path"], task.get("known_hash"))
+        pending.append((task, future))
+        if len(pending) >= window:
+            task, future = pending.popleft()
+            yield task, (future.result() if future else (task.get("resume_hash"), None, None))
+    while pending:
+        task, future = pending.popleft()
+        yield task, (future.result() if future else (task.get("resume_hash"), None, None))
+
+def build_entry(task, resume_text):
+    sources = []
+    bio_parts = []
+
+    linkedin_bio = task["linkedin_bio"]
+    if isinstance(linkedin_bio, str) and linkedin_bio.strip():
+        bio_parts.append(linkedin_bio.strip())
+        sources.append("LinkedIn")
+
+    if resume_text and resume_text.strip():
+        bio_parts.append(resume_text.strip())
+        sources.append("Resume.pdf")
+
+    if not bio_parts:
+        return None
+    return {
+        "user_id": task["user_id"],
+        "user_name": task["user_name"],
+        "bio": " ".join(bio_parts),
+        "sources": sources
+    }
+
+def sidecar_path(output_file, name):
+    """data/parsed_bios.jsonl -> data/parsed_bios.<name>.json"""
+    return os.path.splitext(output_file)[0] + f".{name}.json"
+
+def load_previous_manifest(output_file):
+    """Previous manifest keyed by user_id; empty if it or the output it indexes is missing."""
+    manifest_file = sidecar_path(output_file, "manifest")
+    if not (os.path.exists(manifest_file) and os.path.exists(output_file)):
+        return {}
+    with open(manifest_file, "r") as f:
+        return json.load(f)
+
+def read_line_at(f, offset):
+    """One previous output line, found by the byte offset the manifest stored for it."""
+    if offset is None:
+        return b""
+    f.seek(offset)
+    line = f.readline()
+    return line if line.endswith(b"\n") else line + b"\n"
+
+def write_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def parse_bios(users_csv="data/users.csv", resume_folder="data/resume", output_file="data/parsed_bios.jsonl", workers=None, full=False,
+               snapshot_dir=SNAPSHOT_DIR):
+    """
+    Returns (changes, errors): the added/updated/removed user ids also written to the
+    .changed.json sidecar, and (resume_filename, error) for every PDF that could not be read.
+    """
+    workers = workers or os.cpu_count() or 1
+    previous_manifest = load_previous_manifest(output_file)
+    # --full re-parses everyone but still diffs against the old manifest, so removals are reported.
+    reusable = {} if full else previous_manifest
+    manifest = {}
+    changes = {"added": [], "updated": [], "removed": []}
+    parsed = carried = 0
+    errors = []
+
+    tasks = (plan_task(task, reusable.get(task["user_id"])) for task in iter_user_tasks(iter_user_rows(users_csv, snapshot_dir), resume_folder))
+
+    # Entries are streamed to a temp file in CSV order and swapped in at the end,
+    # so readers never see a half-written parsed_bios.jsonl. Unchanged entries are copied
+    # from the previous file by offset, so neither file is ever held in memory.
+    tmp_file = output_file + ".tmp"
+    previous_file = open(output_file, "rb") if reusable else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor, open(tmp_file, "wb") as f:
+            for task, (resume_hash, text, error) in iter_extracted(tasks, executor, workers * 4):
+                user_id = task["user_id"]
+                record = {
+                    "resume_path": task["resume_path"],
+                    "size": task.get("size"),
+                    "mtime": task.get("mtime"),
+                    "resume_hash": resume_hash,
+                    "bio_hash": task["bio_hash"],
+                    "offset": None,
+                }
+                manifest[user_id] = record
+                if error:
+                    # No size/mtime, so the next run extracts this resume again instead of carrying it.
+                    record.update(size=None, mtime=None, resume_hash=None)
+                    errors.append((task["resume_filename"], error))
+                    print(f"Failed to read {task['resume_filename']}: {error}")
+
+                unchanged = task.get("carry") or (task.get("known_hash") and resume_hash == task["known_hash"] and text is None)
+                if unchanged:
+                    line = read_line_at(previous_file, previous_manifest[user_id]["offset"])
+                    if line.strip():
+                        record["offset"] = f.tell()
+                        f.write(line)
+                    carried += 1
+                    continue
+
+                changes["updated" if user_id in previous_manifest else "added"].append(user_id)
+                entry = build_entry(task, text)
+                if entry:
+                    record["offset"] = f.tell()
+                    f.write((json.dumps(entry) + "\n").encode("utf-8"))
+                    parsed += 1
+    finally:
+        if previous_file is not None:
+            previous_file.close()
+    os.replace(tmp_file, output_file)
+
+    changes["removed"] = [user_id for user_id in previous_manifest if user_id not in manifest]
+    write_json_atomic(sidecar_path(output_file, "manifest"), manifest)
+    write_json_atomic(sidecar_path(output_file, "changed"), changes)
+
+    print(f"Parsed {parsed} bios, carried forward {carried} unchanged, with {workers} workers; saved to {output_file}")
+    print(f"Changed users: {len(changes['added'])} added, {len(changes['updated'])} updated, {len(changes['removed'])} removed")
+    if errors:
+        print(f"{len(errors)} resume(s) could not be read")
+    return changes, errors
 
 if __name__ == "__main__":
-    parse_bios()
+    parser = argparse.ArgumentParser(description="Combine LinkedIn bios and resume PDFs into parsed_bios.jsonl.")
+    parser.add_argument("--workers", type=int, default=None, help="resume extraction processes (default: CPU count)")
+    parser.add_argument("--full", action="store_true", help="re-parse every user instead of carrying unchanged ones")
+    args = parser.parse_args()
+    parse_bios(workers=args.workers, full=args.full)
 
 
 
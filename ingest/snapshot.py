@@ -0,0 +1,96 @@
+import json
+import os
+import time
+
+SNAPSHOT_DIR = "data/snapshots"
+KEEP_SNAPSHOTS = 3
+BATCH_ROWS = 65536
+
+def snapshot_dir(db_path):
+    """Snapshots live next to the database they mirror, so each --db gets its own."""
+    return os.path.join(os.path.dirname(db_path) or ".", "snapshots")
+
+def source_stamp(path):
+    """Identity of the file a snapshot was loaded from: absolute path, size and mtime."""
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def _current_path(out_dir):
+    return os.path.join(out_dir, "CURRENT.json")
+
+def write_snapshot(conn, table="users", out_dir=SNAPSHOT_DIR, source=None):
+    """
+    Write `table` as a versioned Parquet file plus an uncompressed Arrow IPC file, then point
+    CURRENT.json at them. Rows stream through record batches and never become a DataFrame.
+    `source` (a source_stamp()) is recorded so readers can tell which file the rows came from.
+    """
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    os.makedirs(out_dir, exist_ok=True)
+    version = time.strftime("%Y%m%dT%H%M%S", time.gmtime()) + f"-{time.time_ns() % 1_000_000:06d}"
+    parquet_name = f"{table}-{version}.parquet"
+    arrow_name = f"{table}-{version}.arrow"
+
+    parquet_path = os.path.join(out_dir, parquet_name).replace("'", "''")
+    conn.execute(f"COPY {table} TO '{parquet_path}' (FORMAT PARQUET)")
+
+    rows = 0
+    reader = conn.execute(f"SELECT * FROM {table}").fetch_record_batch(BATCH_ROWS)
+    with pa.OSFile(os.path.join(out_dir, arrow_name), "wb") as sink:
+        with ipc.new_file(sink, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+                rows += batch.num_rows
+
+    meta = {"version": version, "table": table, "rows": rows, "parquet": parquet_name, "arrow": arrow_name,
+            "source": source}
+    tmp_path = _current_path(out_dir) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, _current_path(out_dir))
+    _prune(out_dir, table, keep={parquet_name, arrow_name})
+    print(f"Snapshot {version} written to {out_dir} ({rows} rows)")
+    return meta
+
+def _prune(out_dir, table, keep):
+    """Drop all but the newest KEEP_SNAPSHOTS versions; open mmaps of removed files stay valid."""
+    versions = sorted({
+        name[len(table) + 1:].rsplit(".", 1)[0]
+        for name in os.listdir(out_dir)
+        if name.startswith(f"{table}-") and name.endswith((".parquet", ".arrow"))
+    })
+    for version in versions[:-KEEP_SNAPSHOTS]:
+        for ext in (".parquet", ".arrow"):
+            name = f"{table}-{version}{ext}"
+            if name not in keep and os.path.exists(os.path.join(out_dir, name)):
+                os.remove(os.path.join(out_dir, name))
+
+def current_snapshot(out_dir=SNAPSHOT_DIR):
+    """Metadata of the newest snapshot, or None if no snapshot has been written."""
+    try:
+        with open(_current_path(out_dir)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def snapshot_matches(meta, source_path):
+    """True when the snapshot was written from source_path as it is now (same path, size and mtime)."""
+    if meta is None or not meta.get("source") or not os.path.exists(source_path):
+        return False
+    return meta["source"] == source_stamp(source_path)
+
+def read_columns(columns=None, out_dir=SNAPSHOT_DIR):
+    """
+    Memory-map the current Arrow snapshot and return a pyarrow Table of `columns`.
+    The buffers point straight into the mapped file, so nothing is copied or parsed.
+    Returns None when there is no snapshot.
+    """
+    meta = current_snapshot(out_dir)
+    if meta is None:
+        return None
+    # pyarrow is imported here so callers that only check current_snapshot() stay light.
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    source = pa.memory_map(os.path.join(out_dir, meta["arrow"]), "r")
+    table = ipc.open_file(source).read_all()
+    return table.select(columns) if columns else table
@@ -0,0 +1,63 @@
+from langchain_core.callbacks import BaseCallbackHandler
+
+from recommenders.tool_format import count_tokens
+
+class TokenLogger(BaseCallbackHandler):
+    """Logs prompt/completion tokens per LLM call and the token size of each tool observation."""
+
+    def __init__(self):
+        self.steps = []
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if not usage and response.generations:
+            # Streamed calls report usage on the message instead of llm_output.
+            metadata = getattr(getattr(response.generations[0][0], "message", None), "usage_metadata", None) or {}
+            usage = {"prompt_tokens": metadata.get("input_tokens"), "completion_tokens": metadata.get("output_tokens")}
+        step = {"step": len(self.steps) + 1, "kind": "llm",
+                "prompt_tokens": usage.get("prompt_tokens"), "completion_tokens": usage.get("completion_tokens")}
+        self.steps.append(step)
+        print(f"[DEBUG] LLM step {step['step']}: {step['prompt_tokens']} prompt + {step['completion_tokens']} completion tokens")
+
+    def on_tool_end(self, output, **kwargs):
+        step = {"step": len(self.steps) + 1, "kind": "tool", "tool": kwargs.get("name"),
+                "observation_tokens": count_tokens(output)}
+        self.steps.append(step)
+        print(f"[DEBUG] Tool {step['tool']}: observation of {step['observation_tokens']} tokens")
+
+class StreamingEvents(BaseCallbackHandler):
+    """
+    Forwards agent callbacks to a queue as events: tool_start / tool_end per tool call and
+    token for every streamed token after "Final Answer:" in the current LLM call.
+    """
+
+    FINAL_MARKER = "Final Answer:"
+
+    def __init__(self, events):
+        self.events = events
+        self._buffer = ""
+        self._in_final = False
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._buffer, self._in_final = "", False
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._buffer, self._in_final = "", False
+
+    def on_llm_new_token(self, token, **kwargs):
+        if self._in_final:
+            self.events.put({"type": "token", "text": token})
+            return
+        self._buffer += token
+        marker = self._buffer.find(self.FINAL_MARKER)
+        if marker >= 0:
+            self._in_final = True
+            rest = self._buffer[marker + len(self.FINAL_MARKER):].lstrip()
+            if rest:
+                self.events.put({"type": "token", "text": rest})
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self.events.put({"type": "tool_start", "tool": (serialized or {}).get("name"), "input": input_str})
+
+    def on_tool_end(self, output, **kwargs):
+        self.events.put({"type": "tool_end", "tool": kwargs.get("name"), "observation": str(output)})
@@ -0,0 +1,286 @@
+import os
+import re
+import statistics
+import threading
+import time
+from collections import namedtuple
+
+from ingest.snapshot import current_snapshot, read_columns, snapshot_dir
+from recommenders.feedback_rerank import rerank
+from recommenders.tool_format import format_connections, format_hits, format_user_rows
+from retrievers.sql import DB_PATH, find_by_field_and_location, get_connection_manager, get_recommendations
+from retrievers.vector import get_retriever
+
+FAST_ROUTER_CLASSIFIER = os.getenv("FAST_ROUTER_CLASSIFIER", "").lower() in ("1", "true", "yes")
+CLASSIFIER_THRESHOLD = float(os.getenv("FAST_ROUTER_THRESHOLD", "0.55"))
+PROFILE_COLUMNS = ["ID", "Full Name", "Occupation", "Company", "Location"]
+
+# Same shape as an AgentAction, so callers can read `.tool` from fast-path steps too.
+FastAction = namedtuple("FastAction", ["tool", "tool_input", "log"])
+# Same fields the UI reads from a Qdrant ScoredPoint.
+StoredHit = namedtuple("StoredHit", ["id", "score", "payload"])
+
+SIMILAR_RE = re.compile(r"(?:like|similar to)\s+([A-Za-z][A-Za-z\.\- ]+)$", re.IGNORECASE)
+CONNECTED_RE = re.compile(
+    r"(?:connected to|connections? (?:of|for)|connect(?:ed)? with|network of)\s+(?:user\s*)?(?:id\s*)?['\"]?(\d+)['\"]?$",
+    re.IGNORECASE,
+)
+LEADING_VERBS_RE = re.compile(r"^(?:please\s+)?(?:find|show|list|search for|get|recommend|who are)(?:\s+me)?\s+", re.IGNORECASE)
+
+def parse_occupation_and_location(query):
+    """
+    Extracts occupation and location from a prompt like:
+    "Find Software Engineers in San Jose"
+    """
+    match = re.search(r"(.*?)\s+in\s+(.*)", query, re.IGNORECASE)
+    if match:
+        occupation = match.group(1).strip().strip('"\'')
+        location = match.group(2).strip().strip('"\'')
+        return occupation, location
+    else:
+        raise ValueError("Query does not match expected format: 'Find [Occupation] in [Location]'")
+
+def _clean(query):
+    return LEADING_VERBS_RE.sub("", query.strip().rstrip("?.!").strip())
+
+def classify(query):
+    """
+    Rule-based intent: ("connected", user_id), ("similar", name), ("field_location", (occupation, location))
+    or ("free_text", None).
+    """
+    text = _clean(query)
+    match = CONNECTED_RE.search(text)
+    if match:
+        return "connected", match.group(1)
+    match = SIMILAR_RE.search(text)
+    if match:
+        return "similar", match.group(1).strip()
+    try:
+        occupation, location = parse_occupation_and_location(text)
+    except ValueError:
+        return "free_text", None
+    # Keep "X in Y" to short noun phrases; longer sentences are left to the agent.
+    if 0 < len(occupation.split()) <= 5 and 0 < len(location.split()) <= 4:
+        return "field_location", (occupation, location)
+    return "free_text", None
+
+# ---------------- Optional MiniLM intent classifier ----------------
+INTENT_EXAMPLES = {
+    "similar": [
+        "find someone similar to Allison Hill",
+        "people like Michelle Miles",
+        "who has a background comparable to Carlos Walls",
+        "recommend profiles resembling Amy Underwood",
+    ],
+    "connected": [
+        "who is connected to user 3",
+        "connections of 7",
+        "people who share a school or company with user 12",
+        "who do I know through user 5",
+    ],
+    "field_location": [
+        "Software Engineers in San Jose",
+        "find product managers in New York",
+        "data scientists located in Seattle",
+        "designers based in Austin",
+    ],
+    "free_text": [
+        "someone passionate about open source and machine learning",
+        "who should I talk to about fundraising",
+        "recommend a mentor for my career change",
+        "experienced person in distributed systems and databases",
+    ],
+}
+
+class IntentClassifier:
+    """Nearest-centroid intent classifier over the retriever's MiniLM query embeddings."""
+
+    def __init__(self, encode=None):
+        import numpy as np
+        self._np = np
+        self.encode = encode or get_retriever().encode
+        self.intents = list(INTENT_EXAMPLES)
+        centroids = [self._unit(self.encode(INTENT_EXAMPLES[i]).mean(axis=0)) for i in self.intents]
+        self.centroids = np.vstack(centroids)
+
+    def _unit(self, v):
+        return v / (self._np.linalg.norm(v) or 1.0)
+
+    def predict(self, query):
+        scores = self.centroids @ self._unit(self.encode([query])[0])
+        best = int(scores.argmax())
+        return self.intents[best], float(scores[best])
+
+_classifier = None
+
+def _classify_loose(query, people):
+    """Intent from the classifier, with looser argument extraction than the rules."""
+    global _classifier
+    if _classifier is None:
+        _classifier = IntentClassifier()
+    intent, score = _classifier.predict(query)
+    if score < CLASSIFIER_THRESHOLD:
+        return "free_text", None
+    if intent == "connected":
+        ids = re.findall(r"\b(\d+)\b", query)
+        return ("connected", ids[-1]) if ids else ("free_text", None)
+    if intent == "similar":
+        words = re.findall(r"[A-Za-z][A-Za-z\.\-]*", query)
+        for size in (4, 3, 2):
+            for start in range(len(words) - size + 1):
+                name = " ".join(words[start:start + size])
+                if name.lower() in people["by_name"]:
+                    return "similar", name
+    return "free_text", None
+
+# ---------------- Profiles ----------------
+_people = {"version": None}
+_people_lock = threading.Lock()
+
+def load_people():
+    """by_name: lowercase name -> id, by_id: id -> profile dict; refreshed with the snapshot."""
+    meta = current_snapshot(snapshot_dir(DB_PATH))
+    version = meta["version"] if meta else None
+    with _people_lock:
+        if _people["version"] == version and "by_id" in _people:
+            return _people
+        table = read_columns(PROFILE_COLUMNS, snapshot_dir(DB_PATH))
+        if table is not None:
+            rows = zip(*(table.column(c).to_pylist() for c in PROFILE_COLUMNS))
+        else:
+            cols = ", ".join(f'"{c}"' for c in PROFILE_COLUMNS)
+            rows = get_connection_manager(DB_PATH).execute(f"SELECT {cols} FROM users").fetchall()
+        by_name, by_id = {}, {}
+        for uid, name, occupation, company, location in rows:
+            profile = {"id": str(uid), "name": (name or "").strip(), "occupation": occupation,
+                       "company": company, "location": location}
+            by_id[profile["id"]] = profile
+            by_name[profile["name"].lower()] = profile["id"]
+        _people.update(version=version, by_name=by_name, by_id=by_id)
+        return _people
+
+def reload_people():
+    """Drop the cached people map; the next load_people() reads it again."""
+    with _people_lock:
+        _people.clear()
+        _people["version"] = None
+
+def _describe(profile):
+    parts = [profile.get("occupation"), f"at {profile['company']}" if profile.get("company") else None,
+             f"in {profile['location']}" if profile.get("location") else None]
+    return " ".join(p for p in parts if p)
+
+# ---------------- Executors ----------------
+# Each executor over-fetches a little so feedback re-ranking (recommenders/feedback_rerank.py)
+# has room to promote someone just below the cut.
+def _run_field_location(query, args, top_k):
+    occupation, location = args
+    rows = find_by_field_and_location(DB_PATH, occupation, location, limit=top_k * 4)
+    rows = rerank(query, rows, key=lambda row: str(row[0]))
+    lines = [
+        f"{i}. {row[1]} — Rationale: {row[4]} at {row[5]} in {row[3]}."
+        for i, row in enumerate(rows[:top_k], start=1)
+    ]
+    return "SQLTool", f"{occupation} in {location}", format_user_rows(rows[:top_k]), lines
+
+def _run_similar(query, name, top_k, people):
+    user_id = people["by_name"].get(name.lower())
+    if user_id is None:
+        return None
+    # One indexed read when recommenders/precompute.py has run; live vector search otherwise.
+    precomputed = get_recommendations(user_id, DB_PATH, top_k * 2)
+    if precomputed:
+        precomputed = rerank(query, precomputed, key=lambda rec: str(rec[0]))[:top_k]
+        hits = []
+        lines = []
+        for i, (rec_id, score, reasons) in enumerate(precomputed, start=1):
+            profile = people["by_id"].get(str(rec_id), {"name": str(rec_id)})
+            hits.append(StoredHit(rec_id, score, {"user_id": str(rec_id), "user_name": profile["name"]}))
+            lines.append(f"{i}. {profile['name']} — Rationale: {_describe(profile) or 'similar background'}; {reasons}.")
+        return "VectorTool", name, format_hits(hits, people["by_id"]), lines
+    hits = rerank(query, get_retriever().search_similar_to_user(user_id, top_k * 2), key=lambda hit: str(hit.id))[:top_k]
+    lines = []
+    for i, hit in enumerate(hits, start=1):
+        profile = people["by_id"].get(str(hit.id), {})
+        hit_name = (hit.payload or {}).get("user_name") or profile.get("name", str(hit.id))
+        lines.append(f"{i}. {hit_name} — Rationale: {_describe(profile) or 'similar background'}; bio similarity {hit.score:.2f}.")
+    return "VectorTool", name, format_hits(hits, people["by_id"]), lines
+
+def _run_connected(query, user_id, top_k, people, graph_lookup):
+    rows = graph_lookup(user_id)
+    shared = {}
+    for _, org, other in rows:
+        shared.setdefault(other, []).append(org)
+    lines = []
+    ranked = rerank(query, list(shared.items()), key=lambda item: str(item[0]))
+    for i, (other, orgs) in enumerate(ranked[:top_k], start=1):
+        profile = people["by_id"].get(other, {"name": other})
+        lines.append(f"{i}. {profile['name']} — Rationale: shared {', '.join(orgs)}.")
+    return "GraphTool", user_id, format_connections(rows, people["by_id"]), lines
+
+# ---------------- Routing + stats ----------------
+_stats_lock = threading.Lock()
+_latencies = {"fast": [], "agent": []}
+MAX_SAMPLES = 10000
+
+def record(route, seconds):
+    with _stats_lock:
+        samples = _latencies[route]
+        samples.append(seconds)
+        if len(samples) > MAX_SAMPLES:
+            del samples[: len(samples) - MAX_SAMPLES]
+
+def router_stats():
+    """Share of queries answered on the fast path and latency percentiles per route (ms)."""
+    with _stats_lock:
+        counts = {route: len(samples) for route, samples in _latencies.items()}
+        total = sum(counts.values())
+        stats = {"queries": total, "fast_share": counts["fast"] / total if total else 0.0}
+        for route, samples in _latencies.items():
+            if samples:
+                ordered = sorted(samples)
+                stats[route] = {
+                    "count": len(samples),
+                    "p50_ms": statistics.median(ordered) * 1000,
+                    "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+                }
+        return stats
+
+def try_fast_path(query, graph_lookup, top_k=3):
+    """
+    Answer recognizable queries directly from the matching retriever. Returns an
+    agent-shaped dict ({"output", "intermediate_steps", ...}) or None to fall through.
+    Observations use the same compact formats as the agent's tools.
+    """
+    started = time.perf_counter()
+    intent, args = classify(query)
+    people = None
+    if intent == "free_text" and FAST_ROUTER_CLASSIFIER:
+        people = load_people()
+        intent, args = _classify_loose(query, people)
+    if intent == "free_text":
+        return None
+
+    try:
+        if intent == "field_location":
+            result = _run_field_location(query, args, top_k)
+        else:
+            people = people or load_people()
+            if intent == "similar":
+                result = _run_similar(query, args, top_k, people)
+            else:
+                result = _run_connected(query, args, top_k, people, graph_lookup)
+    except Exception as e:
+        print(f"[DEBUG] Fast path failed for {intent}, falling back to agent: {e}")
+        return None
+    if result is None or not result[3]:
+        return None
+
+    tool, tool_input, observation, lines = result
+    record("fast", time.perf_counter() - started)
+    return {
+        "input": query,
+        "output": "\n".join(lines),
+        "intermediate_steps": [(FastAction(tool, tool_input, f"fast-path:{intent}"), observation)],
+        "route": "fast",
+    }
@@ -0,0 +1,87 @@
+import math
+import os
+import threading
+import time
+
+from feedback.compactor import FEEDBACK_SCORES_PATH, HALF_LIFE_DAYS, decay_factor, query_pattern
+
+FEEDBACK_ITEM_WEIGHT = float(os.getenv("FEEDBACK_ITEM_WEIGHT", "0.4"))
+FEEDBACK_PATTERN_WEIGHT = float(os.getenv("FEEDBACK_PATTERN_WEIGHT", "0.6"))
+FEEDBACK_MAX_SHIFT = float(os.getenv("FEEDBACK_MAX_SHIFT", "2"))   # most places feedback can move an item
+RELOAD_SECONDS = 3600    # re-apply decay even when no new export arrives
+
+class FeedbackReranker:
+    """
+    Nudges retriever results with compacted thumbs up/down (feedback/compactor.py). Scores are
+    held in two dicts, so a query costs one lookup per candidate plus sorting k items.
+    A candidate at rank r moves to r - FEEDBACK_MAX_SHIFT * boost, where boost in [-1, 1]
+    blends tanh(decayed score) for the person overall and for this query pattern.
+    """
+
+    def __init__(self, path=FEEDBACK_SCORES_PATH, half_life_days=HALF_LIFE_DAYS):
+        self.path = path
+        self.half_life_days = half_life_days
+        self._items = {}
+        self._patterns = {}
+        self._mtime = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime and time.time() - self._loaded_at < RELOAD_SECONDS:
+            return
+        with self._lock:
+            import pyarrow.parquet as pq
+            table = pq.read_table(self.path, columns=["pattern", "recommended_id", "score", "last_ts"])
+            now = time.time()
+            items, patterns = {}, {}
+            for pattern, rec_id, score, last_ts in zip(*(table.column(c).to_pylist() for c in table.column_names)):
+                decayed = score * decay_factor(now - last_ts, self.half_life_days)
+                if pattern:
+                    patterns[(pattern, rec_id)] = decayed
+                else:
+                    items[rec_id] = decayed
+            self._items, self._patterns = items, patterns
+            self._mtime, self._loaded_at = mtime, time.time()
+
+    def boost(self, pattern, item_id):
+        item_id = str(item_id)
+        total = FEEDBACK_ITEM_WEIGHT + FEEDBACK_PATTERN_WEIGHT
+        return (FEEDBACK_ITEM_WEIGHT * math.tanh(self._items.get(item_id, 0.0))
+                + FEEDBACK_PATTERN_WEIGHT * math.tanh(self._patterns.get((pattern, item_id), 0.0))) / total
+
+    def rerank(self, query, items, key=lambda item: item):
+        """Reorder `items` (best first) by feedback; items without feedback keep their order."""
+        items = list(items)
+        self._refresh()
+        if not self._items:
+            return items
+        pattern = query_pattern(query)
+        adjusted = [
+            (rank - FEEDBACK_MAX_SHIFT * self.boost(pattern, key(item)), rank, item)
+            for rank, item in enumerate(items)
+        ]
+        adjusted.sort(key=lambda a: (a[0], a[1]))
+        return [item for _, _, item in adjusted]
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+def get_reranker():
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = FeedbackReranker()
+        return _reranker
+
+def rerank(query, items, key=lambda item: item):
+    """Feedback-aware order, or the input order if feedback is unavailable."""
+    try:
+        return get_reranker().rerank(query, items, key)
+    except Exception as e:
+        print(f"[DEBUG] Feedback re-rank skipped: {e}")
+        return list(items)
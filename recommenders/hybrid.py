@@ -0,0 +1,113 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from recommenders.fast_router import classify, load_people, parse_occupation_and_location
+from recommenders.feedback_rerank import rerank
+from retrievers.sql import DB_PATH, find_by_field_and_location
+from retrievers.vector import find_similar_bios, get_retriever
+
+RRF_K = 60
+DEFAULT_WEIGHTS = {"sql": 1.0, "vector": 1.0, "graph": 0.7}
+# Per-retriever budgets in seconds; the slowest one bounds the whole call.
+DEFAULT_TIMEOUTS = {
+    "sql": float(os.getenv("HYBRID_SQL_TIMEOUT", "0.5")),
+    "vector": float(os.getenv("HYBRID_VECTOR_TIMEOUT", "2.0")),
+    "graph": float(os.getenv("HYBRID_GRAPH_TIMEOUT", "1.5")),
+}
+
+# Shared pool: a retriever that overruns its budget keeps its thread until it returns,
+# so leave headroom for a few stragglers.
+_executor = ThreadPoolExecutor(max_workers=12, thread_name_prefix="hybrid")
+
+def _unique(ids):
+    seen = set()
+    return [i for i in ids if not (i in seen or seen.add(i))]
+
+def _sql_ids(field, location, top_k):
+    return _unique(str(row[0]) for row in find_by_field_and_location(DB_PATH, field, location, limit=top_k))
+
+def _vector_ids(query, top_k, user_id=None, nprobe=None):
+    if user_id is not None:
+        hits = get_retriever().search_similar_to_user(user_id, top_k, nprobe)
+    else:
+        hits = find_similar_bios(query_text=query, top_k=top_k, nprobe=nprobe)
+    return _unique(str(hit.id) for hit in hits)
+
+def _graph_ids(graph_lookup, user_id):
+    return _unique(to_id for _, _, to_id in graph_lookup(user_id))
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+def reciprocal_rank_fusion(ranked, weights=None, k=RRF_K):
+    """
+    Merge {retriever: [id, ...]} lists by weighted RRF: score(id) = sum w_r / (k + rank_r(id)).
+    Each candidate keeps the rank it had in every retriever that returned it.
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    scores, sources = {}, {}
+    for name, ids in ranked.items():
+        weight = weights.get(name, 1.0)
+        for rank, candidate in enumerate(ids, start=1):
+            scores[candidate] = scores.get(candidate, 0.0) + weight / (k + rank)
+            sources.setdefault(candidate, {})[name] = rank
+    fused = [{"user_id": c, "score": s, "sources": sources[c]} for c, s in scores.items()]
+    fused.sort(key=lambda c: (-c["score"], c["user_id"]))
+    return fused
+
+def hybrid_search(query, graph_lookup=None, top_k=10, weights=None, timeouts=None, nprobe=None):
+    """
+    Run SQL, vector and graph retrieval concurrently for one query and fuse the results.
+    Retrievers the query's intent does not use are skipped; ones that miss their timeout or
+    raise are reported in "retrievers" and left out of the fusion. nprobe is passed to an
+    ivfpq vector backend.
+    """
+    timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+    intent, args = classify(query)
+    # Loaded alongside the retrievers; only a "similar" query needs it before they start.
+    people = _executor.submit(load_people)
+
+    user_id = None
+    if intent == "connected":
+        user_id = args
+    elif intent == "similar":
+        user_id = people.result()["by_name"].get(args.lower())
+    field_location = args if intent == "field_location" else None
+    if field_location is None and intent == "free_text":
+        try:
+            field_location = parse_occupation_and_location(query)
+        except ValueError:
+            pass
+
+    # Only the retrievers this intent uses: a "connected" query is answered by the graph alone.
+    jobs = {}
+    if intent != "connected":
+        jobs["vector"] = (_vector_ids, (query, top_k, user_id if intent == "similar" else None, nprobe))
+    if field_location:
+        jobs["sql"] = (_sql_ids, (*field_location, top_k))
+    if user_id is not None and graph_lookup is not None:
+        jobs["graph"] = (_graph_ids, (graph_lookup, user_id))
+
+    started = time.perf_counter()
+    futures = {name: _executor.submit(_timed, fn, *fn_args) for name, (fn, fn_args) in jobs.items()}
+    ranked, report = {}, {}
+    for name in sorted(futures, key=lambda n: timeouts[n]):
+        remaining = timeouts[name] - (time.perf_counter() - started)
+        try:
+            ids, latency_ms = futures[name].result(timeout=max(0.0, remaining))
+            ranked[name] = ids[:top_k]
+            report[name] = {"status": "ok", "count": len(ranked[name]), "latency_ms": latency_ms}
+        except FutureTimeout:
+            report[name] = {"status": "timeout", "latency_ms": timeouts[name] * 1000}
+        except Exception as e:
+            report[name] = {"status": f"error: {e}", "latency_ms": (time.perf_counter() - started) * 1000}
+
+    candidates = [c for c in reciprocal_rank_fusion(ranked, weights) if c["user_id"] != str(user_id)]
+    candidates = rerank(query, candidates, key=lambda c: c["user_id"])[:top_k]
+    people = people.result()
+    for candidate in candidates:
+        candidate["name"] = people["by_id"].get(candidate["user_id"], {}).get("name", candidate["user_id"])
+    return {"candidates": candidates, "retrievers": report}
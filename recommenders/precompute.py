@@ -0,0 +1,264 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from qdrant_client import QdrantClient
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from ingest.load_profiles import staged_database
+from retrievers.graph_local import GRAPH_PATH, get_local_graph
+
+DB_PATH = "data/users.db"
+QDRANT_PATH = "data/tmp/my_qdrant_data"
+QDRANT_COLLECTION_NAME = "user_embeddings"
+CHANGED_PATH = "data/parsed_bios.changed.json"
+TOP_K = 10
+CANDIDATES = 30          # cosine neighbours kept per user before blending in the graph
+ROW_BLOCK = 1024
+COL_BLOCK = 16384
+GRAPH_WEIGHT = 0.3       # share of the final score that comes from shared orgs
+SHARED_ORG_CAP = 3       # shared-org count at which the graph term saturates
+
+RECOMMENDATIONS_SCHEMA = pa.schema([
+    ("user_id", pa.string()),
+    ("rank", pa.int32()),
+    ("rec_id", pa.string()),
+    ("score", pa.float64()),
+    ("reasons", pa.string()),
+])
+
+def load_embeddings(client, work_dir):
+    """Page every vector out of Qdrant into a unit-normalized float32 memmap; returns (ids, matrix)."""
+    info = client.get_collection(QDRANT_COLLECTION_NAME)
+    count = client.count(QDRANT_COLLECTION_NAME, exact=True).count
+    dim = info.config.params.vectors.size
+    matrix = np.memmap(os.path.join(work_dir, "vectors.f32"), dtype=np.float32, mode="w+", shape=(max(count, 1), dim))
+    ids = []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=QDRANT_COLLECTION_NAME, limit=2048, offset=offset,
+            with_payload=False, with_vectors=True
+        )
+        if points:
+            block = np.asarray([p.vector for p in points], dtype=np.float32)
+            block /= np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)
+            matrix[len(ids):len(ids) + len(points)] = block
+            ids.extend(str(p.id) for p in points)
+        if offset is None:
+            break
+    return ids, matrix[:len(ids)]
+
+def blocked_top_k(matrix, rows, k):
+    """
+    Cosine top-k for `rows` against every vector, computed ROW_BLOCK x COL_BLOCK at a time so
+    memory stays at one block of scores regardless of corpus size. Yields (row, ids, sims).
+    """
+    n = matrix.shape[0]
+    k = min(k, n - 1)
+    for start in range(0, len(rows), ROW_BLOCK):
+        block_rows = np.asarray(rows[start:start + ROW_BLOCK])
+        queries = np.asarray(matrix[block_rows])
+        best_sims = np.full((len(block_rows), 0), -np.inf, dtype=np.float32)
+        best_idx = np.zeros((len(block_rows), 0), dtype=np.int64)
+        for col in range(0, n, COL_BLOCK):
+            block_sims = queries @ np.asarray(matrix[col:col + COL_BLOCK]).T
+            # Never recommend a user to themself.
+            self_cols = block_rows - col
+            inside = (self_cols >= 0) & (self_cols < block_sims.shape[1])
+            block_sims[np.nonzero(inside)[0], self_cols[inside]] = -np.inf
+            block_idx = np.broadcast_to(np.arange(col, col + block_sims.shape[1]), block_sims.shape)
+            sims = np.concatenate([best_sims, block_sims], axis=1)
+            idx = np.concatenate([best_idx, block_idx], axis=1)
+            if sims.shape[1] > k:
+                keep = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+                sims = np.take_along_axis(sims, keep, axis=1)
+                idx = np.take_along_axis(idx, keep, axis=1)
+            best_sims, best_idx = sims, idx
+        for row, r_idx, r_sims in zip(block_rows, best_idx, best_sims):
+            order = np.argsort(-r_sims)
+            yield int(row), r_idx[order], r_sims[order]
+
+def blend(user_id, row, cand_idx, cand_sims, ids, positions, matrix, graph, top_k):
+    """Mix cosine similarity with shared-org counts; graph neighbours join the candidate pool."""
+    sims = {int(j): float(s) for j, s in zip(cand_idx, cand_sims) if np.isfinite(s)}
+    shared = {}
+    if graph is not None:
+        for other_id, count in graph.neighbours(user_id).items():
+            j = positions.get(other_id)
+            if j is not None:
+                shared[j] = count
+                if j not in sims:
+                    sims[j] = float(np.dot(matrix[row], matrix[j]))
+    scored = []
+    for j, sim in sims.items():
+        graph_term = min(shared.get(j, 0), SHARED_ORG_CAP) / SHARED_ORG_CAP
+        score = (1 - GRAPH_WEIGHT) * sim + GRAPH_WEIGHT * graph_term
+        reasons = [f"bio similarity {sim:.2f}"]
+        if shared.get(j):
+            reasons.append("shared orgs: " + ", ".join(graph.shared_orgs(user_id, ids[j])))
+        scored.append((score, ids[j], "; ".join(reasons)))
+    scored.sort(key=lambda r: (-r[0], r[1]))
+    return scored[:top_k]
+
+def changed_users(db_path, changed_path=CHANGED_PATH):
+    """
+    (users to recompute, removed users, changed/added users). The first set holds the changed
+    and added users plus anyone whose list points at a changed or removed user; users a changed
+    vector should newly enter are added by entering_users() once the vectors are loaded.
+    """
+    with open(changed_path) as f:
+        changes = json.load(f)
+    touched = set(changes.get("added", [])) | set(changes.get("updated", []))
+    removed = set(changes.get("removed", []))
+    affected = set(touched)
+    if os.path.exists(db_path) and (touched | removed):
+        conn = duckdb.connect(db_path, read_only=True)
+        try:
+            rows = conn.execute(
+                "SELECT DISTINCT user_id FROM recommendations WHERE list_contains(?, rec_id)",
+                [sorted(touched | removed)],
+            ).fetchall()
+            affected.update(r[0] for r in rows)
+        except duckdb.CatalogException:
+            pass
+        finally:
+            conn.close()
+    return affected - removed, removed, touched
+
+def stored_thresholds(db_path, top_k):
+    """user_id -> lowest stored score, for users whose list is full; a better score would get in."""
+    if not os.path.exists(db_path):
+        return {}
+    conn = duckdb.connect(db_path, read_only=True)
+    try:
+        rows = conn.execute(
+            "SELECT user_id, min(score) FROM recommendations GROUP BY user_id HAVING count(*) >= ?", [top_k]
+        ).fetchall()
+    except duckdb.CatalogException:
+        rows = []
+    finally:
+        conn.close()
+    return dict(rows)
+
+def entering_users(matrix, ids, positions, touched, graph, thresholds):
+    """
+    Users whose stored list one of the `touched` users now beats. Every changed vector is
+    scored against every user with the same blend as blend(), ROW_BLOCK x COL_BLOCK at a
+    time, and compared with the user's lowest stored score. Users without a full stored
+    list always qualify.
+    """
+    n = matrix.shape[0]
+    threshold = np.array([thresholds.get(uid, -np.inf) for uid in ids], dtype=np.float32)
+    touched_rows = sorted(positions[uid] for uid in touched if uid in positions)
+    entering = np.zeros(n, dtype=bool)
+    for start in range(0, len(touched_rows), ROW_BLOCK):
+        block_rows = np.asarray(touched_rows[start:start + ROW_BLOCK])
+        queries = np.asarray(matrix[block_rows])
+        # Shared-org terms of each changed user: (block position, column, graph term).
+        g_pos, g_col, g_term = [], [], []
+        if graph is not None:
+            for bi, row in enumerate(block_rows):
+                for other_id, count in graph.neighbours(ids[row]).items():
+                    j = positions.get(other_id)
+                    if j is not None:
+                        g_pos.append(bi)
+                        g_col.append(j)
+                        g_term.append(min(count, SHARED_ORG_CAP) / SHARED_ORG_CAP)
+        g_pos, g_col, g_term = np.asarray(g_pos, dtype=np.int64), np.asarray(g_col, dtype=np.int64), np.asarray(g_term, dtype=np.float32)
+        for col in range(0, n, COL_BLOCK):
+            scores = (1 - GRAPH_WEIGHT) * (queries @ np.asarray(matrix[col:col + COL_BLOCK]).T)
+            inside = (g_col >= col) & (g_col < col + scores.shape[1])
+            np.add.at(scores, (g_pos[inside], g_col[inside] - col), GRAPH_WEIGHT * g_term[inside])
+            self_cols = block_rows - col
+            own = (self_cols >= 0) & (self_cols < scores.shape[1])
+            scores[np.nonzero(own)[0], self_cols[own]] = -np.inf
+            entering[col:col + scores.shape[1]] |= (scores > threshold[col:col + scores.shape[1]]).any(axis=0)
+    return {ids[j] for j in np.nonzero(entering)[0]}
+
+def write_recommendations(db_path, parquet_path, users=None, removed=()):
+    """Replace all rows (users=None) or only the given users' rows, then index by user_id."""
+    path = parquet_path.replace("'", "''")
+    with staged_database(db_path, copy_existing=True) as staged_path:
+        conn = duckdb.connect(staged_path)
+        try:
+            if users is None:
+                conn.execute(
+                    f"CREATE OR REPLACE TABLE recommendations AS "
+                    f"SELECT * FROM read_parquet('{path}') ORDER BY user_id, rank"
+                )
+            else:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS recommendations "
+                    "(user_id VARCHAR, rank INTEGER, rec_id VARCHAR, score DOUBLE, reasons VARCHAR)"
+                )
+                conn.execute(
+                    "DELETE FROM recommendations WHERE list_contains(?, user_id)",
+                    [sorted(set(users) | set(removed))],
+                )
+                conn.execute(f"INSERT INTO recommendations SELECT * FROM read_parquet('{path}')")
+            conn.execute("CREATE INDEX IF NOT EXISTS recommendations_user_id ON recommendations (user_id)")
+        finally:
+            conn.close()
+
+def main(top_k=TOP_K, only_changed=False, db_path=DB_PATH):
+    started = time.perf_counter()
+    users, removed, touched = None, set(), set()
+    if only_changed:
+        users, removed, touched = changed_users(db_path)
+        if not users and not removed:
+            print("No changed users; recommendations are up to date.")
+            return
+
+    client = QdrantClient(path=QDRANT_PATH)
+    graph = get_local_graph(GRAPH_PATH) if os.path.exists(os.path.join(GRAPH_PATH, "meta.json")) else None
+    if graph is None:
+        print("No local graph found; scores use bio similarity only.")
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(db_path))) as work_dir:
+        ids, matrix = load_embeddings(client, work_dir)
+        if len(ids) < 2:
+            print("Not enough embeddings to recommend from.")
+            return
+        positions = {uid: j for j, uid in enumerate(ids)}
+        if users is not None and touched:
+            entering = entering_users(matrix, ids, positions, touched, graph, stored_thresholds(db_path, top_k))
+            print(f"{len(entering - users)} unchanged users get a changed user in their top-{top_k}")
+            users = (users | entering) - removed
+        rows = list(range(len(ids))) if users is None else [i for i, uid in enumerate(ids) if uid in users]
+        print(f"Loaded {len(ids)} embeddings; computing top-{top_k} for {len(rows)} users")
+
+        parquet_path = os.path.join(work_dir, "recommendations.parquet")
+        written = 0
+        with pq.ParquetWriter(parquet_path, RECOMMENDATIONS_SCHEMA) as writer:
+            batch = {name: [] for name in RECOMMENDATIONS_SCHEMA.names}
+            for row, cand_idx, cand_sims in blocked_top_k(matrix, rows, max(CANDIDATES, top_k)):
+                user_id = ids[row]
+                for rank, (score, rec_id, reasons) in enumerate(
+                        blend(user_id, row, cand_idx, cand_sims, ids, positions, matrix, graph, top_k), start=1):
+                    for name, value in zip(RECOMMENDATIONS_SCHEMA.names, (user_id, rank, rec_id, score, reasons)):
+                        batch[name].append(value)
+                if len(batch["user_id"]) >= 100_000:
+                    writer.write_table(pa.table(batch, schema=RECOMMENDATIONS_SCHEMA))
+                    written += len(batch["user_id"])
+                    batch = {name: [] for name in RECOMMENDATIONS_SCHEMA.names}
+            writer.write_table(pa.table(batch, schema=RECOMMENDATIONS_SCHEMA))
+            written += len(batch["user_id"])
+
+        del matrix
+        write_recommendations(db_path, parquet_path, users, removed)
+    print(f"Wrote {written} recommendations for {len(rows)} users to {db_path} in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute top-k recommendations for every user.")
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--changed", action="store_true", help=f"only recompute users listed in {CHANGED_PATH} and the lists they change or now enter")
+    args = parser.parse_args()
+    main(top_k=args.top_k, only_changed=args.changed)
@@ -0,0 +1,5 @@
+import re
+
+def normalize(query):
+    """Lowercased, whitespace-collapsed query without trailing punctuation; the key shared by caches and feedback."""
+    return re.sub(r"\s+", " ", (query or "").strip().lower()).rstrip("?.! ")
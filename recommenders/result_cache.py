@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from recommenders.query_text import normalize
+
+USERS_DB_PATH = "data/users.db"
+QDRANT_COLLECTION_PATH = "data/tmp/my_qdrant_data/collection/user_embeddings"
+GRAPH_META_PATH = "data/graph/meta.json"
+FEEDBACK_SCORES_PATH = "data/feedback_scores.parquet"
+# Same defaults as retrievers/vector.py.
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "data/vector_store")
+ANN_INDEX_PATH = os.getenv("ANN_INDEX_PATH", "data/ann_index")
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "512"))
+RESULT_CACHE_SIM_THRESHOLD = float(os.getenv("RESULT_CACHE_SIM_THRESHOLD", "0.97"))
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "data/tmp/result_cache.sqlite")
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", str(24 * 3600)))
+
+NUMBER_RE = re.compile(r"\d+")
+NAME_RE = re.compile(r"[A-Z][\w'\-]*")
+
+def query_anchors(query):
+    """
+    Digits and capitalised words (names, places, acronyms) of the raw query. Embeddings barely
+    move between "user 3" and "user 5" or "Allison Hill" and "Allison Hall", so a near-duplicate
+    hit also needs these to match exactly. The first word only counts when the next is
+    capitalised too, so a leading "Find" or "Show" does not block a hit. The fast-router parse
+    adds the person or location for queries typed in lowercase.
+    """
+    words = (query or "").split()
+    names = [w.strip("?.!,;:\"()") for w in words]
+    names = [w for i, w in enumerate(names)
+             if NAME_RE.fullmatch(w) and (i > 0 or (len(names) > 1 and NAME_RE.fullmatch(names[1])))]
+    anchors = set(NUMBER_RE.findall(query or "")) | {w.lower() for w in names}
+    try:
+        from recommenders.fast_router import classify
+        intent, args = classify(query or "")
+    except Exception:
+        intent, args = "free_text", None
+    if intent in ("similar", "connected"):
+        anchors.add(f"{intent}:{normalize(args)}")
+    elif intent == "field_location":
+        anchors.add(f"location:{normalize(args[1])}")
+    return tuple(sorted(anchors))
+
+def _stat_token(path):
+    try:
+        stat = os.stat(path)
+        return f"{stat.st_ino}:{stat.st_mtime_ns}:{stat.st_size}"
+    except FileNotFoundError:
+        return "-"
+
+def _build_id(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f).get("build_id", "-")
+    except (FileNotFoundError, json.JSONDecodeError):
+        return "-"
+
+def data_version():
+    """
+    Fingerprint of the data the retrievers read: the users.db file, the Qdrant collection
+    storage and the build ids of the local graph, the numpy vector store and the IVF-PQ
+    index. Any ingest or re-index changes it; the app reloads its resources when it does.
+    """
+    qdrant = ",".join(
+        _stat_token(os.path.join(QDRANT_COLLECTION_PATH, name))
+        for name in sorted(os.listdir(QDRANT_COLLECTION_PATH))
+    ) if os.path.isdir(QDRANT_COLLECTION_PATH) else "-"
+    raw = "|".join([
+        _stat_token(USERS_DB_PATH), qdrant, _build_id(GRAPH_META_PATH),
+        _build_id(os.path.join(VECTOR_STORE_PATH, "meta.json")), _build_id(os.path.join(ANN_INDEX_PATH, "CURRENT.json")),
+    ])
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+def cache_version():
+    """
+    data_version() plus the compacted feedback scores, which reorder results without touching
+    the data. Kept apart so a compaction only invalidates cached results, never the resources.
+    """
+    feedback = hashlib.sha1(_stat_token(FEEDBACK_SCORES_PATH).encode()).hexdigest()[:8]
+    return f"{data_version()}-{feedback}"
+
+class ResultCache:
+    """
+    Recommendation cache with three layers, checked in order:
+    exact normalized query -> near-duplicate query embedding with the same ids and names
+    (query_anchors) -> on-disk SQLite with TTL.
+    Every entry is tagged with cache_version(); entries from an older version never hit.
+    Values must be JSON-serializable.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, similarity_threshold=RESULT_CACHE_SIM_THRESHOLD,
+                 disk_path=RESULT_CACHE_PATH, ttl=RESULT_CACHE_TTL, encode=None):
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self._encode = encode
+        self._memory = OrderedDict()   # key -> (version, value, compute_ms, vector, anchors)
+        self._lock = threading.Lock()
+        self.stats_counts = {"exact": 0, "near": 0, "disk": 0, "miss": 0}
+        self.saved_ms = 0.0
+        self._db = None
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key TEXT PRIMARY KEY, version TEXT, created REAL, compute_ms REAL, value TEXT)"
+            )
+            self._db.commit()
+
+    def _vector(self, key):
+        if self.similarity_threshold >= 1.0:
+            return None
+        try:
+            if self._encode is None:
+                from retrievers.vector import get_retriever
+                self._encode = get_retriever().encode
+            vector = np.asarray(self._encode([key])[0], dtype=np.float32)
+            return vector / (np.linalg.norm(vector) or 1.0)
+        except Exception:
+            self.similarity_threshold = 1.0   # no embedding model here: disable the near layer
+            return None
+
+    def _hit(self, layer, compute_ms):
+        self.stats_counts[layer] += 1
+        self.saved_ms += compute_ms
+
+    def _remember(self, key, version, value, compute_ms, vector, anchors):
+        self._memory[key] = (version, value, compute_ms, vector, anchors)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, query, version=None):
+        key = normalize(query)
+        version = version or cache_version()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[0] == version:
+                self._memory.move_to_end(key)
+                self._hit("exact", entry[2])
+                return entry[1]
+            # Drop entries built against older data.
+            for stale in [k for k, e in self._memory.items() if e[0] != version]:
+                del self._memory[stale]
+
+        vector = self._vector(key)
+        anchors = query_anchors(query)
+        if vector is not None:
+            with self._lock:
+                candidates = [(k, e) for k, e in self._memory.items() if e[3] is not None and e[4] == anchors]
+                if candidates:
+                    sims = np.vstack([e[3] for _, e in candidates]) @ vector
+                    best = int(sims.argmax())
+                    if sims[best] >= self.similarity_threshold:
+                        _, entry = candidates[best]
+                        self._hit("near", entry[2])
+                        return entry[1]
+
+        if self._db is not None:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT value, compute_ms FROM results WHERE key = ? AND version = ? AND created >= ?",
+                    (key, version, time.time() - self.ttl),
+                ).fetchone()
+                if row:
+                    value = json.loads(row[0])
+                    self._remember(key, version, value, row[1], vector, anchors)
+                    self._hit("disk", row[1])
+                    return value
+
+        with self._lock:
+            self.stats_counts["miss"] += 1
+        return None
+
+    def put(self, query, value, compute_ms=0.0, version=None):
+        key = normalize(query)
+        version = version or cache_version()
+        vector = self._vector(key)
+        with self._lock:
+            self._remember(key, version, value, compute_ms, vector, query_anchors(query))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                    (key, version, time.time(), compute_ms, json.dumps(value)),
+                )
+                self._db.execute("DELETE FROM results WHERE created < ?", (time.time() - self.ttl,))
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            hits = sum(v for k, v in self.stats_counts.items() if k != "miss")
+            lookups = hits + self.stats_counts["miss"]
+            return {
+                **self.stats_counts,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "saved_ms": self.saved_ms,
+                "entries": len(self._memory),
+            }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_result_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
@@ -1,83 +1,199 @@
-from langchain.tools import Tool
-from langchain.agents import initialize_agent
-from langchain_openai import ChatOpenAI
-
 import sys
 import os
+import queue
+import threading
+import time
 from dotenv import load_dotenv
 
 # Load .env and environment variables
 load_dotenv()
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from retrievers.sql import find_by_field_and_location
-from retrievers.sql import run_duckdb_query
+# LangChain/OpenAI, torch, Qdrant and neo4j load only when the agent or a tool first needs them.
+from retrievers.sql import DB_PATH, find_by_field_and_location, get_connection_manager
 from retrievers.vector import find_similar_bios
+from retrievers.bio_store import get_bio
 from retrievers.graph import find_connections_2_hops
+from recommenders.fast_router import load_people, parse_occupation_and_location, record, router_stats, try_fast_path
+from recommenders.hybrid import hybrid_search
+from recommenders.tool_format import (
+    DUCKDB_AUTO_LIMIT, TOOL_MAX_CHARS, format_connections, format_hits, format_hybrid,
+    format_table, format_user_rows, limit_query,
+)
 
-def parse_occupation_and_location(query):
-    """
-    Extracts occupation and location from a prompt like:
-    "Find Software Engineers in San Jose"
-    """
-    import re
-    match = re.search(r"(.*?)\s+in\s+(.*)", query, re.IGNORECASE)
-    if match:
-        occupation = match.group(1).strip().strip('"\'')
-        location = match.group(2).strip().strip('"\'')
-        return occupation, location
-    else:
-        raise ValueError("Query does not match expected format: 'Find [Occupation] in [Location]'")
-
-duckdb_tool = Tool(
-    name="DuckDBTool",
-    func=lambda query: run_duckdb_query(query),
-    description=(
-        "Use this tool to run any SQL query on the DuckDB users database. "
-        "These are available fields: ID,Full Name,Email,Location,Occupation,Company,School,Resume File,LinkedIn Bio"
-        "Use singular noun form for the search, and allow ILIKE query"
+NEO4J_URI = os.getenv("NEO4J_URI", "neo4j+s://773bb327.databases.neo4j.io")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "9wWybaxJYJgvj2FeW4TIzPEGyOQzSSjU6tr-U-gOxUc")
+
+def graph_lookup(user_id):
+    return find_connections_2_hops(uri=NEO4J_URI, user=NEO4J_USER, password=NEO4J_PASSWORD, user_id=user_id)
+
+def _profiles():
+    try:
+        return load_people()["by_id"]
+    except Exception:
+        return {}
+
+def duckdb_observation(query):
+    """Ad-hoc SQL with an automatic LIMIT, rendered as a clipped table."""
+    sql, _ = limit_query(query)
+    try:
+        cursor = get_connection_manager(DB_PATH).execute_read_only(sql)
+        # fetchmany keeps the cap even if the wrapper ever leaves a query alone.
+        rows = cursor.fetchmany(DUCKDB_AUTO_LIMIT + 1)
+    except Exception as e:
+        return f"[DuckDB Error] {str(e)}"
+    columns = [d[0] for d in cursor.description]
+    return format_table(columns, rows[:DUCKDB_AUTO_LIMIT], truncated=len(rows) > DUCKDB_AUTO_LIMIT)
+
+def build_tools():
+    """Every tool returns one of the compact formats in recommenders/tool_format.py."""
+    from langchain.tools import Tool
+
+    duckdb_tool = Tool(
+        name="DuckDBTool",
+        func=duckdb_observation,
+        description=(
+            "Use this tool to run any SQL query on the DuckDB users database. "
+            "These are available fields: ID,Full Name,Email,Location,Occupation,Company,School,Resume File,LinkedIn Bio"
+            "Use singular noun form for the search, and allow ILIKE query"
+        )
     )
-)
 
-tools = [
-    duckdb_tool,
-    Tool(
-        name="SQLTool",
-        func=lambda query: find_by_field_and_location("data/users.db", *parse_occupation_and_location(query)),
-        description="Use this to find most relevant 3 people when the both job title and location are specified. (e.g., 'Software Engineers in San Jose')"
-    ),
-    Tool(
-        name="VectorTool",
-        func=lambda query: find_similar_bios("data/tmp/my_qdrant_data", "user_embeddings", query),
-        description="Use this when the user wants to find most relevant 3 people similar in background or experience. Useful for queries like 'someone like X' or 'similar bio to a person at company Y'."
-    ),
-    Tool(
-        name="GraphTool",
-        func=lambda query: find_connections_2_hops(
-            uri="neo4j+s://773bb327.databases.neo4j.io",
-            user="neo4j",
-            password="9wWybaxJYJgvj2FeW4TIzPEGyOQzSSjU6tr-U-gOxUc",
-            user_id=query.split()[-1].strip("'\"")
+    return [
+        duckdb_tool,
+        Tool(
+            name="SQLTool",
+            func=lambda query: format_user_rows(find_by_field_and_location(DB_PATH, *parse_occupation_and_location(query))),
+            description="Use this to find most relevant 3 people when the both job title and location are specified. (e.g., 'Software Engineers in San Jose')"
+        ),
+        Tool(
+            name="VectorTool",
+            func=lambda query: format_hits(find_similar_bios("data/tmp/my_qdrant_data", "user_embeddings", query), _profiles()),
+            description="Use this when the user wants to find most relevant 3 people similar in background or experience. Useful for queries like 'someone like X' or 'similar bio to a person at company Y'."
         ),
-        description="Use this to find most relevant 3 people connected to a given user ID (e.g., '1') via shared schools or companies, up to 2 hops."
+        Tool(
+            name="BioTool",
+            func=lambda query: (get_bio(query.split()[-1].strip("'\"")) or "No bio indexed for that user ID.")[:TOOL_MAX_CHARS],
+            description="Use this to read the full bio of one user ID (e.g., '1') when the snippet returned by VectorTool is not enough."
+        ),
+        Tool(
+            name="GraphTool",
+            func=lambda query: format_connections(graph_lookup(query.split()[-1].strip("'\"")), _profiles()),
+            description="Use this to find most relevant 3 people connected to a given user ID (e.g., '1') via shared schools or companies, up to 2 hops."
+        ),
+        Tool(
+            name="HybridTool",
+            func=lambda query: format_hybrid(hybrid_search(query, graph_lookup=graph_lookup, top_k=5), _profiles()),
+            description="Use this for open-ended requests that mix criteria (role, place, background, connections). Runs SQL, vector and graph search together and returns fused candidates with the retrievers that found each one."
+        )
+    ]
+
+def build_llm():
+    from langchain_openai import ChatOpenAI
+    # streaming=True only changes how tokens arrive; invoke() still returns the full message.
+    return ChatOpenAI(model="gpt-4-turbo", temperature=0, streaming=True, stream_usage=True)
+
+def build_agent(tools=None, llm=None):
+    from langchain.agents import initialize_agent
+    return initialize_agent(
+        tools or build_tools(),
+        llm or build_llm(),
+        agent="zero-shot-react-description",
+        verbose=True,
+        handle_parsing_errors=True,
+        return_intermediate_steps=True
     )
-]
 
-llm = ChatOpenAI(model="gpt-4-turbo", temperature=0)
+_agent = None
+_agent_lock = threading.Lock()
 
-agent = initialize_agent(
-    tools,
-    llm,
-    agent="zero-shot-react-description",
-    verbose=True,
-    handle_parsing_errors=True,
-    return_intermediate_steps=True
-)
+def get_agent():
+    """The process-wide agent, built on first use."""
+    global _agent
+    with _agent_lock:
+        if _agent is None:
+            _agent = build_agent()
+        return _agent
+
+def __getattr__(name):
+    # `from router_agent import agent` keeps working, but builds the agent only when asked for.
+    if name == "agent":
+        return get_agent()
+    if name == "tools":
+        return build_tools()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def answer(query, prompt=None):
+    """
+    Answer `query` on the deterministic fast path when its shape is recognized, otherwise
+    hand `prompt` (the query plus any formatting instructions) to the agent.
+    """
+    response = try_fast_path(query, graph_lookup)
+    if response is not None:
+        return response
+    from recommenders.agent_callbacks import TokenLogger
+    started = time.perf_counter()
+    tokens = TokenLogger()
+    response = get_agent().invoke(prompt or query, config={"callbacks": [tokens]})
+    record("agent", time.perf_counter() - started)
+    response["token_steps"] = tokens.steps
+    return response
+
+def stream_answer(query, prompt=None):
+    """
+    Like answer(), but yields events as they happen:
+      {"type": "route", "route": "fast" | "agent"}
+      {"type": "tool_start", "tool", "input"} / {"type": "tool_end", "tool", "observation"}
+      {"type": "token", "text"}                   final-answer text, in order
+      {"type": "final", "response"} or {"type": "error", "error"}   always last
+    """
+    response = try_fast_path(query, graph_lookup)
+    if response is not None:
+        yield {"type": "route", "route": "fast"}
+        for action, observation in response["intermediate_steps"]:
+            yield {"type": "tool_start", "tool": action.tool, "input": action.tool_input}
+            yield {"type": "tool_end", "tool": action.tool, "observation": str(observation)}
+        for line in response["output"].splitlines(keepends=True):
+            yield {"type": "token", "text": line}
+        yield {"type": "final", "response": response}
+        return
+
+    yield {"type": "route", "route": "agent"}
+    from recommenders.agent_callbacks import StreamingEvents, TokenLogger
+    events = queue.Queue()
+
+    def run():
+        started = time.perf_counter()
+        tokens = TokenLogger()
+        try:
+            response = get_agent().invoke(prompt or query, config={"callbacks": [tokens, StreamingEvents(events)]})
+            record("agent", time.perf_counter() - started)
+            response["token_steps"] = tokens.steps
+            events.put({"type": "final", "response": response})
+        except Exception as e:
+            events.put({"type": "error", "error": str(e)})
+
+    threading.Thread(target=run, name="agent-stream", daemon=True).start()
+    while True:
+        event = events.get()
+        yield event
+        if event["type"] in ("final", "error"):
+            return
 
 if __name__ == "__main__":
     while True:
         user_query = input("\nEnter query (or 'quit' to exit): ")
         if user_query.lower() == "quit":
             break
-        response = agent.invoke(user_query)
-        print("Agent:", response)
+        for event in stream_answer(user_query):
+            if event["type"] == "tool_start":
+                print(f"\n[{event['tool']}] {event['input']}")
+            elif event["type"] == "tool_end":
+                print(event["observation"])
+            elif event["type"] == "token":
+                print(event["text"], end="", flush=True)
+            elif event["type"] == "error":
+                print("Agent error:", event["error"])
+        print()
+    print("Routing:", router_stats())
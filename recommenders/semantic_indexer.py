@@ -1,51 +1,333 @@
+import argparse
+import hashlib
 import json
+import os
+import queue
+import sys
+import threading
+import time
+from array import array
+import numpy as np
 from sentence_transformers import SentenceTransformer
 from qdrant_client import QdrantClient, models
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from retrievers.ann_index import ANN_INDEX_PATH, IVFPQIndex, current_build
+from retrievers.bio_store import get_bio_store
+from retrievers.vector_store import VECTOR_STORE_PATH, build_vector_store, iter_qdrant_batches
+
 PARSED_BIOS_PATH = "data/parsed_bios.jsonl"
+QDRANT_PATH = "data/tmp/my_qdrant_data"
 QDRANT_COLLECTION_NAME = "user_embeddings"
 MODEL_NAME = "all-MiniLM-L6-v2"
+CHUNK_SIZE = 512
+UPSERT_QUEUE_DEPTH = 4
+SNIPPET_CHARS = 240
+# Keyword-indexed payload fields; everything else in a point is only ever read back, not filtered on.
+PAYLOAD_INDEXES = ["user_id", "user_name", "content_hash"]
+ANN_SUBQUANTIZERS = 48       # 384-dim MiniLM -> 8 dims per one-byte code
+ANN_TRAIN_SAMPLE = 100_000
 
 def load_bios(file_path):
     with open(file_path, "r") as f:
         return [json.loads(line) for line in f]
 
-def main():
-    bios = load_bios(PARSED_BIOS_PATH)
-    if not bios:
-        print("No bios loaded.")
+def content_hash(bio):
+    """Hash of everything that ends up in a point, so any edit forces a re-embed."""
+    key = json.dumps([MODEL_NAME, bio.get("user_name"), bio["bio"], bio.get("sources")], ensure_ascii=False)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def lean_payload(bio, bio_hash):
+    """What a point carries: ids, sources and a snippet. The full text lives in retrievers/bio_store.py."""
+    text = " ".join(bio["bio"].split())
+    return {
+        "user_id": str(bio["user_id"]),
+        "user_name": bio.get("user_name"),
+        "sources": bio.get("sources"),
+        "content_hash": bio_hash,
+        "snippet": text[:SNIPPET_CHARS] + ("..." if len(text) > SNIPPET_CHARS else ""),
+    }
+
+def iter_bio_chunks(file_path, chunk_size=CHUNK_SIZE):
+    """Yield parsed bios in fixed-size lists without holding the whole file."""
+    chunk = []
+    with open(file_path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            chunk.append(json.loads(line))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+def ensure_collection(client, vector_size, full_rebuild=False):
+    if full_rebuild and client.collection_exists(QDRANT_COLLECTION_NAME):
+        client.delete_collection(QDRANT_COLLECTION_NAME)
+    if not client.collection_exists(QDRANT_COLLECTION_NAME):
+        client.create_collection(
+            collection_name=QDRANT_COLLECTION_NAME,
+            vectors_config=models.VectorParams(size=vector_size, distance=models.Distance.COSINE, on_disk=True),
+            on_disk_payload=True
+        )
+        print(f"Collection '{QDRANT_COLLECTION_NAME}' created with {vector_size}-dim vectors")
+    # Idempotent, so collections created before the indexes existed pick them up too.
+    for field in PAYLOAD_INDEXES:
+        client.create_payload_index(
+            collection_name=QDRANT_COLLECTION_NAME,
+            field_name=field,
+            field_schema=models.PayloadSchemaType.KEYWORD
+        )
+
+class Encoder:
+    """Encodes on a sentence-transformers multi-process pool when more than one worker is requested."""
+
+    def __init__(self, model, workers=1, batch_size=32):
+        self.model = model
+        self.batch_size = batch_size
+        self.pool = model.start_multi_process_pool(["cpu"] * workers) if workers > 1 else None
+
+    def encode(self, texts):
+        if self.pool is None:
+            return self.model.encode(texts, batch_size=self.batch_size)
+        return self.model.encode_multi_process(texts, self.pool, batch_size=self.batch_size)
+
+    def close(self):
+        if self.pool is not None:
+            self.model.stop_multi_process_pool(self.pool)
+            self.pool = None
+
+def _upsert_worker(client, client_lock, batches, errors):
+    while True:
+        points = batches.get()
+        if points is None:
+            return
+        try:
+            with client_lock:
+                client.upsert(collection_name=QDRANT_COLLECTION_NAME, points=points)
+        except Exception as e:
+            errors.append(e)
+
+def delete_stale_points(client, client_lock, seen_ids):
+    """Delete points whose id was not seen in this run, paging through the collection; returns their ids."""
+    seen = np.unique(np.frombuffer(seen_ids, dtype=np.int64)) if len(seen_ids) else np.empty(0, dtype=np.int64)
+    deleted = []
+    offset = None
+    while True:
+        with client_lock:
+            points, offset = client.scroll(
+                collection_name=QDRANT_COLLECTION_NAME,
+                limit=4096,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False
+            )
+        page = np.array([p.id for p in points], dtype=np.int64)
+        stale = page[~np.isin(page, seen)].tolist()
+        if stale:
+            with client_lock:
+                client.delete(
+                    collection_name=QDRANT_COLLECTION_NAME,
+                    points_selector=models.PointIdsList(points=stale)
+                )
+            deleted.extend(stale)
+        if offset is None:
+            return deleted
+
+def _iter_vector_pages(client, client_lock, page_size=4096):
+    offset = None
+    while True:
+        with client_lock:
+            points, offset = client.scroll(
+                collection_name=QDRANT_COLLECTION_NAME,
+                limit=page_size,
+                offset=offset,
+                with_payload=False,
+                with_vectors=True
+            )
+        if points:
+            yield np.array([p.id for p in points], dtype=np.int64), np.asarray([p.vector for p in points], dtype=np.float32)
+        if offset is None:
+            return
+
+def build_ann_index(client, client_lock, nlist=None, m=ANN_SUBQUANTIZERS, path=ANN_INDEX_PATH):
+    """
+    Train an IVF-PQ index on a random sample of the collection, then stream every vector into it.
+    nlist defaults to ~4 * sqrt(N) lists, which keeps lists around sqrt(N) / 4 long.
+    """
+    with client_lock:
+        count = client.count(QDRANT_COLLECTION_NAME, exact=True).count
+    if not count:
+        return None
+    rng = np.random.default_rng(0)
+    keep = min(1.0, ANN_TRAIN_SAMPLE / count)
+    sample = [vectors[rng.random(len(vectors)) < keep] for _, vectors in _iter_vector_pages(client, client_lock)]
+    sample = np.concatenate(sample)
+    nlist = nlist or max(1, min(65536, int(4 * np.sqrt(count))))
+    index = IVFPQIndex.train(sample, nlist=min(nlist, len(sample)), m=m)
+    index.add_batches(_iter_vector_pages(client, client_lock))
+    index.save(path)
+    return index
+
+def refresh_vector_store(client, path=VECTOR_STORE_PATH):
+    """Re-export the numpy store with its previous settings, if one was exported; None otherwise."""
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return None
+    batches = iter_qdrant_batches(QDRANT_PATH, QDRANT_COLLECTION_NAME, client=client)
+    return build_vector_store(batches, path, meta["dtype"], meta.get("has_full", False), MODEL_NAME)
+
+def _peak_rss_mb():
+    """
+    (this process, largest finished child) peak RSS in MB. Encoder pool workers are children,
+    stopped before this is read, so the second figure covers any one of them.
+    """
+    try:
+        import resource
+        return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024)
+    except ImportError:
+        return float("nan"), float("nan")
+
+def main(full_rebuild=False, chunk_size=CHUNK_SIZE, workers=1, queue_depth=UPSERT_QUEUE_DEPTH,
+         ann=False, ann_nlist=None):
+    """
+    Streams bios in chunks, so the bios and their vectors never sit in memory all at once.
+    That does not bound the peak: embedded Qdrant keeps every point of the collection in this
+    process, so RSS still grows with the number of bios. Each encoder worker (--workers > 1)
+    is a separate process holding its own copy of the model.
+    """
+    if not os.path.exists(PARSED_BIOS_PATH):
+        print(f"No bios found at {PARSED_BIOS_PATH}")
         return
-    print(f"Loaded {len(bios)} bios")
 
     model = SentenceTransformer(MODEL_NAME)
     print("Model loaded.")
 
-    bio_texts = [bio["bio"] for bio in bios]
-    vectors = model.encode(bio_texts, show_progress_bar=True)
-
-    client = QdrantClient(path="../data/tmp/my_qdrant_data")
-    vector_size = len(vectors[0])
-
-    client.recreate_collection(
-        collection_name=QDRANT_COLLECTION_NAME,
-        vectors_config=models.VectorParams(size=vector_size, distance=models.Distance.COSINE)
-    )
-    print(f"Collection '{QDRANT_COLLECTION_NAME}' created with {vector_size}-dim vectors")
-
-    points = [
-        models.PointStruct(
-            id=int(bio["user_id"]),
-            vector=vector.tolist() if hasattr(vector, "tolist") else vector,
-            payload=bio
-        )
-        for bio, vector in zip(bios, vectors)
-    ]
-
-    client.upsert(
-        collection_name=QDRANT_COLLECTION_NAME,
-        points=points
+    try:
+        client = QdrantClient(path=QDRANT_PATH)
+    except RuntimeError as e:
+        # Embedded Qdrant takes an exclusive lock on its folder, held by any running app or indexer.
+        print(f"Cannot open {QDRANT_PATH}: {e}\nStop the app (or any other indexer) and run again.")
+        return
+    client_lock = threading.Lock()   # embedded client is shared by the reader and the upsert thread
+    ensure_collection(client, model.get_sentence_embedding_dimension(), full_rebuild)
+    bio_store = get_bio_store()
+    if full_rebuild:
+        bio_store.clear()
+
+    # A bounded queue is the backpressure: encoding blocks once `queue_depth` batches wait for upsert.
+    batches = queue.Queue(maxsize=queue_depth)
+    errors = []
+    upserter = threading.Thread(target=_upsert_worker, args=(client, client_lock, batches, errors), daemon=True)
+    upserter.start()
+    encoder = Encoder(model, workers)
+
+    # An existing ANN index follows the collection incrementally; --ann (or --full) retrains it.
+    ann_exists = current_build(ANN_INDEX_PATH) is not None
+    ann_index = IVFPQIndex.load(ANN_INDEX_PATH) if ann_exists and not (ann or full_rebuild) else None
+
+    seen_ids = array("q")
+    total, added, updated, skipped, slimmed = 0, 0, 0, 0, 0
+    started = time.perf_counter()
+    try:
+        for chunk in iter_bio_chunks(PARSED_BIOS_PATH, chunk_size):
+            if errors:
+                raise errors[0]
+            ids = [int(bio["user_id"]) for bio in chunk]
+            seen_ids.extend(ids)
+            total += len(chunk)
+            with client_lock:
+                existing = client.retrieve(
+                    collection_name=QDRANT_COLLECTION_NAME,
+                    ids=ids,
+                    with_payload=["content_hash", "snippet"],
+                    with_vectors=False
+                )
+            indexed = {p.id: p.payload or {} for p in existing}
+
+            # Diff the chunk against what is indexed; unchanged bios are never re-encoded.
+            to_encode, to_slim = [], []
+            for point_id, bio in zip(ids, chunk):
+                bio_hash = content_hash(bio)
+                if point_id not in indexed:
+                    added += 1
+                elif indexed[point_id].get("content_hash") != bio_hash:
+                    updated += 1
+                elif "snippet" not in indexed[point_id]:
+                    # Indexed before payloads were slimmed: swap the payload, keep the vector.
+                    to_slim.append((point_id, bio_hash, bio))
+                    continue
+                else:
+                    skipped += 1
+                    continue
+                to_encode.append((point_id, bio_hash, bio))
+            if to_slim:
+                bio_store.put_many((point_id, bio_hash, bio["bio"]) for point_id, bio_hash, bio in to_slim)
+                with client_lock:
+                    for point_id, bio_hash, bio in to_slim:
+                        client.overwrite_payload(
+                            collection_name=QDRANT_COLLECTION_NAME,
+                            payload=lean_payload(bio, bio_hash),
+                            points=[point_id]
+                        )
+                slimmed += len(to_slim)
+            if not to_encode:
+                continue
+
+            bio_store.put_many((point_id, bio_hash, bio["bio"]) for point_id, bio_hash, bio in to_encode)
+            vectors = encoder.encode([bio["bio"] for _, _, bio in to_encode])
+            if ann_index is not None:
+                ann_index.add([point_id for point_id, _, _ in to_encode], vectors)
+            # Upsert in place: only changed points are rewritten and the collection is never dropped.
+            batches.put([
+                models.PointStruct(
+                    id=point_id,
+                    vector=vector.tolist() if hasattr(vector, "tolist") else vector,
+                    payload=lean_payload(bio, bio_hash)
+                )
+                for (point_id, bio_hash, bio), vector in zip(to_encode, vectors)
+            ])
+    finally:
+        batches.put(None)
+        upserter.join()
+        encoder.close()
+    if errors:
+        raise errors[0]
+
+    deleted_ids = delete_stale_points(client, client_lock, seen_ids)
+    deleted = len(deleted_ids)
+    bio_store.delete_many(deleted_ids)
+    if ann_index is not None:
+        ann_index.remove(deleted_ids)
+        if added or updated or deleted:
+            ann_index.save(ANN_INDEX_PATH)
+            print(f"ANN index updated in place: {len(ann_index)} vectors")
+    elif ann or (full_rebuild and ann_exists):
+        ann_started = time.perf_counter()
+        ann_index = build_ann_index(client, client_lock, ann_nlist)
+        if ann_index is not None:
+            print(f"ANN index built: {len(ann_index)} vectors in {len(ann_index.centroids)} lists "
+                  f"({time.perf_counter() - ann_started:.1f}s)")
+    # An exported numpy store is a copy of the collection, so it follows every change too.
+    if added or updated or deleted or slimmed:
+        store_meta = refresh_vector_store(client)
+        if store_meta is not None:
+            print(f"Vector store re-exported: {store_meta['count']} vectors in {VECTOR_STORE_PATH}")
+    elapsed = time.perf_counter() - started
+    main_mb, worker_mb = _peak_rss_mb()
+
+    print(f"Index updated: {added} added, {updated} updated, {deleted} deleted, {skipped} skipped"
+          + (f", {slimmed} payloads slimmed" if slimmed else ""))
+    print(
+        f"Processed {total} bios in {elapsed:.1f}s "
+        f"({total / elapsed if elapsed else 0:.1f} bios/sec, {added + updated} encoded), "
+        f"peak RSS {main_mb:.0f} MB"
+        + (f" + {workers} encoder workers of up to {worker_mb:.0f} MB each" if workers > 1 else "")
     )
-    print("All vectors upserted")
 
     query_text = "Software Engineer currently working at Google who graduated from CMU"
     query_vector = model.encode(query_text).tolist()
@@ -55,18 +337,31 @@ def main():
         collection_name=QDRANT_COLLECTION_NAME,
         query_vector=query_vector,
         limit=3,
-        with_payload=True
+        with_payload=["user_name", "snippet", "sources"]
     )
 
     print("\nTop Matches:")
     for r in results:
         print(f"  Score: {r.score:.4f}")
-        print(f"  Bio: {r.payload['bio'][:200]}...")
+        print(f"  Name: {r.payload['user_name']}")
+        print(f"  Bio: {r.payload['snippet']}")
         print(f"  Sources: {r.payload['sources']}")
         print("-" * 40)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(
+        description="Embed parsed bios into the Qdrant collection. The collection is embedded Qdrant, which "
+                    "only one process can open at a time, so stop the app while indexing."
+    )
+    parser.add_argument("--full", action="store_true", help="drop and rebuild the collection instead of updating it in place")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="bios read, encoded and upserted per batch")
+    parser.add_argument("--workers", type=int, default=1, help="encoder processes (1 = encode in-process)")
+    parser.add_argument("--queue-depth", type=int, default=UPSERT_QUEUE_DEPTH, help="encoded batches allowed to wait for upsert")
+    parser.add_argument("--ann", action="store_true", help=f"(re)build the IVF-PQ index in {ANN_INDEX_PATH}")
+    parser.add_argument("--ann-nlist", type=int, default=None, help="inverted lists for --ann (default ~4*sqrt(N))")
+    args = parser.parse_args()
+    main(full_rebuild=args.full, chunk_size=args.chunk_size, workers=args.workers, queue_depth=args.queue_depth,
+         ann=args.ann, ann_nlist=args.ann_nlist)
 
 
 
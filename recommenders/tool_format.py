@@ -0,0 +1,156 @@
+import os
+import re
+
+# Budgets for anything a tool hands back to the agent; every ReAct step re-sends it.
+TOOL_MAX_ROWS = int(os.getenv("TOOL_MAX_ROWS", "10"))
+TOOL_MAX_CHARS = int(os.getenv("TOOL_MAX_CHARS", "2000"))
+TOOL_CELL_CHARS = int(os.getenv("TOOL_CELL_CHARS", "80"))
+DUCKDB_AUTO_LIMIT = int(os.getenv("DUCKDB_AUTO_LIMIT", "50"))
+
+PERSON_LINE_RE = re.compile(r"^\[([^\]]+)\]\s+([^|]+?)\s*(?:\||$)")
+SELECT_RE = re.compile(r"^\s*(?:select|with|from)\b", re.IGNORECASE)
+
+def _clip(value, size=TOOL_CELL_CHARS):
+    text = " ".join(str(value).split()) if value is not None else ""
+    return text if len(text) <= size else text[:size - 3] + "..."
+
+def person_line(user_id, name, occupation=None, company=None, location=None, score=None, extra=None):
+    """`[id] Name | Occupation @ Company | Location | score=0.83 | extra`, empty parts dropped."""
+    role = " @ ".join(_clip(p) for p in (occupation, company) if p)
+    parts = [f"[{user_id}] {_clip(name or user_id)}", role, _clip(location) if location else ""]
+    if score is not None:
+        parts.append(f"score={score:.3f}")
+    if extra:
+        parts.append(_clip(extra))
+    return " | ".join(p for p in parts if p)
+
+def budget(lines, max_rows=TOOL_MAX_ROWS, max_chars=TOOL_MAX_CHARS, empty="No results."):
+    """Join lines under the row and character budgets, saying how many were cut."""
+    lines = list(lines)
+    if not lines:
+        return empty
+    kept, size = [], 0
+    for line in lines[:max_rows]:
+        if kept and size + len(line) + 1 > max_chars:
+            break
+        kept.append(line[:max_chars])
+        size += len(kept[-1]) + 1
+    if len(kept) < len(lines):
+        kept.append(f"... {len(lines) - len(kept)} more rows not shown")
+    return "\n".join(kept)
+
+def parse_person_ids(text):
+    """name -> id for every person line in a formatted observation."""
+    ids = {}
+    for line in str(text).splitlines():
+        match = PERSON_LINE_RE.match(line.strip())
+        if match:
+            ids[match.group(2).strip()] = match.group(1).strip()
+    return ids
+
+def _profile(profiles, user_id):
+    return (profiles or {}).get(str(user_id), {})
+
+def format_hits(hits, profiles=None, **limits):
+    """Vector hits (ScoredPoint / StoredPoint) with the lean payload from the indexer."""
+    lines = []
+    for hit in hits:
+        payload = hit.payload or {}
+        user_id = payload.get("user_id") or hit.id
+        profile = _profile(profiles, user_id)
+        lines.append(person_line(
+            user_id, payload.get("user_name") or profile.get("name"), profile.get("occupation"),
+            profile.get("company"), profile.get("location"), hit.score,
+            None if profile else payload.get("snippet"),
+        ))
+    return budget(lines, **limits)
+
+def format_user_rows(rows, **limits):
+    """`SELECT * FROM users` tuples: ID, Full Name, Email, Location, Occupation, Company, School, ..."""
+    return budget(
+        (person_line(row[0], row[1], row[4], row[5], row[3], extra=f"school: {row[6]}" if row[6] else None)
+         for row in rows),
+        **limits,
+    )
+
+def format_connections(rows, profiles=None, **limits):
+    """Graph (from, org, to) rows grouped into one line per connected person."""
+    shared = {}
+    for _, org, other in rows:
+        shared.setdefault(str(other), []).append(str(org))
+    lines = []
+    for other, orgs in shared.items():
+        profile = _profile(profiles, other)
+        lines.append(person_line(other, profile.get("name"), profile.get("occupation"), profile.get("company"),
+                                 profile.get("location"), extra="shared: " + ", ".join(dict.fromkeys(orgs))))
+    return budget(lines, empty="No connections.", **limits)
+
+def format_hybrid(result, profiles=None, **limits):
+    """hybrid_search() output: fused candidates plus a one-line retriever report."""
+    lines = []
+    for c in result["candidates"]:
+        profile = _profile(profiles, c["user_id"])
+        found_by = " ".join(f"{name}#{rank}" for name, rank in c["sources"].items())
+        lines.append(person_line(c["user_id"], c.get("name") or profile.get("name"), profile.get("occupation"),
+                                 profile.get("company"), profile.get("location"), c["score"], f"found by {found_by}"))
+    report = "; ".join(f"{name}: {r['status']}" for name, r in result["retrievers"].items())
+    return budget(lines, **limits) + f"\nretrievers: {report}"
+
+def format_table(columns, rows, truncated=False, **limits):
+    """Ad-hoc query results as `col | col` lines with clipped cells."""
+    lines = [" | ".join(_clip(v) for v in row) for row in rows]
+    text = budget(lines, **limits)
+    if not lines:
+        return text
+    if truncated:
+        text += "\n(result capped by automatic LIMIT; refine the query)"
+    return " | ".join(columns) + "\n" + text
+
+def _comment_start(line):
+    """Index of a `--` comment in one line of SQL, ignoring dashes inside quotes; None if there is none."""
+    quote = None
+    for i, ch in enumerate(line):
+        if quote:
+            quote = None if ch == quote else quote
+        elif ch in "'\"":
+            quote = ch
+        elif line.startswith("--", i):
+            return i
+    return None
+
+def _strip_trailing(query):
+    """Drop trailing semicolons, whitespace and `--` comments so the query can be nested."""
+    while True:
+        query = query.strip().rstrip(";").strip()
+        start = query.rfind("\n") + 1
+        cut = _comment_start(query[start:])
+        if cut is None:
+            return query
+        query = query[:start + cut]
+
+def limit_query(query, limit=DUCKDB_AUTO_LIMIT):
+    """
+    Wrap a SELECT so at most limit + 1 rows come back (the +1 detects capping). A query's own
+    LIMIT stays inside the wrapper, so `LIMIT 1000000` cannot get around the cap.
+    """
+    query = _strip_trailing(query)
+    if not SELECT_RE.match(query):
+        return query, False
+    # Own lines for the parentheses, in case a comment is left anywhere in the query.
+    return f"SELECT * FROM (\n{query}\n) AS limited LIMIT {limit + 1}", True
+
+_encoding = None
+
+def count_tokens(text):
+    """cl100k token count when tiktoken is installed, else the usual ~4 chars per token estimate."""
+    global _encoding
+    text = str(text)
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
@@ -0,0 +1,264 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+
+ANN_INDEX_PATH = "data/ann_index"
+DEFAULT_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+ASSIGN_CHUNK = 65536
+KEEP_BUILDS = 2
+
+def _unit_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+def _assign(vectors, centroids):
+    """Nearest centroid (L2) per row, in chunks: argmax(x.c - |c|^2 / 2)."""
+    half_norms = (centroids ** 2).sum(axis=1) / 2
+    out = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_CHUNK):
+        out[start:start + ASSIGN_CHUNK] = (vectors[start:start + ASSIGN_CHUNK] @ centroids.T - half_norms).argmax(axis=1)
+    return out
+
+def kmeans(vectors, k, iters=20, seed=0):
+    """Plain Lloyd's k-means; empty clusters are re-seeded from random points."""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iters):
+        labels = _assign(vectors, centroids)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+    return centroids
+
+class IVFPQIndex:
+    """
+    Inverted-file index with product-quantized residuals for inner-product search on
+    unit vectors. A vector x in list l is stored as l plus m one-byte codes of x - c_l, and
+    scored as q.c_l + sum_j q_j.codebook_j[code_j]. The per-subspace lookup table is shared
+    by every list, so a query costs one small table plus a gather per probed list.
+    """
+
+    def __init__(self, centroids, codebooks, list_ids=None, list_codes=None):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.codebooks = np.asarray(codebooks, dtype=np.float32)     # [m, ksub, dsub]
+        nlist, m = len(self.centroids), len(self.codebooks)
+        self.list_ids = list_ids or [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+        self.list_codes = list_codes or [np.empty((0, m), dtype=np.uint8) for _ in range(nlist)]
+        self._where = None        # id -> list number, built lazily for deletes
+        self._lock = threading.RLock()
+
+    @property
+    def m(self):
+        return len(self.codebooks)
+
+    @property
+    def dsub(self):
+        return self.codebooks.shape[2]
+
+    def __len__(self):
+        return sum(len(ids) for ids in self.list_ids)
+
+    @classmethod
+    def train(cls, vectors, nlist=256, m=48, ksub=256, sample=100_000, iters=20, seed=0):
+        """Learn coarse centroids and PQ codebooks from (a sample of) the vectors."""
+        vectors = _unit_rows(vectors)
+        if vectors.shape[1] % m:
+            raise ValueError(f"dim {vectors.shape[1]} is not divisible by m={m}")
+        rng = np.random.default_rng(seed)
+        if len(vectors) > sample:
+            vectors = vectors[rng.choice(len(vectors), sample, replace=False)]
+        centroids = kmeans(vectors, nlist, iters, seed)
+        residuals = vectors - centroids[_assign(vectors, centroids)]
+        dsub = vectors.shape[1] // m
+        codebooks = np.zeros((m, min(ksub, len(vectors)), dsub), dtype=np.float32)
+        for j in range(m):
+            codebooks[j] = kmeans(residuals[:, j * dsub:(j + 1) * dsub], codebooks.shape[1], iters, seed + j + 1)
+        return cls(centroids, codebooks)
+
+    def _encode(self, residuals):
+        codes = np.empty((len(residuals), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = _assign(residuals[:, j * self.dsub:(j + 1) * self.dsub], self.codebooks[j])
+        return codes
+
+    def _quantize(self, vectors):
+        vectors = _unit_rows(vectors)
+        lists = _assign(vectors, self.centroids)
+        return lists, self._encode(vectors - self.centroids[lists])
+
+    def _append(self, ids, lists, codes):
+        # One concatenate per touched list, however many rows land in it.
+        order = np.argsort(lists, kind="stable")
+        ids, lists, codes = ids[order], lists[order], codes[order]
+        touched, starts = np.unique(lists, return_index=True)
+        for l, start, end in zip(touched, starts, list(starts[1:]) + [len(ids)]):
+            self.list_ids[l] = np.concatenate([self.list_ids[l], ids[start:end]])
+            self.list_codes[l] = np.concatenate([self.list_codes[l], codes[start:end]])
+            if self._where is not None:
+                self._where.update((int(i), int(l)) for i in ids[start:end])
+
+    def add(self, ids, vectors):
+        """Insert or replace vectors by id."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        lists, codes = self._quantize(vectors)
+        with self._lock:
+            self.remove(ids)
+            self._append(ids, lists, codes)
+
+    def add_batches(self, batches):
+        """Bulk-load (ids, vectors) batches of ids not yet in the index; returns the row count."""
+        parts = []
+        for ids, vectors in batches:
+            if len(ids):
+                parts.append((np.asarray(ids, dtype=np.int64), *self._quantize(vectors)))
+        if not parts:
+            return 0
+        ids, lists, codes = (np.concatenate(p) for p in zip(*parts))
+        with self._lock:
+            self._append(ids, lists, codes)
+        return len(ids)
+
+    def remove(self, ids):
+        """Delete vectors by id; unknown ids are ignored."""
+        with self._lock:
+            if self._where is None:
+                self._where = {int(i): l for l, lst in enumerate(self.list_ids) for i in lst}
+            by_list = {}
+            for i in np.asarray(ids, dtype=np.int64).tolist():
+                l = self._where.pop(i, None)
+                if l is not None:
+                    by_list.setdefault(l, []).append(i)
+            for l, gone in by_list.items():
+                keep = ~np.isin(self.list_ids[l], gone)
+                self.list_ids[l] = self.list_ids[l][keep]
+                self.list_codes[l] = self.list_codes[l][keep]
+
+    def search(self, queries, top_k=3, nprobe=DEFAULT_NPROBE):
+        """Approximate top-k per query as (ids [q, k], scores [q, k]); missing slots are id -1."""
+        queries = _unit_rows(queries)
+        nprobe = min(nprobe, len(self.centroids))
+        coarse = queries @ self.centroids.T
+        probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+        out_ids = np.full((len(queries), top_k), -1, dtype=np.int64)
+        out_scores = np.full((len(queries), top_k), -np.inf, dtype=np.float32)
+        subspaces = np.arange(self.m)
+        for qi, q in enumerate(queries):
+            # table[j, c] = q_j . codebook_j[c]
+            table = np.einsum("jd,jcd->jc", q.reshape(self.m, self.dsub), self.codebooks)
+            ids_parts, score_parts = [], []
+            for l in probes[qi]:
+                codes = self.list_codes[l]
+                if not len(codes):
+                    continue
+                ids_parts.append(self.list_ids[l])
+                score_parts.append(coarse[qi, l] + table[subspaces, codes].sum(axis=1))
+            if not ids_parts:
+                continue
+            ids, scores = np.concatenate(ids_parts), np.concatenate(score_parts)
+            k = min(top_k, len(ids))
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            out_ids[qi, :k], out_scores[qi, :k] = ids[best], scores[best]
+        return out_ids, out_scores
+
+    def save(self, path=ANN_INDEX_PATH):
+        with self._lock:
+            lengths = np.array([len(ids) for ids in self.list_ids], dtype=np.int64)
+            arrays = {
+                "centroids": self.centroids,
+                "codebooks": self.codebooks,
+                "list_offsets": np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+                "ids": np.concatenate(self.list_ids) if len(self.list_ids) else np.empty(0, np.int64),
+                "codes": np.concatenate(self.list_codes) if len(self.list_codes) else np.empty((0, self.m), np.uint8),
+            }
+        # Each build gets its own directory and CURRENT.json is swapped to it atomically, as
+        # ingest/snapshot.py does, so a reader never sees a directory mid-rename.
+        build_id = time.strftime("%Y%m%dT%H%M%S", time.gmtime()) + f"-{uuid.uuid4().hex[:8]}"
+        os.makedirs(path, exist_ok=True)
+        tmp_dir = os.path.join(path, f".tmp-{build_id}")
+        os.makedirs(tmp_dir)
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), arr)
+        meta = {"build_id": build_id, "dir": build_id, "count": int(arrays["list_offsets"][-1]),
+                "nlist": len(self.centroids), "m": self.m, "ksub": self.codebooks.shape[1]}
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        os.rename(tmp_dir, os.path.join(path, build_id))
+        tmp_path = _current_path(path) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, _current_path(path))
+        _prune(path, keep=build_id)
+
+    @classmethod
+    def load(cls, path=ANN_INDEX_PATH, meta=None):
+        meta = meta or current_build(path)
+        if meta is None:
+            raise FileNotFoundError(f"No ANN index at {path}")
+        build_dir = os.path.join(path, meta["dir"])
+        load = lambda name: np.load(os.path.join(build_dir, f"{name}.npy"), mmap_mode="r")
+        offsets = load("list_offsets")
+        ids, codes = load("ids"), load("codes")
+        # Lists start as views into the mapped files; add/remove replace them with copies.
+        list_ids = [ids[offsets[l]:offsets[l + 1]] for l in range(len(offsets) - 1)]
+        list_codes = [codes[offsets[l]:offsets[l + 1]] for l in range(len(offsets) - 1)]
+        return cls(np.asarray(load("centroids")), np.asarray(load("codebooks")), list_ids, list_codes)
+
+def _current_path(path):
+    return os.path.join(path, "CURRENT.json")
+
+def current_build(path=ANN_INDEX_PATH):
+    """meta.json of the build CURRENT.json points at, or None if no index was saved."""
+    try:
+        with open(_current_path(path)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _prune(path, keep):
+    """Drop all but the newest KEEP_BUILDS builds; open mmaps of removed files stay valid."""
+    builds = sorted(name for name in os.listdir(path)
+                    if not name.startswith(".") and os.path.isdir(os.path.join(path, name)))
+    for name in builds[:-KEEP_BUILDS]:
+        if name != keep:
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_ann_index(path=ANN_INDEX_PATH):
+    """Process-wide index for `path`, reloaded after the indexer saves a new one."""
+    meta = current_build(path)
+    if meta is None:
+        raise FileNotFoundError(f"No ANN index at {path}")
+    with _indexes_lock:
+        cached = _indexes.get(path)
+        if cached is None or cached[0] != meta["build_id"]:
+            try:
+                index = IVFPQIndex.load(path, meta)
+            except FileNotFoundError:
+                # That build was pruned after CURRENT.json was read: load the one it names now.
+                meta = current_build(path)
+                index = IVFPQIndex.load(path, meta)
+            cached = (meta["build_id"], index)
+            _indexes[path] = cached
+        return cached[1]
+
+def reload_ann_indexes():
+    """Forget every loaded index; the next get_ann_index() loads the files again."""
+    with _indexes_lock:
+        _indexes.clear()
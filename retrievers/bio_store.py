@@ -0,0 +1,66 @@
+import os
+import sqlite3
+import threading
+
+BIO_STORE_PATH = os.getenv("BIO_STORE_PATH", "data/bio_store.sqlite")
+
+class BioStore:
+    """
+    Full bio text by user id. Qdrant points only carry a snippet; anything that needs the
+    whole resume-derived text reads it from here, one indexed lookup per user.
+    """
+
+    def __init__(self, path=BIO_STORE_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS bios (user_id TEXT PRIMARY KEY, content_hash TEXT, bio TEXT)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def put_many(self, rows):
+        """rows: iterable of (user_id, content_hash, bio)."""
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO bios VALUES (?, ?, ?)",
+                [(str(uid), h, bio) for uid, h, bio in rows],
+            )
+            self._db.commit()
+
+    def delete_many(self, user_ids):
+        with self._lock:
+            self._db.executemany("DELETE FROM bios WHERE user_id = ?", [(str(uid),) for uid in user_ids])
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM bios")
+            self._db.commit()
+
+    def get_many(self, user_ids):
+        user_ids = [str(uid) for uid in user_ids]
+        if not user_ids:
+            return {}
+        marks = ", ".join("?" * len(user_ids))
+        with self._lock:
+            rows = self._db.execute(f"SELECT user_id, bio FROM bios WHERE user_id IN ({marks})", user_ids).fetchall()
+        return dict(rows)
+
+    def get(self, user_id):
+        return self.get_many([user_id]).get(str(user_id))
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_bio_store(path=BIO_STORE_PATH):
+    key = os.path.abspath(path)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = BioStore(path)
+        return _stores[key]
+
+def get_bio(user_id, path=BIO_STORE_PATH):
+    """Full bio for one user, or None if it was never indexed."""
+    return get_bio_store(path).get(user_id)
@@ -1,14 +1,47 @@
-from neo4j import GraphDatabase
+import atexit
+import os
+import threading
+from retrievers.graph_local import GRAPH_PATH, get_local_graph
 
-def find_connections_2_hops(uri, user, password, user_id):
-    driver = GraphDatabase.driver(uri, auth=(user, password))
+GRAPH_BACKEND = os.getenv("GRAPH_BACKEND", "neo4j")          # "neo4j" or "local"
+GRAPH_LOCAL_PATH = os.getenv("GRAPH_LOCAL_PATH", GRAPH_PATH)
+
+_drivers = {}
+_drivers_lock = threading.Lock()
+
+def _get_driver(uri, user, password):
+    with _drivers_lock:
+        if (uri, user) not in _drivers:
+            from neo4j import GraphDatabase
+            _drivers[(uri, user)] = GraphDatabase.driver(uri, auth=(user, password))
+        return _drivers[(uri, user)]
+
+@atexit.register
+def _close_drivers():
+    with _drivers_lock:
+        for driver in _drivers.values():
+            driver.close()
+        _drivers.clear()
+
+def find_connections_2_hops(uri, user, password, user_id, hops=1, backend=None):
+    """
+    Connections of `user_id` as (from_id, rel_type, to_id) tuples, most shared orgs first.
+    hops=1 returns one row per shared org; hops=2 returns people reached only through an
+    intermediary, with rel_type "via <mid_id>". backend defaults to GRAPH_BACKEND.
+    """
+    backend = backend or GRAPH_BACKEND
+    if backend == "local":
+        graph = get_local_graph(GRAPH_LOCAL_PATH)
+        return graph.two_hop(user_id) if hops == 2 else graph.one_hop(user_id)
+
+    driver = _get_driver(uri, user, password)
     """
     query = '''
         MATCH (p:Person {id: $user_id})-[:ATTENDED*1..2]-(connection:Person)
         WHERE connection.id <> $user_id
         RETURN DISTINCT connection.id AS user_id
     '''
-    
+
     query = '''
         MATCH (p:Person)
         WHERE toString(p.id) = $user_id
@@ -21,9 +54,24 @@ def find_connections_2_hops(uri, user, password, user_id):
     query = '''
         MATCH (p:Person)-[:ATTENDED]->(o:Org)<-[:ATTENDED]-(other:Person)
         WHERE toString(p.id) = $user_id AND toString(other.id) <> $user_id
-        RETURN DISTINCT toString(p.id) AS from_id, toString(o.name) AS rel_type, toString(other.id) AS to_id
+        WITH p, other, collect(DISTINCT toString(o.name)) AS orgs
+        UNWIND orgs AS org
+        RETURN toString(p.id) AS from_id, org AS rel_type, toString(other.id) AS to_id
+        ORDER BY size(orgs) DESC, to_id, rel_type
     '''
 
+    if hops == 2:
+        query = '''
+            MATCH (p:Person)-[:ATTENDED]->(:Org)<-[:ATTENDED]-(mid:Person)-[:ATTENDED]->(:Org)<-[:ATTENDED]-(other:Person)
+            WHERE toString(p.id) = $user_id AND other <> p AND other <> mid
+              AND NOT (p)-[:ATTENDED]->(:Org)<-[:ATTENDED]-(other)
+            WITH p, other, toString(mid.id) AS mid_id, count(*) AS paths
+            ORDER BY paths DESC, mid_id
+            WITH p, other, collect(mid_id)[0] AS best_mid, sum(paths) AS total
+            RETURN toString(p.id) AS from_id, 'via ' + best_mid AS rel_type, toString(other.id) AS to_id
+            ORDER BY total DESC, to_id
+        '''
+
     with driver.session() as session:
-        results = session.run(query, user_id=user_id)
-        return [(record["from_id"], record["rel_type"], record["to_id"]) for record in results]
\ No newline at end of file
+        results = session.run(query, user_id=str(user_id))
+        return [(record["from_id"], record["rel_type"], record["to_id"]) for record in results]
@@ -1,7 +1,13 @@
+import argparse
 import json
+import os
+import sys
 import spacy
 from neo4j import GraphDatabase
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from retrievers.graph_local import GRAPH_PATH, save_graph
+
 def extract_orgs(text, nlp):
     doc = nlp(text)
     return list(set(ent.text for ent in doc.ents if ent.label_ == "ORG"))
@@ -37,5 +43,25 @@ def build_graph(parsed_bios_path="../data/parsed_bios.jsonl", uri="neo4j+s://02c
     driver.close()
     print("Finished building graph.")
 
+def build_local_graph(parsed_bios_path="data/parsed_bios.jsonl", out_dir=GRAPH_PATH):
+    """Same person/org extraction as build_graph, saved as a local CSR graph instead of Neo4j."""
+    nlp = spacy.load("en_core_web_sm")
+    person_ids, person_orgs = [], []
+    with open(parsed_bios_path, "r") as f:
+        bios = (json.loads(line) for line in f if line.strip())
+        for bio in bios:
+            person_ids.append(bio["user_id"])
+            person_orgs.append(extract_orgs(bio["bio"], nlp))
+
+    meta = save_graph(person_ids, person_orgs, out_dir)
+    print(f"Built local graph {meta['build_id']}: {meta['persons']} people, {meta['orgs']} orgs, {meta['edges']} edges in {out_dir}")
+    return meta
+
 if __name__ == "__main__":
-    build_graph()
+    parser = argparse.ArgumentParser(description="Build the person/org connection graph.")
+    parser.add_argument("--backend", choices=["neo4j", "local"], default="neo4j")
+    args = parser.parse_args()
+    if args.backend == "local":
+        build_local_graph()
+    else:
+        build_graph()
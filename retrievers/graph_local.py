@@ -0,0 +1,156 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import numpy as np
+
+GRAPH_PATH = "data/graph"
+
+def save_graph(person_ids, person_orgs, out_dir=GRAPH_PATH):
+    """
+    Write the person/org bipartite graph as CSR arrays in both directions:
+    person_indptr/person_orgs (person -> org) and org_indptr/org_persons (org -> person).
+    Every array is a plain .npy file so readers can memory-map it.
+    """
+    org_index = {}
+    indptr, indices = [0], []
+    for orgs in person_orgs:
+        for org in sorted(set(orgs)):
+            indices.append(org_index.setdefault(org, len(org_index)))
+        indptr.append(len(indices))
+
+    person_indptr = np.array(indptr, dtype=np.int64)
+    person_org_idx = np.array(indices, dtype=np.int32)
+    edge_person = np.repeat(np.arange(len(person_ids), dtype=np.int32), np.diff(person_indptr))
+    order = np.argsort(person_org_idx, kind="stable")
+    org_persons = edge_person[order]
+    org_indptr = np.zeros(len(org_index) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(person_org_idx, minlength=len(org_index)), out=org_indptr[1:])
+
+    arrays = {
+        "person_ids": np.array([str(p) for p in person_ids], dtype=str),
+        "org_names": np.array(list(org_index), dtype=str),
+        "person_indptr": person_indptr,
+        "person_orgs": person_org_idx,
+        "org_indptr": org_indptr,
+        "org_persons": org_persons,
+    }
+    meta = {
+        "build_id": uuid.uuid4().hex,
+        "created": time.time(),
+        "persons": len(person_ids),
+        "orgs": len(org_index),
+        "edges": int(len(person_org_idx)),
+    }
+
+    # Build next to the target and swap directories, so open readers keep their old mmaps.
+    tmp_dir = f"{out_dir}.tmp-{meta['build_id']}"
+    os.makedirs(tmp_dir)
+    for name, arr in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), arr)
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    old_dir = f"{out_dir}.old-{meta['build_id']}"
+    if os.path.exists(out_dir):
+        os.rename(out_dir, old_dir)
+    os.rename(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return meta
+
+class LocalGraph:
+    """Memory-mapped CSR person/org graph answering connection queries without a server."""
+
+    def __init__(self, path=GRAPH_PATH):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        load = lambda name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        self.person_ids = load("person_ids")
+        self.org_names = load("org_names")
+        self.person_indptr = load("person_indptr")
+        self.person_orgs = load("person_orgs")
+        self.org_indptr = load("org_indptr")
+        self.org_persons = load("org_persons")
+        self.index = {pid: i for i, pid in enumerate(self.person_ids.tolist())}
+
+    @property
+    def build_id(self):
+        return self.meta["build_id"]
+
+    def _orgs(self, i):
+        return self.person_orgs[self.person_indptr[i]:self.person_indptr[i + 1]]
+
+    def _neighbours(self, i):
+        """Other persons sharing at least one org with person i, with the shared-org count."""
+        orgs = self._orgs(i)
+        if not len(orgs):
+            return {}
+        members = np.concatenate([self.org_persons[self.org_indptr[o]:self.org_indptr[o + 1]] for o in orgs])
+        others, counts = np.unique(members, return_counts=True)
+        return {int(j): int(c) for j, c in zip(others, counts) if j != i}
+
+    def neighbours(self, user_id):
+        """{other_id: shared org count} for everyone sharing an org with user_id."""
+        i = self.index.get(str(user_id))
+        if i is None:
+            return {}
+        return {str(self.person_ids[j]): count for j, count in self._neighbours(i).items()}
+
+    def shared_orgs(self, user_id, other_id):
+        i, j = self.index.get(str(user_id)), self.index.get(str(other_id))
+        if i is None or j is None:
+            return []
+        shared = np.intersect1d(self._orgs(i), self._orgs(j))
+        return sorted(str(self.org_names[o]) for o in shared)
+
+    def one_hop(self, user_id, limit=None):
+        """(from_id, org, to_id) per shared org, people with the most shared orgs first."""
+        user_id = str(user_id)
+        i = self.index.get(user_id)
+        if i is None:
+            return []
+        neighbours = self._neighbours(i)
+        ranked = sorted(neighbours, key=lambda j: (-neighbours[j], str(self.person_ids[j])))[:limit]
+        rows = []
+        for j in ranked:
+            other_id = str(self.person_ids[j])
+            rows.extend((user_id, org, other_id) for org in self.shared_orgs(user_id, other_id))
+        return rows
+
+    def two_hop(self, user_id, limit=None):
+        """
+        (from_id, "via <mid_id>", to_id) for people reachable only through an intermediary,
+        ranked by the number of org-to-org paths and labelled with the strongest intermediary.
+        """
+        user_id = str(user_id)
+        i = self.index.get(user_id)
+        if i is None:
+            return []
+        direct = self._neighbours(i)
+        totals, best = {}, {}
+        for mid, first_leg in direct.items():
+            mid_id = str(self.person_ids[mid])
+            for j, second_leg in self._neighbours(mid).items():
+                if j == i or j in direct:
+                    continue
+                paths = first_leg * second_leg
+                totals[j] = totals.get(j, 0) + paths
+                if j not in best or (-paths, mid_id) < (-best[j][0], best[j][1]):
+                    best[j] = (paths, mid_id)
+        ranked = sorted(totals, key=lambda j: (-totals[j], str(self.person_ids[j])))[:limit]
+        return [(user_id, f"via {best[j][1]}", str(self.person_ids[j])) for j in ranked]
+
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+def get_local_graph(path=GRAPH_PATH):
+    """Process-wide graph for `path`, reopened when a rebuild swaps in a new meta.json."""
+    mtime = os.stat(os.path.join(path, "meta.json")).st_mtime
+    with _graphs_lock:
+        cached = _graphs.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, LocalGraph(path))
+            _graphs[path] = cached
+        return cached[1]
@@ -1,24 +1,244 @@
+import collections
 import duckdb
 import os
+import re
+import threading
+import weakref
 
-def find_by_field_and_location(db_path, field, location):
+DB_PATH = "data/users.db"
+FIELD_LOCATION_QUERY = "SELECT * FROM users WHERE Location ILIKE $location AND Occupation ILIKE $field"
+
+# Whole field value -> replacement, per field, on both the index and query side. Matching the
+# whole value keeps "la" in "La Jolla" or "ds" inside a longer title from being rewritten.
+FIELD_ALIASES = {
+    "location": {
+        "sf": "san francisco",
+        "nyc": "new york",
+        "la": "los angeles",
+        "dc": "washington",
+    },
+    "occupation": {
+        "swe": "software engineer",
+        "pm": "product manager",
+        "ds": "data scientist",
+        "ml": "machine learning",
+        "mle": "machine learning engineer",
+    },
+}
+
+class _Generation:
+    """One open copy of the database file plus the number of thread cursors still on it."""
+
+    def __init__(self, db_path, number):
+        # A private in-memory instance that ATTACHes the file: DuckDB shares one instance per
+        # path inside a process, so connecting by path again would hand back the old file.
+        path = db_path.replace("'", "''")
+        self.conn = duckdb.connect()
+        self.conn.execute(f"ATTACH '{path}' AS users_db (READ_ONLY)")
+        # No other files or URLs from any cursor (read_csv, COPY, ATTACH), the agent's included.
+        self.conn.execute("SET enable_external_access = false")
+        self.number = number
+        self.cursors = 0
+
+    def cursor(self):
+        cursor = self.conn.cursor()
+        cursor.execute("USE users_db")
+        self.cursors += 1
+        return cursor
+
+class _ThreadCursor:
+    def __init__(self, cursor, generation, orphans):
+        self.cursor = cursor
+        self.generation = generation
+        # Runs when the owning thread exits and drops its thread-local. It must not take the
+        # manager lock (GC can run while that thread holds it), so it only queues the release.
+        self.finalizer = weakref.finalize(self, orphans.append, (cursor, generation))
+
+class DuckDBConnectionManager:
+    """
+    One read-only DuckDB handle per database file, shared by every thread in the process.
+    Each thread gets its own cursor. When the file is replaced by a new ingest, or on
+    reload(), a new handle is opened for new cursors while queries already running keep
+    the old one; a thread swaps its stale cursor on its next cursor() call, and the old
+    handle is closed once no thread holds a cursor on it.
+    """
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._current = None
+        self._retired = []
+        self._orphans = collections.deque()
+        self._file_id = None
+        self._stale = False
+        self._generation = 0
+
+    def _stat(self):
+        stat = os.stat(self.db_path)
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def _open(self):
+        if not os.path.exists(self.db_path):
+            raise FileNotFoundError(f"DB not found at: {self.db_path}")
+        file_id = self._stat()
+        self._generation += 1
+        previous, self._current = self._current, _Generation(self.db_path, self._generation)
+        self._file_id, self._stale = file_id, False
+        if previous is not None:
+            self._retired.append(previous)
+
+    def _release(self, cursor, generation):
+        try:
+            cursor.close()
+        except Exception:
+            pass
+        generation.cursors -= 1
+
+    def _close_idle(self):
+        while self._orphans:
+            self._release(*self._orphans.popleft())
+        for generation in [g for g in self._retired if g.cursors <= 0]:
+            generation.conn.close()
+            self._retired.remove(generation)
+
+    def reload(self):
+        """New cursors see the file as it is now; cursors in use finish on the old handle."""
+        with self._lock:
+            self._stale = True
+
+    def cursor(self):
+        """Per-thread cursor on the shared handle, refreshed after the file changes on disk."""
+        with self._lock:
+            if self._current is None or self._stale or self._stat() != self._file_id:
+                self._open()
+            holder = getattr(self._local, "holder", None)
+            if holder is None or holder.generation is not self._current:
+                if holder is not None:
+                    # Only this thread's own stale cursor is closed; other threads may be mid-query.
+                    holder.finalizer.detach()
+                    self._release(holder.cursor, holder.generation)
+                holder = _ThreadCursor(self._current.cursor(), self._current, self._orphans)
+                self._local.holder = holder
+            self._close_idle()
+            return holder.cursor
+
+    def execute(self, query, params=None):
+        return self.cursor().execute(query, params) if params is not None else self.cursor().execute(query)
+
+    def execute_read_only(self, query):
+        """
+        Run untrusted SQL (the agent's): exactly one SELECT, so nothing can DETACH the file,
+        switch catalogs or create tables on the handle other threads share.
+        """
+        statements = duckdb.extract_statements(query)
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            raise ValueError("only a single SELECT (or WITH ... SELECT) statement is allowed")
+        return self.execute(query)
+
+    def close(self):
+        with self._lock:
+            for generation in self._retired + ([self._current] if self._current else []):
+                generation.conn.close()
+            self._retired, self._current = [], None
+            self._local = threading.local()
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+def get_connection_manager(db_path=DB_PATH):
+    key = os.path.abspath(db_path)
+    with _managers_lock:
+        if key not in _managers:
+            _managers[key] = DuckDBConnectionManager(db_path)
+        return _managers[key]
+
+def reload_connections():
+    """Call after an ingest so every shared handle picks up the new database."""
+    with _managers_lock:
+        managers = list(_managers.values())
+    for manager in managers:
+        manager.reload()
+
+def singular(word):
+    """Drop one plural 's'; short words and words ending in 'ss' ("boss", "business") are kept."""
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+def tokenize(text, field=None):
+    """
+    Lowercase, expand a whole-value alias for `field`, split on non-alphanumerics and strip
+    plurals the same way the user_tokens table is built in ingest/load_profiles.py.
+    """
+    text = (text or "").strip().lower()
+    text = FIELD_ALIASES.get(field, {}).get(text, text)
+    tokens = []
+    for word in re.split(r"[^a-z0-9]+", text):
+        token = singular(word)
+        if token and token not in tokens:
+            tokens.append(token)
+    return tokens
+
+def _token_ids_query(field, tokens):
+    placeholders = ", ".join("?" for _ in tokens)
+    return (
+        f"SELECT user_id FROM user_tokens WHERE field = ? AND token IN ({placeholders}) "
+        "GROUP BY user_id HAVING count(DISTINCT token) = ?",
+        [field, *tokens, len(tokens)],
+    )
+
+def find_by_tokens(manager, field, location, limit=None):
+    """
+    Users whose Occupation and Location contain every query token, via the user_tokens index.
+    With a limit, the first `limit` of them by ID.
+    """
+    field_tokens, location_tokens = tokenize(field, "occupation"), tokenize(location, "location")
+    if not field_tokens or not location_tokens:
+        return []
+    field_sql, field_params = _token_ids_query("occupation", field_tokens)
+    location_sql, location_params = _token_ids_query("location", location_tokens)
+    query = f"SELECT * FROM users WHERE ID IN ({field_sql} INTERSECT {location_sql})"
+    params = field_params + location_params
+    if limit is not None:
+        query += " ORDER BY ID LIMIT ?"
+        params.append(limit)
+    try:
+        return manager.execute(query, params).fetchall()
+    except duckdb.CatalogException:
+        return []   # database ingested before the token index existed
+
+def find_by_field_and_location(db_path, field, location, limit=None):
+    """Matching users rows; with a limit, only the first `limit` by ID are fetched."""
     if not os.path.exists(db_path):
         raise FileNotFoundError(f"DB not found at: {db_path}")
-    conn = duckdb.connect(database=db_path, read_only=True)
-    field = field.strip().rstrip('s')
-    location = location.strip()
-    query = "SELECT * FROM users WHERE Location ILIKE ? AND Occupation ILIKE ?"
-    result = conn.execute(query, (f"%{location}%", f"%{field}%")).fetchall()
-    conn.close()
+    manager = get_connection_manager(db_path)
+    result = find_by_tokens(manager, field, location, limit)
+    if not result:
+        # Substring scan keeps partial words ("Engineer" in "Engineering Manager") findable.
+        field = singular(field.strip())
+        location = location.strip()
+        query, params = FIELD_LOCATION_QUERY, {"location": f"%{location}%", "field": f"%{field}%"}
+        if limit is not None:
+            query, params["limit"] = query + " ORDER BY ID LIMIT $limit", limit
+        result = manager.execute(query, params).fetchall()
 
     print(f"[DEBUG] Found {len(result)} rows")
     return result
 
-def run_duckdb_query(query, db_path="data/users.db"):
+def get_recommendations(user_id, db_path=DB_PATH, limit=3):
+    """Precomputed (rec_id, score, reasons) rows for a user, best first; [] if none are stored."""
+    if not os.path.exists(db_path):
+        return []
+    try:
+        return get_connection_manager(db_path).execute(
+            "SELECT rec_id, score, reasons FROM recommendations WHERE user_id = ? ORDER BY rank LIMIT ?",
+            [str(user_id), limit],
+        ).fetchall()
+    except duckdb.CatalogException:
+        return []
+
+def run_duckdb_query(query, db_path=DB_PATH):
     try:
-        conn = duckdb.connect(db_path)
-        result = conn.execute(query).fetchall()
-        conn.close()
+        result = get_connection_manager(db_path).execute(query).fetchall()
 
         if not result:
             return "No results."
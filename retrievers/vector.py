@@ -1,20 +1,393 @@
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
-from qdrant_client import QdrantClient
+import numpy as np
+from retrievers.ann_index import DEFAULT_NPROBE, get_ann_index, reload_ann_indexes
+from retrievers.vector_store import StoredPoint, get_vector_store, reload_vector_stores
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 QDRANT_PATH = "data/tmp/my_qdrant_data"   # <- consistent embedded storage
 COLLECTION = "user_embeddings"
+MODEL_NAME = "all-MiniLM-L6-v2"
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant")      # "qdrant", "numpy" or "ivfpq"
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "data/vector_store")
+ANN_INDEX_PATH = os.getenv("ANN_INDEX_PATH", "data/ann_index")
+# Payload fields returned with hits; full bios are in retrievers/bio_store.py.
+SEARCH_PAYLOAD_FIELDS = ["user_id", "user_name", "snippet", "sources"]
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_DIR = os.getenv("QUERY_CACHE_DIR")            # unset -> memory only
+QUERY_CACHE_DISK_ROWS = int(os.getenv("QUERY_CACHE_DISK_ROWS", "20000"))
 
-def find_similar_bios(qdrant_path=str(QDRANT_PATH), collection_name=COLLECTION, query_text="", top_k=3):
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-    client = QdrantClient(path=qdrant_path)           # embedded mode
-    query_vector = model.encode(query_text).tolist()
-
-    results = client.search(
-        collection_name=collection_name,
-        query_vector=query_vector,
-        limit=top_k,
-        with_payload=True
-    )
-    return results
+_lock = threading.Lock()
+_models = {}
+_clients = {}
+_retrievers = {}
+
+def _get_model(model_name):
+    with _lock:
+        if model_name not in _models:
+            # Deferred: importing sentence_transformers pulls in torch.
+            from sentence_transformers import SentenceTransformer
+            _models[model_name] = SentenceTransformer(model_name)
+        return _models[model_name]
+
+class _SharedClient:
+    """
+    The one embedded client for a storage path and the lock every call on it must hold:
+    embedded Qdrant is not safe for concurrent use, whichever retriever is calling.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.lock = threading.Lock()
+        self.closed = False   # set by reload_vectors() under the lock
+
+def _get_client(qdrant_path):
+    # Embedded Qdrant locks its storage folder, so only one client per path may exist.
+    key = str(Path(qdrant_path).resolve())
+    with _lock:
+        if key not in _clients:
+            from qdrant_client import QdrantClient
+            _clients[key] = _SharedClient(QdrantClient(path=qdrant_path))
+        return _clients[key]
+
+def normalize_query(text):
+    return re.sub(r"\s+", " ", (text or "").strip().lower())
+
+class QueryEmbeddingCache:
+    """
+    Query text -> embedding cache: an in-memory LRU in front of an optional
+    memory-mapped ring of vectors on disk that survives restarts.
+    Entries are keyed by model name, and the disk tier is wiped when the model changes.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, max_size=QUERY_CACHE_SIZE, cache_dir=QUERY_CACHE_DIR,
+                 disk_rows=QUERY_CACHE_DISK_ROWS):
+        self.model_name = model_name
+        self.max_size = max_size
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.disk_rows = disk_rows
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._vectors = None      # np.memmap [disk_rows, dim], opened once the dimension is known
+        self._key_to_row = {}
+        self._row_to_key = {}
+        self._next_row = 0
+        self._keys_file = None    # keys.jsonl, opened for append on the first disk write
+        if self.cache_dir:
+            self._open_disk()
+
+    def key(self, text):
+        return f"{self.model_name}\x00{normalize_query(text)}"
+
+    # ---- disk tier ----
+    def _meta_path(self):
+        return self.cache_dir / "meta.json"
+
+    def _open_disk(self, dim=None):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        meta = {}
+        if self._meta_path().exists():
+            meta = json.loads(self._meta_path().read_text())
+        if meta and (meta.get("model_name") != self.model_name or meta.get("rows") != self.disk_rows):
+            self._clear_disk()
+            meta = {}
+        if not meta:
+            if dim is None:
+                return
+            meta = {"model_name": self.model_name, "rows": self.disk_rows, "dim": int(dim)}
+            self._meta_path().write_text(json.dumps(meta))
+        vec_path = self.cache_dir / "vectors.f32"
+        mode = "r+" if vec_path.exists() else "w+"
+        self._vectors = np.memmap(vec_path, dtype=np.float32, mode=mode, shape=(meta["rows"], meta["dim"]))
+        self._load_keys()
+
+    def _clear_disk(self):
+        if self._keys_file is not None:
+            self._keys_file.close()
+            self._keys_file = None
+        for name in ("meta.json", "vectors.f32", "keys.jsonl"):
+            path = self.cache_dir / name
+            if path.exists():
+                path.unlink()
+        self._vectors = None
+        self._key_to_row, self._row_to_key, self._next_row = {}, {}, 0
+
+    def _load_keys(self):
+        keys_path = self.cache_dir / "keys.jsonl"
+        if not keys_path.exists():
+            return
+        lines = 0
+        with open(keys_path, "r", encoding="utf-8") as f:
+            for line in f:
+                lines += 1
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn write from a crash
+                self._assign(rec["key"], rec["row"])
+                self._next_row = (rec["row"] + 1) % self.disk_rows
+        if lines > 2 * self.disk_rows:
+            # The key log is append-only; compact it once overwritten rows dominate.
+            # Live keys keep their write order, so the last line still marks the ring cursor.
+            tmp_path = keys_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for key, row in self._key_to_row.items():
+                    f.write(json.dumps({"key": key, "row": row}) + "\n")
+            os.replace(tmp_path, keys_path)
+
+    def _assign(self, key, row):
+        old_key = self._row_to_key.get(row)
+        if old_key is not None:
+            self._key_to_row.pop(old_key, None)
+        old_row = self._key_to_row.pop(key, None)
+        if old_row is not None and old_row != row:
+            self._row_to_key.pop(old_row, None)
+        # Re-inserted, so dict order stays write order and the last key holds the newest row.
+        self._key_to_row[key] = row
+        self._row_to_key[row] = key
+
+    def _disk_get(self, key):
+        row = self._key_to_row.get(key)
+        if row is None or self._vectors is None:
+            return None
+        return np.array(self._vectors[row])
+
+    def _disk_put(self, key, vector):
+        if self._vectors is None:
+            self._open_disk(dim=len(vector))
+        row = self._key_to_row.get(key)
+        if row is not None:
+            # Already on disk: refresh the row in place; the key log and ring cursor are unchanged.
+            self._vectors[row] = vector
+            return
+        row = self._next_row
+        self._vectors[row] = vector
+        self._assign(key, row)
+        self._next_row = (row + 1) % self.disk_rows
+        if self._keys_file is None:
+            self._keys_file = open(self.cache_dir / "keys.jsonl", "a", encoding="utf-8")
+        self._keys_file.write(json.dumps({"key": key, "row": row}) + "\n")
+        self._keys_file.flush()
+
+    # ---- public API ----
+    def set_model(self, model_name):
+        """Drop every entry when the embedding model changes."""
+        with self._lock:
+            if model_name == self.model_name:
+                return
+            self.model_name = model_name
+            self._memory.clear()
+            if self.cache_dir:
+                self._clear_disk()
+                self._open_disk()
+
+    def get(self, text):
+        key = self.key(text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return vector
+            vector = self._disk_get(key) if self.cache_dir else None
+            if vector is not None:
+                self.disk_hits += 1
+                self._remember(key, vector)
+                return vector
+            self.misses += 1
+            return None
+
+    def put(self, text, vector):
+        key = self.key(text)
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vector)
+            if self.cache_dir:
+                self._disk_put(key, vector)
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def flush(self):
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            if self._keys_file is not None:
+                self._keys_file.flush()
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self._key_to_row),
+        }
+
+class VectorRetriever:
+    """Keeps the embedding model and the embedded Qdrant collection open between queries."""
+
+    def __init__(self, qdrant_path=QDRANT_PATH, collection_name=COLLECTION, model_name=MODEL_NAME,
+                 backend=VECTOR_BACKEND):
+        self.qdrant_path = qdrant_path
+        self.collection_name = collection_name
+        self.model_name = model_name
+        self.backend = backend
+        self.model = _get_model(model_name)
+        # The numpy backend never opens Qdrant; see retrievers/vector_store.py. The ivfpq
+        # backend (retrievers/ann_index.py) still reads payloads and user vectors from it.
+        if backend in ("qdrant", "ivfpq"):
+            _get_client(qdrant_path)   # open it now rather than on the first query
+        self.cache = get_query_cache(model_name)
+        self._encode_lock = threading.Lock()
+
+    @contextmanager
+    def _client(self):
+        """The path's current client, held under its shared lock for the duration of the block."""
+        shared = _get_client(self.qdrant_path)
+        shared.lock.acquire()
+        while shared.closed:
+            # reload_vectors() closed it while this thread waited: move to the new one.
+            shared.lock.release()
+            shared = _get_client(self.qdrant_path)
+            shared.lock.acquire()
+        try:
+            yield shared.client
+        finally:
+            shared.lock.release()
+
+    def encode(self, queries):
+        """Encode a list of query strings in one batch, skipping the ones already cached."""
+        queries = list(queries)
+        vectors = [self.cache.get(q) for q in queries]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            with self._encode_lock:
+                encoded = self.model.encode([queries[i] for i in missing], convert_to_numpy=True)
+            for i, vector in zip(missing, encoded):
+                self.cache.put(queries[i], vector)
+                vectors[i] = vector
+        return np.vstack(vectors)
+
+    def _search_ann(self, vectors, top_k, nprobe):
+        ids, scores = get_ann_index(ANN_INDEX_PATH).search(np.asarray(vectors, dtype=np.float32), top_k, nprobe)
+        wanted = sorted({int(i) for i in ids.ravel() if i >= 0})
+        with self._client() as client:
+            found = client.retrieve(
+                collection_name=self.collection_name, ids=wanted, with_payload=SEARCH_PAYLOAD_FIELDS
+            )
+        payloads = {int(p.id): p.payload for p in found}
+        return [
+            [StoredPoint(int(i), float(score), payloads[int(i)]) for i, score in zip(q_ids, q_scores) if int(i) in payloads]
+            for q_ids, q_scores in zip(ids, scores)
+        ]
+
+    def search_vectors(self, vectors, top_k=3, nprobe=None):
+        """
+        nprobe only applies to the ivfpq backend: more lists probed, higher recall, slower.
+        None means DEFAULT_NPROBE (ANN_NPROBE).
+        """
+        nprobe = nprobe or DEFAULT_NPROBE
+        if self.backend == "numpy":
+            return get_vector_store(VECTOR_STORE_PATH).search_batch(vectors, top_k)
+        if self.backend == "ivfpq":
+            return self._search_ann(vectors, top_k, nprobe)
+        from qdrant_client import models
+        requests = [
+            models.SearchRequest(vector=[float(x) for x in vector], limit=top_k, with_payload=SEARCH_PAYLOAD_FIELDS)
+            for vector in vectors
+        ]
+        with self._client() as client:
+            return client.search_batch(collection_name=self.collection_name, requests=requests)
+
+    def search_many(self, queries, top_k=3, nprobe=None):
+        queries = list(queries)
+        if not queries:
+            return []
+        return self.search_vectors(self.encode(queries), top_k, nprobe)
+
+    def search(self, query_text, top_k=3, nprobe=None):
+        return self.search_many([query_text], top_k, nprobe)[0]
+
+    def search_similar_to_user(self, user_id, top_k=3, nprobe=None):
+        """Neighbours of a user's own bio vector, excluding the user."""
+        if self.backend == "numpy":
+            vector = get_vector_store(VECTOR_STORE_PATH).vector(user_id)
+        else:
+            with self._client() as client:
+                found = client.retrieve(
+                    collection_name=self.collection_name, ids=[int(user_id)], with_vectors=True, with_payload=False
+                )
+            vector = found[0].vector if found else None
+        if vector is None:
+            return []
+        hits = self.search_vectors([vector], top_k + 1, nprobe)[0]
+        return [hit for hit in hits if str(hit.id) != str(user_id)][:top_k]
+
+_query_cache = None
+
+def get_query_cache(model_name=MODEL_NAME):
+    """Shared query-embedding cache; switching models clears it."""
+    global _query_cache
+    with _lock:
+        if _query_cache is None:
+            _query_cache = QueryEmbeddingCache(model_name)
+        else:
+            _query_cache.set_model(model_name)
+        return _query_cache
+
+def get_retriever(qdrant_path=QDRANT_PATH, collection_name=COLLECTION, model_name=MODEL_NAME, backend=None):
+    """Return the process-wide retriever for this collection, creating it on first use."""
+    backend = backend or VECTOR_BACKEND
+    key = (str(Path(qdrant_path).resolve()), collection_name, model_name, backend)
+    retriever = _retrievers.get(key)
+    if retriever is None:
+        retriever = VectorRetriever(qdrant_path, collection_name, model_name, backend)
+        with _lock:
+            retriever = _retrievers.setdefault(key, retriever)
+    return retriever
+
+def reload_vectors():
+    """
+    Call after re-indexing. Embedded Qdrant loads a collection into memory when it is
+    opened, so clients are closed and reopened on next use, together with the numpy store
+    and ANN index singletons. Retrievers look their client up on every call, so one still
+    in use by another thread simply moves to the new client. Models and the query-embedding
+    cache stay: they do not depend on the data.
+    """
+    # _lock is held throughout so no new client opens the folder before the old one lets go.
+    with _lock:
+        _retrievers.clear()
+        for shared in _clients.values():
+            # Waits for calls already running; callers queued on the lock retry on the new client.
+            with shared.lock:
+                shared.closed = True
+                try:
+                    shared.client.close()
+                except Exception as e:
+                    print(f"[DEBUG] Closing Qdrant client failed: {e}")
+        _clients.clear()
+    reload_vector_stores()
+    reload_ann_indexes()
+
+def find_similar_bios(qdrant_path=str(QDRANT_PATH), collection_name=COLLECTION, query_text="", top_k=3, backend=None,
+                      nprobe=None):
+    """
+    backend: "qdrant" (embedded Qdrant), "numpy" (memory-mapped store) or "ivfpq" (approximate
+    index, see retrievers/ann_index.py); defaults to VECTOR_BACKEND. nprobe tunes ivfpq recall
+    and defaults to ANN_NPROBE.
+    """
+    return get_retriever(qdrant_path, collection_name, backend=backend).search(query_text, top_k, nprobe)
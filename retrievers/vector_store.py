@@ -0,0 +1,233 @@
+import argparse
+import json
+import mmap
+import os
+import shutil
+import threading
+import uuid
+from collections import namedtuple
+
+import numpy as np
+
+VECTOR_STORE_PATH = "data/vector_store"
+SCAN_ROWS = 262144       # rows scored per matmul so a huge store never needs a full score matrix
+RESCORE_FACTOR = 4       # candidates fetched per result before full-precision rescoring
+
+# Same fields callers read from a Qdrant ScoredPoint.
+StoredPoint = namedtuple("StoredPoint", ["id", "score", "payload"])
+
+def _unit_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+def quantize_int8(vectors):
+    """Symmetric per-row int8: v ~= codes * scale."""
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def build_vector_store(batches, out_dir=VECTOR_STORE_PATH, dtype="float16", keep_full=False, model_name=None):
+    """
+    Write (ids, vectors, payloads) batches as a store directory:
+      vectors.f16 | vectors.i8 + scales.f32   unit-normalized matrix, row i = ids[i]
+      full.f32                                optional float32 copy for rescoring
+      ids.npy, payload.jsonl, payload_offsets.npy
+    Batches are appended as they come, so exporting never holds the whole corpus in memory.
+    """
+    if dtype not in ("float16", "int8"):
+        raise ValueError(f"Unsupported dtype: {dtype}")
+    build_id = uuid.uuid4().hex
+    tmp_dir = f"{out_dir}.tmp-{build_id}"
+    os.makedirs(tmp_dir)
+    files = {"vectors": open(os.path.join(tmp_dir, "vectors.f16" if dtype == "float16" else "vectors.i8"), "wb"),
+             "payload": open(os.path.join(tmp_dir, "payload.jsonl"), "wb")}
+    if dtype == "int8":
+        files["scales"] = open(os.path.join(tmp_dir, "scales.f32"), "wb")
+    if keep_full:
+        files["full"] = open(os.path.join(tmp_dir, "full.f32"), "wb")
+    all_ids, offsets, dim = [], [0], None
+    try:
+        for ids, vectors, payloads in batches:
+            vectors = _unit_rows(vectors)
+            dim = vectors.shape[1]
+            if dtype == "float16":
+                files["vectors"].write(vectors.astype(np.float16).tobytes())
+            else:
+                codes, scales = quantize_int8(vectors)
+                files["vectors"].write(codes.tobytes())
+                files["scales"].write(scales.tobytes())
+            if keep_full:
+                files["full"].write(vectors.tobytes())
+            for payload in payloads:
+                line = (json.dumps(payload or {}, ensure_ascii=False) + "\n").encode("utf-8")
+                files["payload"].write(line)
+                offsets.append(offsets[-1] + len(line))
+            all_ids.extend(int(i) for i in ids)
+    finally:
+        for f in files.values():
+            f.close()
+
+    np.save(os.path.join(tmp_dir, "ids.npy"), np.asarray(all_ids, dtype=np.int64))
+    np.save(os.path.join(tmp_dir, "payload_offsets.npy"), np.asarray(offsets, dtype=np.int64))
+    meta = {"build_id": build_id, "count": len(all_ids), "dim": dim or 0, "dtype": dtype,
+            "has_full": keep_full, "model_name": model_name}
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    # Swap directories so open readers keep their old mmaps.
+    old_dir = f"{out_dir}.old-{build_id}"
+    if os.path.exists(out_dir):
+        os.rename(out_dir, old_dir)
+    os.rename(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return meta
+
+def iter_qdrant_batches(qdrant_path, collection_name, page_size=2048, client=None):
+    """
+    Page through a collection. Without `client`, opens one on qdrant_path and closes it when
+    done, since embedded Qdrant keeps its folder locked while a client is open.
+    """
+    own_client = client is None
+    if own_client:
+        from qdrant_client import QdrantClient
+        client = QdrantClient(path=qdrant_path)
+    try:
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=collection_name, limit=page_size, offset=offset,
+                with_payload=True, with_vectors=True
+            )
+            if points:
+                yield [p.id for p in points], [p.vector for p in points], [p.payload for p in points]
+            if offset is None:
+                return
+    finally:
+        if own_client:
+            client.close()
+
+class NumpyVectorStore:
+    """
+    Exact cosine search over a memory-mapped float16 or int8 matrix. Opening only reads
+    meta.json and maps files; pages are loaded by the OS as searches touch them.
+    """
+
+    def __init__(self, path=VECTOR_STORE_PATH):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        count, dim = self.meta["count"], self.meta["dim"]
+        if count == 0:
+            # Empty files cannot be memory-mapped; an empty store just has no hits.
+            self.vectors, self.scales, self.full = np.empty((0, dim), dtype=np.float16), None, None
+            self.ids, self.offsets = np.empty(0, dtype=np.int64), np.zeros(1, dtype=np.int64)
+            self._payload = b""
+            self._row_of = {}
+            self._row_lock = threading.Lock()
+            return
+        if self.meta["dtype"] == "float16":
+            self.vectors = np.memmap(os.path.join(path, "vectors.f16"), dtype=np.float16, mode="r", shape=(count, dim))
+            self.scales = None
+        else:
+            self.vectors = np.memmap(os.path.join(path, "vectors.i8"), dtype=np.int8, mode="r", shape=(count, dim))
+            self.scales = np.memmap(os.path.join(path, "scales.f32"), dtype=np.float32, mode="r", shape=(count,))
+        self.full = None
+        if self.meta.get("has_full"):
+            self.full = np.memmap(os.path.join(path, "full.f32"), dtype=np.float32, mode="r", shape=(count, dim))
+        self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "payload_offsets.npy"), mmap_mode="r")
+        with open(os.path.join(path, "payload.jsonl"), "rb") as f:
+            self._payload = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+        self._row_of = None
+        self._row_lock = threading.Lock()
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def payload(self, row):
+        return json.loads(self._payload[self.offsets[row]:self.offsets[row + 1]])
+
+    def row_of(self, point_id):
+        # Built on first use only, so opening the store stays O(1).
+        with self._row_lock:
+            if self._row_of is None:
+                self._row_of = {int(pid): row for row, pid in enumerate(self.ids)}
+        return self._row_of.get(int(point_id))
+
+    def vector(self, point_id):
+        row = self.row_of(point_id)
+        if row is None:
+            return None
+        source = self.full if self.full is not None else self.vectors
+        vector = np.asarray(source[row], dtype=np.float32)
+        return vector * self.scales[row] if self.scales is not None and self.full is None else vector
+
+    def _scan(self, queries, candidates):
+        """Top `candidates` rows per query by approximate (stored-precision) dot product."""
+        n = len(self)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, n, SCAN_ROWS):
+            block = np.asarray(self.vectors[start:start + SCAN_ROWS], dtype=np.float32)
+            scores = queries @ block.T
+            if self.scales is not None:
+                scores *= np.asarray(self.scales[start:start + SCAN_ROWS])
+            rows = np.broadcast_to(np.arange(start, start + block.shape[0]), scores.shape)
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, rows], axis=1)
+            if scores.shape[1] > candidates:
+                keep = np.argpartition(-scores, candidates - 1, axis=1)[:, :candidates]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                rows = np.take_along_axis(rows, keep, axis=1)
+            best_scores, best_rows = scores, rows
+        return best_scores, best_rows
+
+    def search_batch(self, queries, top_k=3, rescore=True, with_payload=True):
+        """Exact top-k for every query vector; rescored against full.f32 when it exists."""
+        if not len(self):
+            return [[] for _ in queries]
+        queries = _unit_rows(queries)
+        rescore = rescore and self.full is not None
+        candidates = min(len(self), top_k * RESCORE_FACTOR if rescore else top_k)
+        scores, rows = self._scan(queries, candidates)
+        results = []
+        for q, q_scores, q_rows in zip(queries, scores, rows):
+            if rescore:
+                q_scores = np.asarray(self.full[np.sort(q_rows)], dtype=np.float32) @ q
+                q_rows = np.sort(q_rows)
+            order = np.argsort(-q_scores)[:top_k]
+            results.append([
+                StoredPoint(int(self.ids[q_rows[i]]), float(q_scores[i]),
+                            self.payload(q_rows[i]) if with_payload else None)
+                for i in order
+            ])
+        return results
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_vector_store(path=VECTOR_STORE_PATH):
+    """Process-wide store for `path`, reopened after a rebuild swaps in a new meta.json."""
+    mtime = os.stat(os.path.join(path, "meta.json")).st_mtime
+    with _stores_lock:
+        cached = _stores.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, NumpyVectorStore(path))
+            _stores[path] = cached
+        return cached[1]
+
+def reload_vector_stores():
+    """Forget every open store; the next get_vector_store() maps the files again."""
+    with _stores_lock:
+        _stores.clear()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the Qdrant collection into a memory-mapped NumPy vector store.")
+    parser.add_argument("--qdrant-path", default="data/tmp/my_qdrant_data")
+    parser.add_argument("--collection", default="user_embeddings")
+    parser.add_argument("--out", default=VECTOR_STORE_PATH)
+    parser.add_argument("--dtype", choices=["float16", "int8"], default="float16")
+    parser.add_argument("--keep-full", action="store_true", help="also store float32 vectors for rescoring")
+    args = parser.parse_args()
+    meta = build_vector_store(iter_qdrant_batches(args.qdrant_path, args.collection), args.out, args.dtype, args.keep_full)
+    print(f"Vector store {meta['build_id']}: {meta['count']} x {meta['dim']} {meta['dtype']} in {args.out}")
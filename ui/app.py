@@ -8,8 +8,8 @@ import time
 import os
 import sys
 import json
-import duckdb
 import re
+import threading
 import uuid
 
 # ---------------- Optional import path (for recommenders/) ----------------
@@ -19,8 +19,22 @@ RECOMMENDERS_DIR = os.path.join(PARENT_DIR, "recommenders")
 if RECOMMENDERS_DIR not in sys.path:
     sys.path.append(RECOMMENDERS_DIR)
 
+if PARENT_DIR not in sys.path:
+    sys.path.append(PARENT_DIR)
+
 # ---------------- Name -> ID map (safe if DuckDB missing) ----------------
 def load_name_to_id():
+    # Prefer the memory-mapped Arrow snapshot written by ingest/load_profiles.py.
+    try:
+        from ingest.snapshot import read_columns
+        table = read_columns(["ID", "Full Name"], out_dir=os.path.join(PARENT_DIR, "data", "snapshots"))
+        if table is not None:
+            names = table.column("Full Name").to_pylist()
+            ids = table.column("ID").to_pylist()
+            return {name.strip(): uid for uid, name in zip(ids, names) if name}
+    except Exception:
+        pass
+
     try_paths = [
         os.path.join(PARENT_DIR, "users.db"),
         os.path.join(PARENT_DIR, "data", "users.db"),
@@ -28,21 +42,89 @@ def load_name_to_id():
     for p in try_paths:
         if os.path.exists(p):
             try:
-                con = duckdb.connect(p, read_only=True)
-                rows = con.execute('SELECT id, "Full Name" FROM users').fetchall()
-                con.close()
+                from retrievers.sql import get_connection_manager
+                rows = get_connection_manager(p).execute('SELECT id, "Full Name" FROM users').fetchall()
                 return {name.strip(): uid for uid, name in rows}
             except Exception:
                 pass
     return {}
 
-name_to_id = load_name_to_id()
+# ---------------- Resources + warm-up ----------------
+WARMUP_STEPS = ["name map", "DuckDB", "embedding model", "vector search", "agent"]
+
+class Warmup:
+    """
+    Loads the heavy, process-wide resources on a background thread at startup so the first
+    query does not pay for them. Each step records its status; callers that need a step's
+    result before it finishes simply wait for it.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.status = {step: "pending" for step in WARMUP_STEPS}
+        self.errors = {}
+        self._results = {}
+        self._done = {step: threading.Event() for step in WARMUP_STEPS}
+        self.thread = threading.Thread(target=self._run, name="ui-warmup", daemon=True)
+        self.thread.start()
+
+    def _step(self, name, fn):
+        self.status[name] = "loading"
+        started = time.perf_counter()
+        try:
+            self._results[name] = fn()
+            self.status[name] = f"ready ({time.perf_counter() - started:.1f}s)"
+        except Exception as e:
+            self.status[name] = "failed"
+            self.errors[name] = str(e)
+        finally:
+            self._done[name].set()
+
+    def _run(self):
+        from recommenders.fast_router import reload_people
+        from retrievers.sql import DB_PATH, get_connection_manager, reload_connections
+        from retrievers.vector import get_retriever, reload_vectors
+        # A new data version means ingest ran: drop handles to the old files first, so the
+        # version tag never labels results computed from the previous index.
+        reload_connections()
+        reload_vectors()
+        reload_people()
+        self._step("name map", load_name_to_id)
+        self._step("DuckDB", lambda: get_connection_manager(DB_PATH).cursor())
+        self._step("embedding model", lambda: get_retriever().encode(["warm up"]))
+        self._step("vector search", lambda: get_retriever().search("warm up", 1))
+        # Same module name the agent call below imports, so this is the instance it gets.
+        self._step("agent", lambda: __import__("router_agent").get_agent())
+
+    def result(self, step, timeout=None):
+        self._done[step].wait(timeout)
+        return self._results.get(step)
+
+    @property
+    def ready(self):
+        return all(event.is_set() for event in self._done.values())
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def get_warmup(version):
+    """One warm-up per data version and process; a new version replaces the old resources."""
+    return Warmup(version)
+
+def current_data_version():
+    try:
+        from recommenders.result_cache import data_version
+        return data_version()
+    except Exception:
+        return "-"
+
+warmup = get_warmup(current_data_version())
+
+def current_name_map():
+    """Name -> ID map once the warm-up has loaded it, else empty; never holds up a render."""
+    return warmup.result("name map", timeout=0) or {}
 
 # ---------------- Feedback logging ----------------
-def save_feedback(entry, filepath=os.path.join(PARENT_DIR, "feedback", "feedback_log.jsonl")):
-    os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
-    with open(filepath, "a", encoding="utf-8") as f:
-        f.write(json.dumps(entry) + "\n")
+# One locked, rotating writer shared with the rest of the app; see feedback/logger.py.
+from feedback.logger import save_feedback
 
 # ---------------- Text helpers ----------------
 NUM_LINE = re.compile(r"^\s*\d+[\.\)]\s+")
@@ -78,6 +160,55 @@ def looks_like_person(line: str) -> bool:
     return not any(re.search(pat, line, re.IGNORECASE) for pat in bad)
 
 # ---------------- Feedback UI ----------------
+def feedback_row(query, idx, row, name_to_id, recommended_ids):
+    """One result line with its thumbs/comment widgets; keys depend only on idx and query."""
+    st.markdown(f"### Result {idx}")
+    st.write(row)
+
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        thumbs = st.radio(f"Feedback_{idx}", ["👍", "👎"], key=f"thumbs_{idx}", horizontal=True)
+    with col2:
+        comment = st.text_input(f"Comment_{idx}", placeholder="Optional comment...", key=f"comment_{idx}")
+
+    safe_query = query.replace(" ", "_").replace("?", "").replace(":", "").lower()
+    submit_key = f"submit_{safe_query}_{idx}"
+    submitted_key = f"submitted_{safe_query}_{idx}"
+
+    if submitted_key not in st.session_state:
+        st.session_state[submitted_key] = False
+
+    if not st.session_state[submitted_key]:
+        if st.button(f"Submit Feedback {idx}", key=f"submit_{idx}"):
+            # Try to parse "Name — ..." or "Name - ..." for nicer reason extraction
+            name_part = row.split("—", 1)[0].split("-", 1)[0].strip()
+            description = (
+                row.split("—", 1)[1].strip() if "—" in row
+                else (row.split("-", 1)[1].strip() if "-" in row else "")
+            )
+            sentences = description.split(". ")
+            reason = sentences[-1].strip() if len(sentences) > 1 else description
+
+            rec_id = (
+                recommended_ids[idx - 1]
+                if (idx - 1) < len(recommended_ids)
+                else name_to_id.get(name_part, "unknown")
+            )
+
+            feedback_entry = {
+                "query": query,
+                "recommended_id": rec_id,
+                "rating": 1 if thumbs == "👍" else -1,
+                "reason": reason,
+                "comment": comment,
+            }
+
+            save_feedback(feedback_entry)
+            st.session_state[submitted_key] = True
+            st.success(f"Feedback submitted for {idx}. {name_part if name_part else ''}")
+    else:
+        st.button("Feedback Submitted ✅", key=submit_key, disabled=True)
+
 def feedback_ui(query, results, name_to_id, recommended_ids=None):
     st.markdown("## Query Results & Feedback")
     recommended_ids = recommended_ids or []
@@ -86,52 +217,7 @@ def feedback_ui(query, results, name_to_id, recommended_ids=None):
     user_id = name_to_id.get(query_name, "unknown")
 
     for idx, row in enumerate(results, start=1):
-        st.markdown(f"### Result {idx}")
-        st.write(row)
-
-        col1, col2 = st.columns([1, 3])
-        with col1:
-            thumbs = st.radio(f"Feedback_{idx}", ["👍", "👎"], key=f"thumbs_{idx}", horizontal=True)
-        with col2:
-            comment = st.text_input(f"Comment_{idx}", placeholder="Optional comment...", key=f"comment_{idx}")
-
-        safe_query = query.replace(" ", "_").replace("?", "").replace(":", "").lower()
-        submit_key = f"submit_{safe_query}_{idx}"
-        submitted_key = f"submitted_{safe_query}_{idx}"
-
-        if submitted_key not in st.session_state:
-            st.session_state[submitted_key] = False
-
-        if not st.session_state[submitted_key]:
-            if st.button(f"Submit Feedback {idx}", key=f"submit_{idx}"):
-                # Try to parse "Name — ..." or "Name - ..." for nicer reason extraction
-                name_part = row.split("—", 1)[0].split("-", 1)[0].strip()
-                description = (
-                    row.split("—", 1)[1].strip() if "—" in row
-                    else (row.split("-", 1)[1].strip() if "-" in row else "")
-                )
-                sentences = description.split(". ")
-                reason = sentences[-1].strip() if len(sentences) > 1 else description
-
-                rec_id = (
-                    recommended_ids[idx - 1]
-                    if (idx - 1) < len(recommended_ids)
-                    else name_to_id.get(name_part, "unknown")
-                )
-
-                feedback_entry = {
-                    "query": query,
-                    "recommended_id": rec_id,
-                    "rating": 1 if thumbs == "👍" else -1,
-                    "reason": reason,
-                    "comment": comment,
-                }
-
-                save_feedback(feedback_entry)
-                st.session_state[submitted_key] = True
-                st.success(f"Feedback submitted for {idx}. {name_part if name_part else ''}")
-        else:
-            st.button("Feedback Submitted ✅", key=submit_key, disabled=True)
+        feedback_row(query, idx, row, name_to_id, recommended_ids)
 
 # ---------------- Session init ----------------
 if "query_counter" not in st.session_state:
@@ -160,38 +246,49 @@ st.sidebar.header("AI network recommender")
 sidebar_query = st.sidebar.text_input("Enter your query here:", placeholder="Type something...")
 st.sidebar.write(f"Your query: {sidebar_query}")
 
-st.header("Agent Response")
-
-# ---------------- Agent call ----------------
-if sidebar_query and sidebar_query != "Type something..." and sidebar_query != st.session_state.get("last_query"):
-    with st.spinner(f"Asking the agent about: '{sidebar_query}'..."):
-        try:
-            # Import your agent from recommenders/
-            from router_agent import agent  # file: recommenders/router_agent.py
-
-            target_name = parse_target_name(sidebar_query)
-            st.session_state["target_name"] = target_name
-
-            # Nudge agent: 3 numbered lines, exclude the target person
-            prompt = (
-                sidebar_query
-                + " | Return exactly 3 numbered lines in the format "
-                  "'1. Full Name — Rationale: ...'. No headers or extra text. "
-                  f"Exclude the original person '{target_name}' from the list."
-            )
-            agent_response = agent.invoke(prompt)
-            st.session_state["last_query"] = sidebar_query
-
-        except ImportError:
-            st.error("Could not import router_agent. Please ensure 'recommenders/router_agent.py' exists and is correctly structured.")
-            agent_response = {"output": "Error: Agent not found."}
-        except Exception as e:
-            st.error(f"An error occurred during agent invocation: {e}")
-            agent_response = {"output": f"Error: {e}"}
+def show_warmup_status():
+    if warmup.ready:
+        failed = [step for step in WARMUP_STEPS if warmup.status[step] == "failed"]
+        st.caption("Resources ready" + (f" (failed: {', '.join(failed)})" if failed else "") + ".")
+    else:
+        st.caption(
+            "Warming up: " + ", ".join(f"{step} {warmup.status[step]}" for step in WARMUP_STEPS)
+            + ". Queries sent now wait for what they need."
+        )
+    for step, error in warmup.errors.items():
+        st.caption(f"{step}: {error}")
+
+def show_warmup_fragment():
+    if warmup.ready:
+        # One full rerun redraws the status without run_every (stopping the timer) and picks up the name map.
+        st.rerun()
+    show_warmup_status()
+
+with st.sidebar:
+    if hasattr(st, "fragment") and not warmup.ready:
+        # Re-drawn every second on its own until the warm-up finishes; the rest of the page is untouched.
+        st.fragment(run_every=1.0)(show_warmup_fragment)()
+    else:
+        if not warmup.ready:
+            st.caption("(Status as of this page load; it does not refresh on its own.)")
+        show_warmup_status()
+
+try:
+    from recommenders.result_cache import get_result_cache
+    cache_stats = get_result_cache().stats()
+    st.sidebar.caption(
+        f"Result cache: {cache_stats['hit_rate']:.0%} hit rate "
+        f"({cache_stats['exact']} exact, {cache_stats['near']} near, {cache_stats['disk']} disk), "
+        f"{cache_stats['saved_ms'] / 1000:.1f}s saved"
+    )
+except Exception:
+    pass
 
-    st.success("Agent processing complete!")
+st.header("Agent Response")
 
-    # --- Start of corrected logic ---
+# ---------------- Response -> result ----------------
+def summarize_response(agent_response, target_name):
+    """Turn an agent (or fast-path) response into cacheable lines, ids and tool names."""
     recommended_ids = []
     output_rows = []
     
@@ -205,24 +302,19 @@ if sidebar_query and sidebar_query != "Type something..." and sidebar_query != s
         else:
             raw_lines = extract_recommendation_lines(output)
 
-        # Extract IDs from raw results if available
+        # Extract IDs from the tool observations; every tool emits "[id] Name | ..." lines.
         if "intermediate_steps" in agent_response:
-            all_observations = []
+            from recommenders.tool_format import parse_person_ids
+            name_to_id_map = {}
             for action, observation in agent_response["intermediate_steps"]:
-                if hasattr(action, "tool") and action.tool == "VectorTool" and isinstance(observation, list):
-                    all_observations.extend(observation)
-                    
-            if all_observations:
-                # Create a mapping from name to ID
-                name_to_id_map = {
-                    (p.payload.get('user_name', '') or '').strip(): (p.payload.get('user_id', '') or '').strip()
-                    for p in all_observations if p.payload
-                }
-                
+                if hasattr(action, "tool"):
+                    name_to_id_map.update(parse_person_ids(observation))
+
+            if name_to_id_map:
                 # Align the IDs with the recommendation lines
                 recommended_ids = []
                 for line in raw_lines:
-                    name_part = line.split("—")[0].split(".")[1].strip()
+                    name_part = line.split("—")[0].split(".", 1)[-1].strip()
                     recommended_ids.append(name_to_id_map.get(name_part, "unknown"))
     else:
         # Fallback to the old method if intermediate steps aren't available.
@@ -230,7 +322,6 @@ if sidebar_query and sidebar_query != "Type something..." and sidebar_query != s
         recommended_ids = []
 
     # Filter out the original person one more time, just in case the agent failed to do so.
-    target_name = st.session_state.get("target_name", "")
     if target_name:
         filtered_lines = []
         filtered_ids = []
@@ -243,24 +334,145 @@ if sidebar_query and sidebar_query != "Type something..." and sidebar_query != s
     else:
         output_rows = raw_lines
 
-    final_lines = [ln for ln in output_rows if looks_like_person(ln)][:3]
+    tools = []
+    if isinstance(agent_response, dict) and agent_response.get("intermediate_steps"):
+        tools = [action.tool for action, _ in agent_response["intermediate_steps"] if hasattr(action, "tool")]
+
+    return {
+        "rec_lines": [ln for ln in output_rows if looks_like_person(ln)][:3],
+        "recommended_ids": recommended_ids,
+        "tools": tools,
+    }
 
+# ---------------- Agent call ----------------
+rendered_live = False   # results + feedback already drawn while streaming this run
+if sidebar_query and sidebar_query != "Type something..." and sidebar_query != st.session_state.get("last_query"):
+    target_name = parse_target_name(sidebar_query)
+    st.session_state["target_name"] = target_name
+
+    from recommenders.result_cache import get_result_cache
+    result_cache = get_result_cache()
+    result = result_cache.get(sidebar_query)
+
+    if result is not None:
+        st.session_state["last_query"] = sidebar_query
+        st.caption("Served from the recommendation cache.")
+    else:
+        failed = False
+        started = time.perf_counter()
+        agent_response = {"output": ""}
+        steps_box = st.container()
+        answer_box = st.empty()
+        streamed = ""
+        stream_ids = {}        # name -> id from the tool observations seen so far
+        live_lines, live_ids = [], []
+
+        def show_line(line):
+            """Render a finished recommendation line and its feedback widgets right away."""
+            line = line.strip()
+            if not NUM_LINE.match(line) or len(live_lines) >= 3 or not looks_like_person(line):
+                return
+            if target_name and re.search(rf"\b{re.escape(target_name)}\b", line, re.IGNORECASE):
+                return
+            if not live_lines:
+                st.markdown("## Query Results & Feedback")
+            name_part = line.split("—")[0].split(".", 1)[-1].strip()
+            live_lines.append(line)
+            live_ids.append(stream_ids.get(name_part) or current_name_map().get(name_part) or "unknown")
+            # Kept in session_state as they arrive: a widget click reruns the script mid-stream,
+            # and that rerun renders these lines instead of asking the agent again.
+            st.session_state["rec_lines"] = list(live_lines)
+            st.session_state["recommended_ids"] = list(live_ids)
+            st.session_state["last_result"] = "\n".join(live_lines)
+            feedback_row(sidebar_query, len(live_lines), line, current_name_map(), live_ids)
+
+        # Claim the query before streaming, so a rerun triggered by the live feedback widgets
+        # does not start a second agent run; the pending marker records an unfinished answer.
+        st.session_state["last_query"] = sidebar_query
+        st.session_state["pending_query"] = sidebar_query
+        st.session_state["rec_lines"], st.session_state["recommended_ids"] = [], []
+        st.session_state["last_result"] = ""
+
+        with st.spinner(f"Asking the agent about: '{sidebar_query}'..."):
+            try:
+                # Import your agent from recommenders/
+                from router_agent import stream_answer  # file: recommenders/router_agent.py
+                from recommenders.tool_format import parse_person_ids
+
+                # Nudge agent: 3 numbered lines, exclude the target person
+                prompt = (
+                    sidebar_query
+                    + " | Return exactly 3 numbered lines in the format "
+                      "'1. Full Name — Rationale: ...'. No headers or extra text. "
+                      f"Exclude the original person '{target_name}' from the list."
+                )
+                # Recognized query shapes skip the LLM; everything else goes to the agent.
+                # Events arrive as they happen, so tool calls and lines render progressively.
+                for event in stream_answer(sidebar_query, prompt):
+                    kind = event["type"]
+                    if kind == "route" and event["route"] == "fast":
+                        steps_box.caption("Answered on the fast path (no LLM call).")
+                    elif kind == "tool_start":
+                        steps_box.write(f"- Calling **{event['tool']}** with `{event['input']}`")
+                    elif kind == "tool_end":
+                        stream_ids.update(parse_person_ids(event["observation"]))
+                        steps_box.expander(f"{event['tool']} results").text(event["observation"])
+                    elif kind == "token":
+                        done = streamed.count("\n")
+                        streamed += event["text"]
+                        answer_box.markdown(streamed)
+                        for line in streamed.split("\n")[done:-1]:
+                            show_line(line)
+                    elif kind == "error":
+                        raise RuntimeError(event["error"])
+                    elif kind == "final":
+                        agent_response = event["response"]
+                # The last line has no trailing newline.
+                show_line(streamed.rsplit("\n", 1)[-1])
+
+            except ImportError:
+                st.error("Could not import router_agent. Please ensure 'recommenders/router_agent.py' exists and is correctly structured.")
+                agent_response = {"output": "Error: Agent not found."}
+                failed = True
+            except Exception as e:
+                st.error(f"An error occurred during agent invocation: {e}")
+                agent_response = {"output": f"Error: {e}"}
+                failed = True
+            if failed:
+                st.session_state.pop("last_query", None)   # let the next run retry
+            st.session_state.pop("pending_query", None)
+
+        st.success("Agent processing complete!")
+        result = summarize_response(agent_response, target_name)
+        if live_lines:
+            # What the user already sees (and may be rating) is the result.
+            result["rec_lines"], result["recommended_ids"] = live_lines, live_ids
+            rendered_live = True
+        if not failed and result["rec_lines"]:
+            result_cache.put(sidebar_query, result, compute_ms=(time.perf_counter() - started) * 1000)
+
+    final_lines = result["rec_lines"]
     st.session_state["rec_lines"] = final_lines
-    st.session_state["recommended_ids"] = recommended_ids
+    st.session_state["recommended_ids"] = result["recommended_ids"]
     st.session_state["last_result"] = "\n".join(final_lines)
 
-    # --- End of corrected logic ---
-
     # Optional: show tools used if available
-    if isinstance(agent_response, dict) and agent_response.get("intermediate_steps"):
-        for action, _ in agent_response["intermediate_steps"]:
-            if hasattr(action, "tool"):
-                st.write(f"- Used tool: **{action.tool}**")
+    if result["tools"]:
+        for tool in result["tools"]:
+            st.write(f"- Used tool: **{tool}**")
     else:
         st.info("No tools were explicitly used for this query, or intermediate steps are not available in this output.")
 
 # ---------------- Render results + feedback ----------------
-if st.session_state.get("last_result"):  # render whenever we have an agent result
+if st.session_state.get("pending_query") == st.session_state.get("last_query") and not rendered_live:
+    # A widget was used while the answer was still streaming; that run was cut short (the old
+    # agent thread finishes in the background and its events are discarded).
+    st.caption("The answer was interrupted by your feedback; showing the lines received so far.")
+    st.button("Get the complete answer", key="rerun_interrupted",
+              on_click=lambda: st.session_state.pop("last_query", None))
+    st.session_state.pop("pending_query", None)
+
+if st.session_state.get("last_result") and not rendered_live:  # render whenever we have an agent result
     # Show the agent's raw answer text (so user sees the recommendations)
     st.markdown(st.session_state["last_result"])
 
@@ -279,7 +491,7 @@ if st.session_state.get("last_result"):  # render whenever we have an agent resu
         feedback_ui(
             st.session_state.get("last_query", sidebar_query),
             output_rows,
-            name_to_id,
+            current_name_map(),
             recommended_ids=recommended_ids
         )
 